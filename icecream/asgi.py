@@ -3,6 +3,17 @@ ASGI config for icecream project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The JSON endpoints the pages poll (cart count and items, products, search,
+auth check, saved addresses) are async views and run on the event loop
+without taking a worker thread. To serve the site this way, with any ASGI
+server, e.g.:
+
+    SERVER=asgi uvicorn icecream.asgi:application --workers 4
+
+SERVER=asgi switches Postgres to pooled, non-persistent connections (see
+settings). ASGI_THREADS caps the threads the remaining sync views share.
+``manage.py bench_asgi`` compares this against the WSGI deployment.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
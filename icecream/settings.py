@@ -42,10 +42,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'scoopjoy.instrumentation.QueryInstrumentationMiddleware',
+    'scoopjoy.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'scoopjoy.backends.LegacyBackendSessionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -70,21 +73,208 @@ TEMPLATES = [
 ]
 
 
+# Compile each template once per process. Django only does this by default
+# when DEBUG is off; production deployments set CACHED_TEMPLATES=1 explicitly.
+if os.environ.get('CACHED_TEMPLATES', '0' if DEBUG else '1') == '1':
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# Rendered HTML of the static marketing pages (see scoopjoy.rendering)
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Product search for /api/search/: 'memory' (trigram index) or 'fts5' (SQLite only)
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'memory')
+
+# WebP/AVIF derivatives of uploaded images (scoopjoy.images): 'thread' builds
+# them on a background thread after the upload commits; 'worker' leaves them
+# to `manage.py build_image_derivatives`.
+IMAGE_DERIVATIVES = os.environ.get('IMAGE_DERIVATIVES', 'thread')
+
+
+# Per-request query counts, DB/template timings and duplicate-query detection
+# (scoopjoy.instrumentation); staff can read the ring buffer at /staff/query-stats/.
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', '1' if DEBUG else '0') == '1'
+QUERY_STATS_BUFFER = 500
+# Fraction of requests run under cProfile; the slowest PROFILE_KEEP are kept.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_KEEP = 20
+PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Sales rollups behind /staff/sales/ (scoopjoy.sales). 'worker' (the default)
+# leaves them to `manage.py rollup_sales`, run from cron or a supervisor (or
+# the figures stop moving), so the rollup never takes SQLite's write lock
+# from checkout; 'thread' folds new orders in on one background thread per
+# process once checkout commits, which suits PostgreSQL.
+SALES_ROLLUP = os.environ.get('SALES_ROLLUP', 'worker')
+SALES_ROLLUP_CHUNK = 500  # orders per transaction
+SALES_ROLLUP_PAUSE = 0.05  # seconds between chunks, so checkout gets the write lock
+
+
 WSGI_APPLICATION = 'icecream.wsgi.application'
+
+# SERVER=asgi when serving icecream.asgi:application (see icecream/asgi.py).
+# Async views run on the event loop there, and each sync view borrows a
+# thread only for the length of the request, so persistent per-thread
+# database connections are swapped for a pool below.
+SERVER = os.environ.get('SERVER', 'wsgi')
 AUTH_USER_MODEL = 'scoopjoy.CustomUser'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres for deployments with more than one writer; otherwise
+# SQLite, tuned for a single node unless SQLITE_TUNED=0.
+
+# WAL lets readers run alongside the writer, NORMAL sync is safe under WAL,
+# and IMMEDIATE transactions take the write lock up front so concurrent
+# writers wait on busy_timeout instead of failing a lock upgrade.
+SQLITE_TUNED_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA mmap_size=134217728;'
+        'PRAGMA busy_timeout=5000;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+}
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'scoopjoy'),
+            'USER': os.environ.get('DB_USER', 'scoopjoy'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if SERVER == 'asgi' else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    # DB_POOL=psycopg uses Django's connection pool (needs psycopg[pool]);
+    # DB_POOL=pgbouncer is for a transaction-pooling PgBouncer in front of
+    # the server.
+    DB_POOL = os.environ.get('DB_POOL', 'psycopg' if SERVER == 'asgi' else '')
+    if DB_POOL == 'psycopg':
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # the pool keeps connections instead
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+        }
+    elif DB_POOL == 'pgbouncer':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': dict(SQLITE_TUNED_OPTIONS) if os.environ.get('SQLITE_TUNED', '1') == '1' else {},
+        }
     }
+
+# Read replicas for catalog and order-history reads (scoopjoy.routers):
+# comma-separated SQLite files, or Postgres hosts when DB_ENGINE=postgres.
+# Locally, DB_REPLICAS=/tmp/replica.sqlite3 with a copy of db.sqlite3 works.
+DATABASE_REPLICAS = []
+for i, target in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    replica = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    replica['HOST' if DB_ENGINE == 'postgres' else 'NAME'] = target.strip()
+    DATABASES[f'replica{i}'] = replica
+    DATABASE_REPLICAS.append(f'replica{i}')
+DATABASE_ROUTERS = ['scoopjoy.routers.ReplicaRouter']
+# How long a visitor reads from the primary after writing.
+REPLICA_PIN_SECONDS = 5
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# OTP codes, cart summaries and the catalog version counters must be seen by
+# every worker, so production needs a cache shared between processes:
+#   CACHE_BACKEND=redis  any Redis-compatible server at REDIS_URL (needs redis-py)
+#   CACHE_BACKEND=file   one directory per namespace under CACHE_DIR (one host)
+#   CACHE_BACKEND=db     one table per namespace in the default database
+#                        (one host; run `manage.py createcachetable`)
+#   CACHE_BACKEND=locmem per process; only for a single-process runserver
+# The default is redis when REDIS_URL is set, else file, so that several
+# workers never silently get one cache each. icecream.settings_test always
+# uses locmem.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis' if REDIS_URL else 'file')
+CACHE_DIR = Path(os.environ.get('CACHE_DIR', BASE_DIR / 'cache'))
+# Bump CACHE_VERSION to orphan every entry at once, e.g. when a deploy changes
+# what is pickled; a namespace's own version orphans just that namespace.
+CACHE_VERSION = int(os.environ.get('CACHE_VERSION', '1'))
+
+# namespace: (default TTL in seconds, version)
+CACHE_NAMESPACES = {
+    'default': (300, 1),
+    'cart': (300, 1),  # CartSummary rows, refreshed from the database on a miss
+    'catalog': (PAGE_CACHE_TIMEOUT, 1),  # rendered pages; version counters never expire
+    'otp': (300, 1),  # login codes
+    'users': (60 * 15, 1),  # authenticated users, see scoopjoy.backends
+    'sessions': (60 * 60 * 24 * 14, 1),  # SESSION_COOKIE_AGE
 }
 
 
+def _cache(namespace, timeout, version):
+    config = {
+        'KEY_PREFIX': f'scoopjoy:{namespace}',
+        'VERSION': CACHE_VERSION * 1000 + version,
+        'TIMEOUT': timeout,
+    }
+    if CACHE_BACKEND == 'redis':
+        config.update(BACKEND='django.core.cache.backends.redis.RedisCache', LOCATION=REDIS_URL)
+    elif CACHE_BACKEND == 'file':
+        config.update(BACKEND='django.core.cache.backends.filebased.FileBasedCache',
+                      LOCATION=str(CACHE_DIR / namespace), OPTIONS={'MAX_ENTRIES': 10000})
+    elif CACHE_BACKEND == 'db':
+        config.update(BACKEND='django.core.cache.backends.db.DatabaseCache',
+                      LOCATION=f'scoopjoy_cache_{namespace}', OPTIONS={'MAX_ENTRIES': 10000})
+    else:
+        config.update(BACKEND='django.core.cache.backends.locmem.LocMemCache', LOCATION=namespace)
+    return config
+
+
+CACHES = {name: _cache(name, *spec) for name, spec in CACHE_NAMESPACES.items()}
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.1/topics/http/sessions/
+
+# SESSION_STORE=cached_db (default) reads sessions from the sessions cache
+# namespace and only falls back to django_session on a miss; signed_cookies
+# keeps them in the browser (no server-side logout); db is Django's default.
+SESSION_STORE = os.environ.get('SESSION_STORE', 'cached_db')
+SESSION_ENGINE = {
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'db': 'django.contrib.sessions.backends.db',
+}[SESSION_STORE]
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_COOKIE_AGE = CACHE_NAMESPACES['sessions'][0]
+# Only write a session back when the request changed it.
+SESSION_SAVE_EVERY_REQUEST = False
+
+# The logged-in user is read from the users cache namespace instead of the
+# database on every request. Sessions from before this setting still name
+# ModelBackend; scoopjoy.backends.LegacyBackendSessionMiddleware moves them over.
+AUTHENTICATION_BACKENDS = ['scoopjoy.backends.CachedModelBackend']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -121,6 +311,51 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS=[BASE_DIR/'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic bundles, minifies, fingerprints and precompresses assets
+# (scoopjoy.staticbuild). Development keeps serving the source files.
+STATIC_BUNDLING = os.environ.get('STATIC_BUNDLING', '0' if DEBUG else '1') == '1'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'scoopjoy.staticbuild.BundledManifestStaticFilesStorage' if STATIC_BUNDLING
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+# Let Django serve STATIC_ROOT itself (scoopjoy.staticserve) when there is
+# no front-end server in front of it.
+SERVE_STATIC = os.environ.get('SERVE_STATIC', '0') == '1'
+
+# Per-page bundles; base.css/base.js stay separate so they are cached once
+# for the whole site.
+STATIC_BUNDLES = {
+    'base.css': ['css/base.css'],
+    'base.js': ['js/base.js'],
+    'home.css': ['css/home.css'],
+    'home.js': ['js/home.js'],
+    'products.css': ['css/iceCreamBars.css'],
+    'products.js': ['js/cart_batch.js', 'js/products.js'],
+    'cart.css': ['css/cart.css'],
+    'cart.js': ['js/cart_batch.js', 'js/cart.js'],
+    'checkout.css': ['css/checkout.css'],
+    'checkout.js': ['js/checkout.js'],
+    'flavor_quiz.css': ['css/flavor_quiz.css'],
+    'flavor_quiz.js': ['js/flavor_quiz.js'],
+    'login.css': ['css/login.css'],
+    'login.js': ['js/login.js'],
+    'orders.css': ['css/orders.css'],
+    'profile.css': ['css/profile.css', 'css/orders.css'],
+    'profile.js': ['js/profile.js'],
+    'quiz_landing.css': ['css/quiz_landing.css'],
+    'recipes.css': ['css/recipes.css'],
+    'signup.css': ['css/signup.css'],
+    'signup.js': ['js/signup.js'],
+}
 
 MEDIA_URL='media/'
 
@@ -140,3 +375,49 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'scoopjoyservice@gmail.com'
 EMAIL_HOST_PASSWORD = 'velp kmbo uxrc bzfe'  # Use an app-specific password
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.1/topics/logging/
+
+# Every record goes through scoopjoy.logs.LogQueueHandler: request threads
+# enqueue and a background thread writes JSON lines to LOG_FILE (or stderr).
+# The app logs at INFO even under DEBUG; debug output is opt-in through
+# LOG_LEVELS, which overrides levels per logger, e.g.
+# LOG_LEVELS="scoopjoy=DEBUG,django.db.backends=DEBUG".
+# LOG_DEBUG_SAMPLE_RATE keeps that fraction of DEBUG records.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_LEVELS = {
+    'django': 'INFO',
+    'django.request': 'WARNING',
+    'scoopjoy': 'INFO',
+}
+for item in filter(None, os.environ.get('LOG_LEVELS', '').split(',')):
+    name, _, level = item.partition('=')
+    LOG_LEVELS[name.strip()] = level.strip().upper()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample_debug': {
+            '()': 'scoopjoy.logs.DebugSampler',
+            'rate': float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1' if DEBUG else '0.01')),
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'scoopjoy.logs.LogQueueHandler',
+            'filename': os.environ.get('LOG_FILE') or None,
+            'format': os.environ.get('LOG_FORMAT', 'json'),
+            'filters': ['sample_debug'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Replace Django's own console/mail_admins handlers with the queue.
+        name: {'handlers': ['queue'], 'level': level, 'propagate': False} if name == 'django'
+        else {'level': level}
+        for name, level in LOG_LEVELS.items()
+    },
+}
@@ -0,0 +1,32 @@
+"""
+Settings for the test suite, whichever runner starts it:
+
+    python manage.py test --settings=icecream.settings_test
+    DJANGO_SETTINGS_MODULE=icecream.settings_test python -m pytest
+
+Everything the tests rely on is pinned here instead of being taken from the
+environment: per-process caches, no background threads and no log output.
+A test that needs another value uses ``override_settings``.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES, LOGGING
+
+# Whatever CACHE_BACKEND says, tests never touch a shared cache.
+CACHE_BACKEND = 'locmem'
+CACHES = {
+    name: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': name,
+        'KEY_PREFIX': config['KEY_PREFIX'],
+        'VERSION': config['VERSION'],
+        'TIMEOUT': config['TIMEOUT'],
+    }
+    for name, config in CACHES.items()
+}
+
+# Tests run background work themselves.
+SALES_ROLLUP = 'worker'
+IMAGE_DERIVATIVES = 'worker'
+
+# Log records still reach assertLogs, but nothing is written to stderr.
+LOGGING = {**LOGGING, 'handlers': {'queue': {'class': 'logging.NullHandler'}}}
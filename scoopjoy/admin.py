@@ -1,9 +1,34 @@
 from django.contrib import admin
 from .models import *
+from . import cart
+
+
+class CartItemAdmin(admin.ModelAdmin):
+    # Keep CartSummary in step with edits made outside the storefront.
+    def save_model(self, request, obj, form, change):
+        previous = form.initial.get('user') if change else None
+        super().save_model(request, obj, form, change)
+        cart.refresh_summary(obj.user_id)
+        # The line may have been moved out of another user's cart.
+        if previous and previous != obj.user_id:
+            cart.refresh_summary(previous)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cart.refresh_summary(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            cart.refresh_summary(user_id)
+
+
 # Register your models here.
 admin.site.register(CustomUser)
 admin.site.register(FavoriteFlavor)
 admin.site.register(Order)
 admin.site.register(Product)
-admin.site.register(CartItem)
-admin.site.register(Address)
\ No newline at end of file
+admin.site.register(CartItem, CartItemAdmin)
+admin.site.register(Address)
+admin.site.register(OutgoingEmail)
@@ -0,0 +1,69 @@
+"""
+Authentication backend that serves the logged-in user from the cache.
+
+``AuthenticationMiddleware`` loads ``request.user`` on every request that
+touches it, which with ``ModelBackend`` is one query each time. Here the user
+is cached under a key carrying a per-user version number; saving or deleting
+the ``CustomUser`` bumps the version (see ``scoopjoy.signals``), so a reader
+that raced the write can only ever have filled an orphaned key.
+
+Django drops a session whose recorded backend is no longer in
+``AUTHENTICATION_BACKENDS``. ``LegacyBackendSessionMiddleware`` moves
+sessions logged in through ``ModelBackend`` (before this backend was
+configured) over to it, so deploying it logs nobody out.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.backends import ModelBackend
+
+from . import caches, versions
+
+BACKEND = 'scoopjoy.backends.CachedModelBackend'
+LEGACY_BACKENDS = ('django.contrib.auth.backends.ModelBackend',)
+
+
+def version_key(user_id):
+    return f'version:{user_id}'
+
+
+def user_key(user_id, version):
+    return f'user:{user_id}:{version}'
+
+
+def invalidate(user_id):
+    versions.bump_version(version_key(user_id), caches.users)
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = user_key(user_id, versions.get_version(version_key(user_id), caches.users))
+        user = caches.users.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                caches.users.set(key, user)
+        return user
+
+
+class LegacyBackendSessionMiddleware:
+    """Record ``CachedModelBackend`` on sessions that still name ``ModelBackend``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.session.get(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+            request.session[BACKEND_SESSION_KEY] = BACKEND
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if await request.session.aget(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+            await request.session.aset(BACKEND_SESSION_KEY, BACKEND)
+        return await self.get_response(request)
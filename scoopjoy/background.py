@@ -0,0 +1,44 @@
+"""
+Work that request threads hand off to a background thread.
+
+A ``BackgroundJob`` owns one worker thread. ``schedule()`` (usually called
+from ``transaction.on_commit``) asks for one run of its function; requests
+made while a run is already waiting are folded into it, and a request made
+while the function is running queues exactly one more run, so nothing
+handed over in the meantime is missed.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundJob:
+    def __init__(self, func, name):
+        self.func = func
+        self.name = name
+        self._lock = threading.Lock()
+        self._executor = None
+        self._scheduled = False
+
+    def schedule(self):
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        self._executor.submit(self._run)
+
+    def _run(self):
+        with self._lock:
+            self._scheduled = False
+        try:
+            self.func()
+        except Exception:
+            logger.exception("Background job %s failed", self.name)
+        finally:
+            connections.close_all()
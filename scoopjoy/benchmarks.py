@@ -0,0 +1,358 @@
+"""
+Load-test and latency benchmark for the storefront routes.
+
+``seed`` fills the database with users, products, carts and orders, and
+``run`` drives the real URL routes through Django test clients from several
+threads, recording per-request latency and SQL query counts. ``compare``
+checks a report against a saved baseline. The ``bench`` management command
+wraps all of this around a throwaway database; the test suite runs a small
+configuration of it.
+
+``run_served`` compares the two ways the app is deployed: a WSGI server's
+fixed pool of worker threads against one ASGI event loop, for the JSON
+endpoints that browsers poll.
+"""
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from . import cart, catalog, search
+from .models import Address, CartItem, CustomUser, Order, OrderItem, Product
+
+PASSWORD = 'bench-password'
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    # A dict, or a callable taking (user_id, address_id) and returning one.
+    data: object = None
+    auth: bool = False
+    json: bool = True
+    # Called with (client, context) before each request, outside the timing.
+    prepare: callable = None
+
+
+def _ensure_cart(client, ctx):
+    client.post(f"/cart/add/{ctx['product_ids'][0]}/")
+
+
+def default_scenarios(ctx):
+    product_id = ctx['product_ids'][0]
+    return [
+        Scenario('products', 'get', '/api/products/'),
+        Scenario('products_category', 'get', '/api/products/?category=cones'),
+        Scenario('search', 'get', '/api/search/?q=choc'),
+        Scenario('cart_add', 'post', f'/cart/add/{product_id}/', auth=True),
+        Scenario('cart_update', 'post', f'/cart/update/{product_id}/',
+                 data={'action': 'increment'}, auth=True, prepare=_ensure_cart),
+        Scenario('place_order', 'post', '/place-order/',
+                 data=lambda user_id, address_id: {'selected_address': address_id},
+                 auth=True, json=False, prepare=_ensure_cart),
+        Scenario('orders', 'get', '/orders/', auth=True),
+    ]
+
+
+def api_scenarios(ctx):
+    """The polled and autocomplete JSON endpoints, all async views."""
+    return [
+        Scenario('check_auth', 'get', '/api/check-auth/', auth=True),
+        Scenario('cart_count', 'get', '/cart/count/', auth=True),
+        Scenario('cart_items', 'get', '/cart/items/', auth=True),
+        Scenario('products', 'get', '/api/products/?category=cones'),
+        Scenario('search', 'get', '/api/search/?q=choc'),
+        Scenario('bootstrap', 'get', '/api/bootstrap/?category=cones', auth=True),
+    ]
+
+
+def seed(users=10, products=40, cart_lines=3, orders=5):
+    """Create benchmark data; returns a context dict used by the scenarios."""
+    categories = [key for key, _ in Product.CATEGORY_CHOICES]
+    product_objs = Product.objects.bulk_create([
+        Product(
+            name=f'Bench {"Choco" if i % 3 == 0 else "Vanilla"} {i}',
+            price=50 + i % 7 * 10,
+            image='product_images/bench.jpg',
+            category=categories[i % len(categories)],
+        ) for i in range(products)
+    ])
+    user_objs = []
+    for i in range(users):
+        user = CustomUser.objects.create_user(
+            username=f'bench{i}', email=f'bench{i}@example.com', password=PASSWORD)
+        user_objs.append(user)
+    addresses = Address.objects.bulk_create([
+        Address(user=u, name=u.username, phone='0000000000', pin_code='000000',
+                state='Bench', district='Bench', address='1 Bench Street', is_default=True)
+        for u in user_objs
+    ])
+    CartItem.objects.bulk_create([
+        CartItem(user=u, product=product_objs[(i + j) % products], quantity=1 + j)
+        for i, u in enumerate(user_objs) for j in range(cart_lines)
+    ])
+    for user, address in zip(user_objs, addresses):
+        for n in range(orders):
+            items = [
+                OrderItem(product=product_objs[(n + k) % products],
+                          quantity=1, total_price=product_objs[(n + k) % products].price)
+                for k in range(cart_lines)
+            ]
+            # Filled in the way place_order fills them; order history reads item_count.
+            order = Order.objects.create(
+                user=user, address=address,
+                total_amount=sum(item.total_price for item in items),
+                item_count=sum(item.quantity for item in items),
+            )
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+        cart.refresh_summary(user.pk)
+
+    # bulk_create skips the signals that keep these in sync.
+    catalog.rebuild()
+    search.reset()
+    return {
+        'users': [(u.pk, a.pk) for u, a in zip(user_objs, addresses)],
+        'product_ids': [p.pk for p in product_objs],
+    }
+
+
+@contextmanager
+def throwaway_database():
+    """Run against a fresh test database that client threads can share.
+
+    SQLite gets a temporary file instead of the usual in-memory database so
+    that every thread sees committed data.
+    """
+    setup_test_environment()
+    fd, db_path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = db_path
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        for path in (db_path, db_path + '-wal', db_path + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+@dataclass
+class _Samples:
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+
+
+def _worker(scenario, ctx, user, requests, samples, lock):
+    # Count server errors instead of letting them abort the worker.
+    client = Client(raise_request_exception=False)
+    if scenario.auth:
+        client.force_login(CustomUser.objects.get(pk=user[0]))
+    data = scenario.data(*user) if callable(scenario.data) else scenario.data
+    kwargs = {}
+    if scenario.method == 'post':
+        if scenario.json:
+            kwargs.update(data=json.dumps(data or {}), content_type='application/json')
+        else:
+            kwargs['data'] = data or {}
+    local = _Samples()
+    try:
+        for _ in range(requests):
+            if scenario.prepare:
+                scenario.prepare(client, ctx)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, scenario.method)(scenario.path, **kwargs)
+                elapsed = time.perf_counter() - start
+            local.latencies.append(elapsed * 1000)
+            if response.status_code >= 400:
+                local.errors += 1
+            else:
+                local.queries.append(len(queries))
+    finally:
+        connection.close()
+    with lock:
+        samples.latencies.extend(local.latencies)
+        samples.queries.extend(local.queries)
+        samples.errors += local.errors
+
+
+def run_scenario(scenario, ctx, concurrency=4, requests=50):
+    samples, lock = _Samples(), threading.Lock()
+    users = ctx['users']
+    if concurrency == 1:
+        start = time.perf_counter()
+        _worker(scenario, ctx, users[0], requests, samples, lock)
+        wall = time.perf_counter() - start
+    else:
+        threads = [
+            threading.Thread(target=_worker, args=(scenario, ctx, users[i % len(users)], requests, samples, lock))
+            for i in range(concurrency)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+    count = len(samples.latencies)
+    return {
+        'requests': count,
+        'errors': samples.errors,
+        'p50_ms': round(percentile(samples.latencies, 50), 3),
+        'p95_ms': round(percentile(samples.latencies, 95), 3),
+        'p99_ms': round(percentile(samples.latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(samples.latencies), 3) if count else 0.0,
+        'throughput_rps': round(count / wall, 1) if wall else 0.0,
+        'queries_per_request': round(statistics.fmean(samples.queries), 2) if count else 0.0,
+        'max_queries': max(samples.queries, default=0),
+    }
+
+
+def run(ctx, scenarios=None, concurrency=4, requests=50, only=None):
+    report = {}
+    for scenario in scenarios or default_scenarios(ctx):
+        if only and scenario.name not in only:
+            continue
+        report[scenario.name] = run_scenario(scenario, ctx, concurrency, requests)
+    return report
+
+
+def _served_report(latencies, errors, wall):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+def _run_wsgi(scenario, ctx, concurrency, requests, threads):
+    """``concurrency`` clients sharing a pool of ``threads`` workers.
+
+    Latency is measured from when a request is queued, so time spent
+    waiting for a free worker counts, as it does behind a real WSGI server.
+    """
+    local = threading.local()
+    users = iter(ctx['users'] * (threads // len(ctx['users']) + 1))
+    users_lock = threading.Lock()
+
+    def init():
+        local.client = Client(raise_request_exception=False)
+        if scenario.auth:
+            with users_lock:
+                user_id = next(users)[0]
+            local.client.force_login(CustomUser.objects.get(pk=user_id))
+
+    def call():
+        return getattr(local.client, scenario.method)(scenario.path).status_code >= 400
+
+    def browse(pool):
+        # One client: each request waits for the previous response.
+        samples = []
+        for _ in range(requests):
+            queued = time.perf_counter()
+            failed = pool.submit(call).result()
+            samples.append(((time.perf_counter() - queued) * 1000, failed))
+        return samples
+
+    def on_every_worker(pool, func):
+        barrier = threading.Barrier(threads)
+        list(pool.map(lambda _: (barrier.wait(), func()), range(threads)))
+
+    with ThreadPoolExecutor(threads, initializer=init) as pool:
+        # Start (and log in) every worker before the clock starts.
+        on_every_worker(pool, lambda: None)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as browsers:
+            results = [r for samples in browsers.map(browse, [pool] * concurrency) for r in samples]
+        wall = time.perf_counter() - start
+        on_every_worker(pool, connections.close_all)
+    return _served_report([r[0] for r in results], sum(r[1] for r in results), wall)
+
+
+async def _run_asgi(scenario, ctx, concurrency, requests):
+    """``concurrency`` clients served concurrently by one event loop."""
+    clients = []
+    for i in range(concurrency):
+        client = AsyncClient(raise_request_exception=False)
+        if scenario.auth:
+            user = await CustomUser.objects.aget(pk=ctx['users'][i % len(ctx['users'])][0])
+            await client.aforce_login(user)
+        clients.append(client)
+    latencies, errors = [], 0
+
+    async def poll(client):
+        nonlocal errors
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await getattr(client, scenario.method)(scenario.path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(poll(client) for client in clients))
+    return _served_report(latencies, errors, time.perf_counter() - start)
+
+
+def run_served(ctx, servers=('wsgi', 'asgi'), concurrency=32, requests=10, threads=4, only=None):
+    """Report per server and route for the JSON endpoints under concurrent load."""
+    report = {}
+    for server in servers:
+        report[server] = {}
+        for scenario in api_scenarios(ctx):
+            if only and scenario.name not in only:
+                continue
+            if server == 'wsgi':
+                result = _run_wsgi(scenario, ctx, concurrency, requests, threads)
+            else:
+                result = asyncio.run(_run_asgi(scenario, ctx, concurrency, requests))
+            report[server][scenario.name] = result
+    return report
+
+
+def compare(report, baseline, tolerance=0.25):
+    """Return a message for every route that regressed against ``baseline``.
+
+    Latency regresses when p95 grows by more than ``tolerance``; query
+    counts regress on any increase.
+    """
+    problems = []
+    for name, base in baseline.items():
+        current = report.get(name)
+        if current is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if current['max_queries'] > base['max_queries']:
+            problems.append(f"{name}: {current['max_queries']} queries > baseline {base['max_queries']}")
+        if current['errors'] > base.get('errors', 0):
+            problems.append(f"{name}: {current['errors']} errors")
+    return problems
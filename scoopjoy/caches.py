@@ -0,0 +1,14 @@
+"""
+The cache namespaces configured in ``settings.CACHES``.
+
+Each namespace is its own cache alias with its own key prefix, version and
+default TTL, so code stores entries without spelling out timeouts and one
+namespace can be flushed or versioned away without touching the others.
+"""
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+cart = ConnectionProxy(caches, 'cart')
+catalog = ConnectionProxy(caches, 'catalog')
+otp = ConnectionProxy(caches, 'otp')
+users = ConnectionProxy(caches, 'users')
@@ -0,0 +1,413 @@
+"""
+Cart loading, cart mutations and the denormalized per-user cart summary.
+
+Pages and endpoints that show cart lines read them through ``load``, which
+fetches lines, products and prices in one joined query.
+
+Every ``CartItem`` write made by the views goes through this module so the
+matching ``CartSummary`` row (total quantity, total price and a version
+number) is updated in the same transaction. Increments are single
+``UPDATE``/upsert statements that return the new values (or, on SQLite
+before 3.35, read them back in the same transaction), so concurrent clicks
+on the same cart never lose an update. Reads are served from the cache
+under a key carrying a per-user version number, the same scheme
+``scoopjoy.backends`` uses for users: writes bump the version once they
+commit, so a reader that raced the write can only ever have filled an
+orphaned key.
+"""
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+
+from . import caches, versions
+from .models import CartItem, CartSummary, Product
+
+CENTS = Decimal('0.01')
+MAX_BATCH_OPERATIONS = 100
+BATCH_OPERATIONS = ('add', 'increment', 'decrement', 'set', 'remove')
+
+# ``Product.unit_price`` in SQL: a NULL or 0 discounted price means no discount.
+UNIT_PRICE_SQL = 'COALESCE(NULLIF(discounted_price, 0), price)'
+
+
+def version_key(user_id):
+    return f'version:{user_id}'
+
+
+def summary_key(user_id, version):
+    return f'summary:{user_id}:{version}'
+
+
+def unit_price(prefix='product__'):
+    """``Product.unit_price`` as an ORM expression over ``prefix`` fields."""
+    return Coalesce(NullIf(f'{prefix}discounted_price', Value(Decimal(0))), f'{prefix}price')
+
+
+def priced_lines(user_id):
+    """Cart lines with their product, ``unit_price`` and ``line_total`` in one query."""
+    price = unit_price()
+    return (
+        CartItem.objects.filter(user_id=user_id)
+        .select_related('product')
+        .annotate(unit_price=price, line_total=F('quantity') * price)
+        .order_by('id')
+    )
+
+
+class LoadedCart:
+    """A user's cart lines plus totals computed once from them."""
+
+    def __init__(self, lines):
+        for line in lines:
+            line.line_total = Decimal(line.line_total).quantize(CENTS)
+        self.lines = lines
+        self.total_quantity = sum(line.quantity for line in lines)
+        self.total_price = sum((line.line_total for line in lines), Decimal(0)).quantize(CENTS)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def quantities(self):
+        return {str(line.product_id): line.quantity for line in self.lines}
+
+
+def load(user_id):
+    return LoadedCart(list(priced_lines(user_id)))
+
+
+async def aload(user_id):
+    return LoadedCart([line async for line in priced_lines(user_id)])
+
+
+async def aquantities(user_id):
+    """(summary, ``{product id: quantity}``), the map cached per summary version."""
+    summary = await aget_summary(user_id)
+    key = f'quantities:{user_id}:{summary.version}'
+    quantities = await caches.cart.aget(key)
+    if quantities is None:
+        quantities = (await aload(user_id)).quantities()
+        await caches.cart.aset(key, quantities)
+    return summary, quantities
+
+
+def _invalidate_on_commit(user_id):
+    # Moving the version, rather than deleting the entry, also orphans a
+    # summary that a reader read before the commit and caches after it.
+    transaction.on_commit(lambda: versions.bump_version(version_key(user_id), caches.cart))
+
+
+def get_summary(user_id):
+    """Return the user's ``CartSummary``, reading the cache first."""
+    key = summary_key(user_id, versions.get_version(version_key(user_id), caches.cart))
+    summary = caches.cart.get(key)
+    if summary is None:
+        try:
+            summary = CartSummary.objects.get(user_id=user_id)
+        except CartSummary.DoesNotExist:
+            return refresh_summary(user_id)
+        # Inside a transaction the row may hold our own uncommitted write,
+        # and a rollback would not move the version.
+        transaction.on_commit(lambda: caches.cart.add(key, summary))
+    return summary
+
+
+async def aget_summary(user_id):
+    key = summary_key(user_id, await versions.aget_version(version_key(user_id), caches.cart))
+    summary = await caches.cart.aget(key)
+    if summary is None:
+        try:
+            summary = await CartSummary.objects.aget(user_id=user_id)
+        except CartSummary.DoesNotExist:
+            return await sync_to_async(refresh_summary)(user_id)
+        await caches.cart.aadd(key, summary)
+    return summary
+
+
+def refresh_summary(user_id):
+    """Recompute the summary from the user's cart lines."""
+    line_price = F('quantity') * unit_price()
+    with transaction.atomic():
+        totals = CartItem.objects.filter(user_id=user_id).aggregate(
+            total_quantity=Sum('quantity'),
+            total_price=Sum(line_price, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        )
+        return _store_summary(user_id, totals['total_quantity'] or 0, totals['total_price'] or 0)
+
+
+def refresh_summaries(user_ids):
+    """Recompute the summaries of ``user_ids`` in one UPDATE.
+
+    Only existing summary rows are rewritten; a cart without one is summed
+    by ``get_summary`` the first time it is read.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    price_field = DecimalField(max_digits=10, decimal_places=2)
+    lines = CartItem.objects.filter(user_id=OuterRef('user_id')).order_by().values('user_id')
+    line_price = F('quantity') * unit_price()
+    quantity = lines.annotate(total=Sum('quantity')).values('total')
+    price = lines.annotate(total=Sum(line_price, output_field=price_field)).values('total')
+    with transaction.atomic():
+        rows = CartSummary.objects.filter(user_id__in=user_ids).update(
+            total_quantity=Coalesce(Subquery(quantity), 0),
+            total_price=Coalesce(Subquery(price), Value(Decimal(0)), output_field=price_field),
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        for user_id in user_ids:
+            _invalidate_on_commit(user_id)
+    return rows
+
+
+def _store_summary(user_id, total_quantity, total_price):
+    summary, _ = CartSummary.objects.select_for_update().get_or_create(user_id=user_id)
+    summary.total_quantity = total_quantity
+    summary.total_price = Decimal(total_price).quantize(CENTS)
+    summary.version += 1
+    summary.save()
+    _invalidate_on_commit(user_id)
+    return summary
+
+
+def _returning(sql, params, columns, table, where, where_params):
+    """Run the write ``sql`` and return ``columns`` of the one row it touched, or None.
+
+    RETURNING needs SQLite 3.35; on older builds the row is read back with
+    ``where`` in the same transaction, which already holds the write lock.
+    """
+    with connection.cursor() as cursor:
+        if connection.features.can_return_columns_from_insert:
+            cursor.execute(f'{sql} RETURNING {columns}', params)
+        else:
+            cursor.execute(sql, params)
+            cursor.execute(f'SELECT {columns} FROM {table} WHERE {where}', where_params)
+        return cursor.fetchone()
+
+
+def _tables():
+    qn = connection.ops.quote_name
+    return qn(CartItem._meta.db_table), qn(CartSummary._meta.db_table), qn(Product._meta.db_table)
+
+
+def _apply_delta(user_id, quantity, price):
+    """Shift the summary by ``quantity`` units at ``price`` in one statement.
+
+    The amount is worked out in Decimal and the stored total rounded to
+    cents, so SQLite's floating-point NUMERIC cannot drift over many writes.
+    """
+    _, summaries, _ = _tables()
+    now = timezone.now()
+    amount = quantity * _money(price)
+    row = _returning(
+        f"UPDATE {summaries} SET total_quantity = total_quantity + %s, "
+        f"total_price = ROUND(total_price + %s, 2), "
+        f"version = version + 1, updated_at = %s WHERE user_id = %s",
+        [quantity, amount, connection.ops.adapt_datetimefield_value(now), user_id],
+        'id, total_quantity, total_price, version', summaries, 'user_id = %s', [user_id],
+    )
+    if row is None:
+        # Carts that predate the summary table are backfilled on first write.
+        return refresh_summary(user_id)
+    pk, total_quantity, total_price, version = row
+    summary = CartSummary(
+        id=pk, user_id=user_id, total_quantity=total_quantity,
+        total_price=_money(total_price), version=version, updated_at=now,
+    )
+    _invalidate_on_commit(user_id)
+    return summary
+
+
+def _money(value):
+    # Raw cursors return NUMERIC columns as int or float on SQLite.
+    return Decimal(str(value)).quantize(CENTS)
+
+
+def add_item(user, product):
+    """Add one unit of ``product``; returns ``(cart_item, summary)``.
+
+    The line is upserted with INSERT ... ON CONFLICT DO UPDATE, so parallel
+    clicks each add a unit instead of overwriting one another.
+    """
+    items, _, products = _tables()
+    with transaction.atomic():
+        pk, quantity, price = _returning(
+            f"INSERT INTO {items} (user_id, product_id, quantity) VALUES (%s, %s, 1) "
+            f"ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = {items}.quantity + 1",
+            [user.pk, product.pk],
+            f"id, quantity, (SELECT {UNIT_PRICE_SQL} FROM {products} WHERE id = product_id)",
+            items, 'user_id = %s AND product_id = %s', [user.pk, product.pk],
+        )
+        summary = _apply_delta(user.pk, 1, price)
+    item = CartItem(id=pk, user_id=user.pk, product=product, quantity=quantity)
+    item.line_total = quantity * _money(price)
+    return item, summary
+
+
+def change_quantity(user_id, product_id, delta):
+    """Add ``delta`` (which may be negative) to a cart line in one statement.
+
+    The line is deleted when it reaches zero. Returns ``(cart_item, summary)``;
+    ``cart_item`` carries ``line_total`` and is None once deleted. Raises
+    ``CartItem.DoesNotExist`` if the product is not in the cart.
+    """
+    items, _, products = _tables()
+    with transaction.atomic():
+        row = _returning(
+            f"UPDATE {items} SET quantity = CASE WHEN quantity + %s > 0 THEN quantity + %s ELSE 0 END "
+            f"WHERE user_id = %s AND product_id = %s",
+            [delta, delta, user_id, product_id],
+            f"id, quantity, (SELECT {UNIT_PRICE_SQL} FROM {products} WHERE id = product_id)",
+            items, 'user_id = %s AND product_id = %s', [user_id, product_id],
+        )
+        if row is None:
+            raise CartItem.DoesNotExist
+        pk, quantity, price = row
+        if quantity > 0:
+            item = CartItem(id=pk, user_id=user_id, product_id=product_id, quantity=quantity)
+            item.line_total = quantity * _money(price)
+            return item, _apply_delta(user_id, delta, price)
+        CartItem.objects.filter(pk=pk, quantity=0).delete()
+        # Clamped at zero, so the units actually removed are unknown here.
+        return None, refresh_summary(user_id)
+
+
+def set_quantity(user_id, item_id, quantity):
+    """Set a cart line to ``quantity``, deleting it when ``quantity`` <= 0.
+
+    Returns the summary; raises ``CartItem.DoesNotExist`` for unknown lines.
+    """
+    with transaction.atomic():
+        lines = CartItem.objects.filter(pk=item_id, user_id=user_id)
+        changed = lines.update(quantity=quantity) if quantity > 0 else lines.delete()[0]
+        if not changed:
+            raise CartItem.DoesNotExist
+        return refresh_summary(user_id)
+
+
+def remove_item(user_id, item_id):
+    return set_quantity(user_id, item_id, 0)
+
+
+def clear(user_id):
+    """Delete every line in the user's cart and reset the summary."""
+    with transaction.atomic():
+        CartItem.objects.filter(user_id=user_id).delete()
+        summary, _ = CartSummary.objects.select_for_update().get_or_create(user_id=user_id)
+        summary.total_quantity = 0
+        summary.total_price = 0
+        summary.version += 1
+        summary.save()
+        _invalidate_on_commit(user_id)
+    return summary
+
+
+def _parse_operations(operations):
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"at most {MAX_BATCH_OPERATIONS} operations per batch")
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+            raise ValueError(f"unknown operation: {operation!r}")
+        try:
+            product_id = int(operation['product'])
+            quantity = int(operation.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"invalid product or quantity: {operation!r}") from None
+        if quantity < 0:
+            raise ValueError(f"negative quantity: {operation!r}")
+        parsed.append((operation['op'], product_id, quantity))
+    return parsed
+
+
+def _fold(parsed, product_id):
+    """Fold one product's operations into ``(add, floor)``, or ``(None, quantity)``.
+
+    ``(add, floor)`` means the line becomes ``max(quantity + add, floor)``,
+    whatever its quantity is when the write lands; ``(None, quantity)`` sets it.
+    """
+    add, floor = 0, 0
+    for op, pid, quantity in parsed:
+        if pid != product_id:
+            continue
+        if op in ('add', 'increment', 'decrement'):
+            step = {'add': quantity, 'increment': 1}.get(op, -1)
+            floor = max(floor + step, 0)
+            if add is not None:
+                add += step
+        else:
+            add, floor = None, quantity if op == 'set' else 0
+    return add, floor
+
+
+def _write_lines(user_id, folded):
+    """Upsert the folded operations and drop the lines they leave at zero.
+
+    Relative changes are applied to the quantity in the row, not to the one
+    read earlier, so an ``add_item`` committed in between is kept.
+    """
+    items, _, _ = _tables()
+    relative = [
+        [user_id, product_id, max(add, floor), add, floor, add, floor]
+        for product_id, (add, floor) in folded.items() if add is not None
+    ]
+    absolute = [[user_id, product_id, floor] for product_id, (add, floor) in folded.items() if add is None]
+    insert = f"INSERT INTO {items} (user_id, product_id, quantity) VALUES (%s, %s, %s) ON CONFLICT (user_id, product_id) "
+    with connection.cursor() as cursor:
+        if relative:
+            cursor.executemany(
+                insert + f"DO UPDATE SET quantity = CASE WHEN {items}.quantity + %s > %s "
+                f"THEN {items}.quantity + %s ELSE %s END",
+                relative,
+            )
+        if absolute:
+            cursor.executemany(insert + "DO UPDATE SET quantity = excluded.quantity", absolute)
+    CartItem.objects.filter(user_id=user_id, product_id__in=folded, quantity__lte=0).delete()
+
+
+def apply_batch(user_id, operations):
+    """Apply an ordered list of cart operations in one transaction.
+
+    Each operation is ``{"op": ..., "product": id}`` where ``op`` is one of
+    ``add``/``increment``/``decrement``/``set``/``remove``. ``add`` and
+    ``set`` also take a ``quantity``, which defaults to 1. The operations are
+    folded per product into an increment (with a floor for ``decrement``) or,
+    after a ``set``/``remove``, a final quantity, and written with one upsert
+    per product and one delete.
+
+    Returns ``(loaded_cart, summary)``. Raises ``ValueError`` for malformed
+    operations or unknown products.
+    """
+    parsed = _parse_operations(operations)
+    product_ids = {product_id for _, product_id, _ in parsed}
+    if Product.objects.filter(pk__in=product_ids).count() != len(product_ids):
+        raise ValueError("unknown product in batch")
+
+    with transaction.atomic():
+        # Only read to skip batches that change nothing; the writes do not
+        # depend on these quantities.
+        quantities = dict(
+            CartItem.objects.filter(user_id=user_id, product_id__in=product_ids)
+            .values_list('product_id', 'quantity')
+        )
+        folded = {}
+        for product_id in product_ids:
+            add, floor = _fold(parsed, product_id)
+            current = quantities.get(product_id, 0)
+            if (floor if add is None else max(current + add, floor)) != current:
+                folded[product_id] = (add, floor)
+        if folded:
+            _write_lines(user_id, folded)
+
+        loaded = load(user_id)
+        summary = _store_summary(user_id, loaded.total_quantity, loaded.total_price) if folded else get_summary(user_id)
+    return loaded, summary
@@ -0,0 +1,112 @@
+"""
+In-process snapshot of the product catalog.
+
+The snapshot is built once from ``Product`` and rebuilt by the signal
+handlers in ``scoopjoy.signals`` whenever a product is saved or deleted,
+so the storefront endpoints never have to hit the database for it.
+
+Each process holds its own snapshot, but the catalog version (see
+``scoopjoy.versions``) lives in the shared cache. A snapshot is stamped with
+the version it was built at, and ``get_catalog`` rebuilds it once the shared
+version has moved on, so a product written through another worker shows up
+here too. The search index and the recommender are keyed on the snapshot and
+follow it.
+"""
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+
+from . import images, routers, versions
+from .models import Product
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def _serialize(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'image': product.image.url if product.image else '',
+        'srcset': images.srcset(product, 'webp'),
+        'srcset_avif': images.srcset(product, 'avif'),
+        'category': product.category,
+    }
+
+
+def _encode(products):
+    return json.dumps({'products': list(products)}).encode('utf-8')
+
+
+class CatalogSnapshot:
+    """Immutable view of every product, indexed by id and by category."""
+
+    __slots__ = ('version', 'products', 'by_id', 'by_category', '_payloads')
+
+    def __init__(self, products, version=None):
+        self.version = version
+        self.products = tuple(products)
+        self.by_id = {p['id']: p for p in self.products}
+        by_category = {key: [] for key, _ in Product.CATEGORY_CHOICES}
+        for p in self.products:
+            by_category.setdefault(p['category'], []).append(p)
+        self.by_category = {key: tuple(items) for key, items in by_category.items()}
+
+        # Pre-encode every response products_api can return.
+        self._payloads = {None: _encode(self.products)}
+        for key, items in self.by_category.items():
+            self._payloads[key] = _encode(items)
+
+    def get(self, product_id):
+        return self.by_id.get(product_id)
+
+    def filter(self, category=None):
+        if not category:
+            return self.products
+        return self.by_category.get(category, ())
+
+    def payload(self, category=None):
+        """Return the encoded ``{"products": [...]}`` body for ``category``."""
+        if not category:
+            return self._payloads[None]
+        try:
+            return self._payloads[category]
+        except KeyError:
+            return _encode(())
+
+    @classmethod
+    def build(cls, version=None):
+        return cls((_serialize(p) for p in Product.objects.order_by('id')), version)
+
+
+def get_catalog():
+    """Return the current snapshot, building it on first use or once the catalog version moved."""
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != versions.catalog_version():
+        snapshot = rebuild()
+    return snapshot
+
+
+async def aget_catalog():
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != await versions.aget_version(versions.CATALOG_KEY):
+        snapshot = await sync_to_async(rebuild)()
+    return snapshot
+
+
+def rebuild():
+    global _snapshot
+    # Rebuilds follow product writes, which a lagging replica may not have yet.
+    with _lock, routers.use_primary():
+        # Read the version first: a write landing during the build moves it
+        # again, and the next read rebuilds rather than keeping a stale copy.
+        _snapshot = CatalogSnapshot.build(versions.catalog_version())
+        return _snapshot
+
+
+def invalidate():
+    global _snapshot
+    with _lock:
+        _snapshot = None
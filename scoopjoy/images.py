@@ -0,0 +1,194 @@
+"""
+Resized WebP/AVIF derivatives for uploaded and static images.
+
+Each source image gets one derivative per width in ``WIDTHS`` (never wider
+than the original) and per supported format, stored under ``derivatives/``
+next to it. Models record what was generated in a JSON field so templates
+and the catalog can emit ``srcset`` attributes without touching storage.
+
+Encoding is slow, so uploads never wait for it: ``queue_refresh`` hands the
+image to a background thread once the save commits (``IMAGE_DERIVATIVES =
+'thread'``), or leaves it to ``manage.py build_image_derivatives``
+(``'worker'``). Images that are missing or already up to date are skipped.
+"""
+import io
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.templatetags.static import static
+from PIL import Image, ImageOps, features
+
+from .background import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640, 960, 1600)
+FORMATS = tuple(fmt for fmt in ('avif', 'webp') if features.check(fmt))
+QUALITY = {'webp': 78, 'avif': 55}
+DERIVATIVES_DIR = 'derivatives'
+STATIC_MANIFEST = f'{DERIVATIVES_DIR}/manifest.json'
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# model label -> (image field, derivatives field)
+IMAGE_FIELDS = {
+    'scoopjoy.product': ('image', 'image_derivatives'),
+    'scoopjoy.customuser': ('profile_pic', 'profile_pic_derivatives'),
+}
+
+
+def derivative_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f'{DERIVATIVES_DIR}/{root}.w{width}.{fmt}'
+
+
+def target_widths(width):
+    widths = [w for w in WIDTHS if w < width]
+    if width <= WIDTHS[-1]:
+        widths.append(width)
+    return widths
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    options = {'quality': QUALITY[fmt]}
+    # Favour encode speed: the backfill runs over every image in static/.
+    if fmt == 'webp':
+        options['method'] = 4
+    else:
+        options['speed'] = 8
+    image.save(buffer, fmt.upper(), **options)
+    return buffer.getvalue()
+
+
+def generate(storage, name, formats=FORMATS):
+    """Write every derivative of ``name`` to ``storage`` and describe them."""
+    with storage.open(name, 'rb') as fh:
+        image = ImageOps.exif_transpose(Image.open(fh))
+        image.load()
+    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    width, height = image.size
+    widths = target_widths(width)
+    for w in widths:
+        resized = image if w == width else image.resize(
+            (w, max(1, round(height * w / width))), Image.LANCZOS)
+        for fmt in formats:
+            path = derivative_name(name, w, fmt)
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(_encode(resized, fmt)))
+    return {'source': name, 'width': width, 'widths': widths, 'formats': list(formats)}
+
+
+def build_srcset(info, fmt, url):
+    if not info or fmt not in info.get('formats', ()):
+        return ''
+    return ', '.join(
+        f"{url(derivative_name(info['source'], w, fmt))} {w}w" for w in info['widths']
+    )
+
+
+def _fields(instance):
+    return IMAGE_FIELDS[instance._meta.label_lower]
+
+
+def srcset(instance, fmt='webp'):
+    """``srcset`` for a model's image, or '' if derivatives are missing or stale."""
+    image_field, info_field = _fields(instance)
+    file = getattr(instance, image_field)
+    info = getattr(instance, info_field)
+    if not file or not info or info.get('source') != file.name:
+        return ''
+    return build_srcset(info, fmt, file.storage.url)
+
+
+def needs_derivatives(instance):
+    image_field, info_field = _fields(instance)
+    file = getattr(instance, image_field)
+    return bool(file) and (getattr(instance, info_field) or {}).get('source') != file.name
+
+
+def refresh(instance):
+    """Generate derivatives for ``instance`` and save just the field recording them.
+
+    Saving lets the usual post_save handlers refresh the catalog and the
+    cached user. Returns None when the source image is missing or unreadable.
+    """
+    image_field, info_field = _fields(instance)
+    file = getattr(instance, image_field)
+    if not file.storage.exists(file.name):
+        logger.debug("No derivatives for %s: the file is missing", file.name)
+        return None
+    try:
+        info = generate(file.storage, file.name)
+    except Exception as e:
+        logger.warning("Could not build derivatives for %s: %s", file.name, e)
+        return None
+    setattr(instance, info_field, info)
+    instance.save(update_fields=[info_field])
+    return info
+
+
+_pending = {}  # (model label, pk) -> image name
+_pending_lock = threading.Lock()
+
+
+def queue_refresh(instance):
+    """Build ``instance``'s derivatives off the request thread once the save commits."""
+    if getattr(settings, 'IMAGE_DERIVATIVES', 'thread') != 'thread':
+        return
+    key = (instance._meta.label_lower, instance.pk)
+    name = getattr(instance, _fields(instance)[0]).name
+
+    def hand_over():
+        with _pending_lock:
+            _pending[key] = name
+        _job.schedule()
+
+    transaction.on_commit(hand_over)
+
+
+def build_pending():
+    """Build every image handed over by ``queue_refresh``; runs on the job thread."""
+    while True:
+        with _pending_lock:
+            if not _pending:
+                return
+            (label, pk), name = _pending.popitem()
+        model = apps.get_model(label)
+        image_field, _ = IMAGE_FIELDS[label]
+        # Check storage first: a missing upload costs no query.
+        if not model._meta.get_field(image_field).storage.exists(name):
+            continue
+        instance = model._default_manager.filter(pk=pk).first()
+        # Skip rows deleted, re-uploaded or already built in the meantime.
+        if instance is not None and getattr(instance, image_field).name == name and needs_derivatives(instance):
+            refresh(instance)
+
+
+_job = BackgroundJob(build_pending, 'image-derivatives')
+
+
+@lru_cache(maxsize=1)
+def static_manifest():
+    path = finders.find(STATIC_MANIFEST)
+    try:
+        if path:
+            with open(path) as fh:
+                return json.load(fh)
+        with staticfiles_storage.open(STATIC_MANIFEST) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def static_srcset(path, fmt='webp'):
+    return build_srcset(static_manifest().get(path), fmt, static)
@@ -0,0 +1,241 @@
+"""
+Per-request SQL and template instrumentation.
+
+QueryInstrumentationMiddleware counts the queries each view issues, how long
+they took, how long template rendering took and which statements ran more
+than once (the usual N+1 signature). The numbers go out on every response
+as ``X-Query-Count``/``Server-Timing`` headers and into a ring buffer that
+staff can read at /staff/query-stats/.
+
+With PROFILE_SAMPLE_RATE > 0 a sample of requests also runs under cProfile
+and the slowest PROFILE_KEEP of them are dumped to PROFILE_DIR as .prof files.
+"""
+import contextvars
+import cProfile
+import heapq
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+ENABLED = getattr(settings, 'QUERY_INSTRUMENTATION', settings.DEBUG)
+STATS_BUFFER = getattr(settings, 'QUERY_STATS_BUFFER', 500)
+PROFILE_SAMPLE_RATE = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+PROFILE_KEEP = getattr(settings, 'PROFILE_KEEP', 20)
+PROFILE_DIR = Path(getattr(settings, 'PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+# Requests to these paths are not recorded (they would only measure themselves).
+IGNORED_PREFIXES = ('/staff/query-stats/', '/' + settings.STATIC_URL.lstrip('/'))
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+_current = contextvars.ContextVar('request_stats', default=None)
+recent = deque(maxlen=STATS_BUFFER)
+_profiles = []  # min-heap of (duration, path) for the slowest sampled requests
+_profiles_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """Collapse a statement so repeats with different values compare equal."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _LITERAL.sub('?', sql)
+    return ' '.join(sql.split())
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self, limit=5):
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.fingerprints.most_common(limit) if count > 1
+        ]
+
+
+_render = Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    stats = _current.get()
+    if stats is None:
+        return _render(self, context, request)
+    start = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        stats.template_time += time.perf_counter() - start
+
+
+def _keep_profile(profile, duration, record):
+    """Dump ``profile`` if it is among the PROFILE_KEEP slowest seen so far."""
+    with _profiles_lock:
+        if len(_profiles) >= PROFILE_KEEP and duration <= _profiles[0][0]:
+            return
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        view = (record['view'] or 'unresolved').replace(':', '-')
+        path = PROFILE_DIR / f"{record['duration_ms']:09.1f}ms-{view}-{time.time_ns()}.prof"
+        profile.dump_stats(path)
+        heapq.heappush(_profiles, (duration, str(path)))
+        if len(_profiles) > PROFILE_KEEP:
+            Path(heapq.heappop(_profiles)[1]).unlink(missing_ok=True)
+
+
+def _record(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def _install(sender=None, connection=None, **kwargs):
+    # Installed on every connection, so queries that async views run through
+    # sync_to_async threads are counted too (the context variable follows them).
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+def _install_open(**kwargs):
+    # Connections opened on this thread before the middleware was loaded. Sync
+    # request_started receivers run on the thread the request's queries use.
+    for connection in connections.all(initialized_only=True):
+        _install(connection=connection)
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        Template.render = _timed_render
+        connection_created.connect(_install)
+        request_started.connect(_install_open)
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.path.startswith(IGNORED_PREFIXES):
+            return self.get_response(request)
+        state = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(state)
+        return self._finish(request, response, state)
+
+    async def __acall__(self, request):
+        if request.path.startswith(IGNORED_PREFIXES):
+            return await self.get_response(request)
+        state = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(state)
+        return self._finish(request, response, state)
+
+    def _start(self):
+        stats = RequestStats()
+        token = _current.set(stats)
+        profile = cProfile.Profile() if random.random() < PROFILE_SAMPLE_RATE else None
+        if profile:
+            profile.enable()
+        return stats, token, profile, time.perf_counter()
+
+    def _stop(self, state):
+        stats, token, profile, start = state
+        if profile:
+            profile.disable()
+        _current.reset(token)
+
+    def _finish(self, request, response, state):
+        stats, token, profile, start = state
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        record = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': stats.queries,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'template_ms': round(stats.template_time * 1000, 2),
+            'duplicates': stats.duplicates(),
+        }
+        recent.append(record)
+        if profile:
+            _keep_profile(profile, duration, record)
+
+        response['X-Query-Count'] = str(stats.queries)
+        response['Server-Timing'] = (
+            f"db;dur={record['db_ms']};desc=\"{stats.queries} queries\", "
+            f"tpl;dur={record['template_ms']}, total;dur={record['duration_ms']}"
+        )
+        return response
+
+
+def summary():
+    """Per-view aggregates over the ring buffer, worst offenders first."""
+    views = {}
+    for record in list(recent):
+        view = views.setdefault(record['view'] or record['path'], {
+            'requests': 0, 'queries': 0, 'max_queries': 0,
+            'db_ms': 0.0, 'template_ms': 0.0, 'duration_ms': 0.0, 'duplicates': Counter(),
+        })
+        view['requests'] += 1
+        view['queries'] += record['queries']
+        view['max_queries'] = max(view['max_queries'], record['queries'])
+        for key in ('db_ms', 'template_ms', 'duration_ms'):
+            view[key] += record[key]
+        for duplicate in record['duplicates']:
+            view['duplicates'][duplicate['sql']] = max(view['duplicates'][duplicate['sql']], duplicate['count'])
+
+    rows = []
+    for name, view in views.items():
+        n = view['requests']
+        rows.append({
+            'view': name,
+            'requests': n,
+            'avg_queries': round(view['queries'] / n, 1),
+            'max_queries': view['max_queries'],
+            'avg_db_ms': round(view['db_ms'] / n, 2),
+            'avg_template_ms': round(view['template_ms'] / n, 2),
+            'avg_duration_ms': round(view['duration_ms'] / n, 2),
+            'duplicates': [{'sql': sql, 'count': c} for sql, c in view['duplicates'].most_common(5)],
+        })
+    rows.sort(key=lambda row: (row['max_queries'], row['avg_duration_ms']), reverse=True)
+    return rows
+
+
+def slowest_profiles():
+    with _profiles_lock:
+        return [{'duration_ms': round(d * 1000, 2), 'path': p} for d, p in sorted(_profiles, reverse=True)]
@@ -0,0 +1,125 @@
+"""
+Structured, non-blocking logging.
+
+Every logger writes through ``LogQueueHandler``: the request thread only
+formats the message and puts the record on a bounded in-memory queue; a
+``QueueListener`` thread writes it out as one JSON object per line. When the
+queue is full the record is dropped (and counted) rather than making the
+request wait on stderr or the disk.
+
+``DebugSampler`` keeps only a fraction of DEBUG records, and ``Lazy`` defers
+building an expensive argument until a record is actually going to be kept::
+
+    logger.debug("cart for %s: %s", user_id, Lazy(lambda: cart.load(user_id).quantities()))
+
+Levels, sampling rate and output are set in ``settings.LOGGING``.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class Lazy:
+    """Log argument whose value is computed on first use."""
+
+    __slots__ = ('func', 'value')
+    _unset = object()
+
+    def __init__(self, func):
+        self.func = func
+        self.value = self._unset
+
+    def get(self):
+        if self.value is self._unset:
+            self.value = self.func()
+        return self.value
+
+    def __str__(self):
+        return str(self.get())
+
+    def __repr__(self):
+        return repr(self.get())
+
+
+class DebugSampler(logging.Filter):
+    """Pass ``rate`` of the DEBUG (and lower) records and every other record."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class LogQueueHandler(QueueHandler):
+    """Hand records to a background writer; never block the caller.
+
+    ``filename`` writes to that file (reopened if logrotate moves it),
+    otherwise to stderr. ``format`` is ``'json'`` or ``'text'``.
+    """
+
+    def __init__(self, filename=None, format='json', maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        target = WatchedFileHandler(filename) if filename else logging.StreamHandler(sys.stderr)
+        target.setFormatter(JsonFormatter() if format == 'json' else logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+        self._running = True
+        atexit.register(self.stop)
+
+    def prepare(self, record):
+        # Merge the arguments now (Lazy values are built here, in the caller,
+        # only for records that passed the level and filters), but keep the
+        # traceback separate so the formatter can put it in its own field.
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out what is still queued and end the writer thread."""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        super().close()
@@ -0,0 +1,127 @@
+"""
+Outbound email queue.
+
+Views call ``enqueue_mail`` which only inserts an ``OutgoingEmail`` row; the
+``send_queued_mail`` worker drains the table in batches over one SMTP
+connection and retries failures with exponential backoff.
+
+No transaction is open while mail is sent: a batch is leased to the worker
+in one short transaction (status ``sending``, ``next_attempt_at`` moved to
+the end of the lease) and each result is written as soon as the message
+has gone. Rows whose lease runs out, because a worker died mid-batch, are
+due again, so a crash loses nothing and resends at most the message that
+was in flight.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 50)
+MAX_ATTEMPTS = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+BACKOFF_SECONDS = getattr(settings, 'EMAIL_QUEUE_BACKOFF_SECONDS', 30)
+MAX_BACKOFF_SECONDS = 3600
+LEASE_SECONDS = getattr(settings, 'EMAIL_QUEUE_LEASE_SECONDS', 300)
+
+
+def enqueue_mail(subject, message, recipient_list, from_email=None, html_message=''):
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=message,
+        html_body=html_message or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(recipient_list),
+    )
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def _message(email, connection):
+    msg = EmailMultiAlternatives(
+        email.subject, email.body, email.from_email, email.to, connection=connection
+    )
+    if email.html_body:
+        msg.attach_alternative(email.html_body, 'text/html')
+    return msg
+
+
+def claim_batch(batch_size=BATCH_SIZE, lease=LEASE_SECONDS):
+    """Lease the next due emails to this worker and return them.
+
+    Workers running side by side on PostgreSQL skip each other's rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=('pending', 'sending'), next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for email in batch:
+            email.leased_from = (email.status, email.next_attempt_at)
+            email.status = 'sending'
+            email.attempts += 1
+            email.next_attempt_at = now + timedelta(seconds=lease)
+        OutgoingEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at'])
+    return batch
+
+
+def release(batch):
+    """Hand a leased batch back untouched, e.g. when SMTP is unreachable."""
+    for email in batch:
+        email.status, email.next_attempt_at = email.leased_from
+        email.attempts -= 1
+    OutgoingEmail.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at'])
+
+
+def _record(email):
+    # Only while the lease is still ours; an expired one may have been re-claimed.
+    OutgoingEmail.objects.filter(pk=email.pk, status='sending', attempts=email.attempts).update(
+        status=email.status,
+        next_attempt_at=email.next_attempt_at,
+        last_error=email.last_error,
+        sent_at=email.sent_at,
+    )
+
+
+def deliver_batch(connection=None, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Send one batch over ``connection``; returns ``(sent, failed)``."""
+    connection = connection or get_connection()
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+    try:
+        connection.open()
+    except Exception:
+        release(batch)
+        raise
+    sent = failed = 0
+    for email in batch:
+        try:
+            _message(email, connection).send()
+        except Exception as e:
+            failed += 1
+            email.last_error = str(e)
+            if email.attempts >= max_attempts:
+                email.status = 'failed'
+                logger.error("Giving up on email %s after %s attempts: %s", email.id, email.attempts, e)
+            else:
+                email.status = 'pending'
+                email.next_attempt_at = timezone.now() + backoff(email.attempts)
+                logger.warning("Email %s failed (attempt %s): %s", email.id, email.attempts, e)
+        else:
+            sent += 1
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.last_error = ''
+        _record(email)
+    return sent, failed
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from scoopjoy import benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway database and load-test the storefront routes, "
+            "reporting latency percentiles, throughput and queries per request as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--cart-lines', type=int, default=3)
+        parser.add_argument('--orders', type=int, default=10, help="Past orders per user.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Client threads per route.")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per client thread.")
+        parser.add_argument('--only', nargs='+', help="Route names to run (default: all).")
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+        parser.add_argument('--baseline', help="Fail if the report regresses against this JSON report.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed p95 growth over the baseline (default: 0.25).")
+
+    def handle(self, *args, **options):
+        with benchmarks.throwaway_database(), override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ):
+            ctx = benchmarks.seed(
+                users=options['users'], products=options['products'],
+                cart_lines=options['cart_lines'], orders=options['orders'],
+            )
+            report = benchmarks.run(
+                ctx, concurrency=options['concurrency'],
+                requests=options['requests'], only=options['only'],
+            )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+        self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)
+            problems = benchmarks.compare(report, baseline, options['tolerance'])
+            if problems:
+                raise CommandError("Regressions against baseline:\n  " + "\n  ".join(problems))
+            self.stdout.write("No regressions against baseline.")
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from scoopjoy import benchmarks
+
+SERVERS = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = ("Load-test the polled JSON endpoints (cart count, cart items, products, search, "
+            "auth check) behind a fixed pool of WSGI worker threads and behind one ASGI "
+            "event loop, and print a side-by-side comparison.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=SERVERS, default=list(SERVERS))
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--concurrency', type=int, default=32, help="Concurrent clients per route.")
+        parser.add_argument('--requests', type=int, default=10, help="Requests per client.")
+        parser.add_argument('--threads', type=int, default=4, help="WSGI worker threads.")
+        parser.add_argument('--only', nargs='+', help="Route names to run (default: all).")
+        parser.add_argument('--output', help="Write the JSON results to this file.")
+
+    def handle(self, *args, **options):
+        with benchmarks.throwaway_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+            ctx = benchmarks.seed(users=options['users'], products=100, cart_lines=3, orders=0)
+            results = benchmarks.run_served(
+                ctx, servers=options['servers'], concurrency=options['concurrency'],
+                requests=options['requests'], threads=options['threads'], only=options['only'],
+            )
+
+        self.stdout.write(f"{'server':<6} {'route':<12} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8} {'errors':>7}")
+        for server, report in results.items():
+            for route, row in report.items():
+                self.stdout.write(
+                    f"{server:<6} {route:<12} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                    f"{row['throughput_rps']:>8.1f} {row['errors']:>7}"
+                )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
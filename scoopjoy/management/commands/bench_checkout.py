@@ -0,0 +1,66 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from scoopjoy import benchmarks
+from scoopjoy.models import Address, CartItem, CustomUser, Product
+
+
+class Command(BaseCommand):
+    help = ("Time POST /place-order/ for carts of different sizes, against a throwaway "
+            "test database; the configured database is never touched.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 100],
+                            help="Cart sizes to benchmark (default: 1 10 100).")
+        parser.add_argument('--repeat', type=int, default=20,
+                            help="Orders placed per cart size (default: 20).")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'lines':>6} {'queries':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        with benchmarks.throwaway_database(), override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ):
+            for lines in options['lines']:
+                queries, timings = self.run(lines, options['repeat'])
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(
+                    f"{lines:>6} {queries:>8} {statistics.median(timings):>8.2f} "
+                    f"{p95:>8.2f} {timings[-1]:>8.2f}"
+                )
+
+    def run(self, lines, repeat):
+        # Each cart size starts from an empty database.
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(
+                username='bench-checkout', email='bench-checkout@example.com', password='bench')
+            address = Address.objects.create(
+                user=user, name='Bench', phone='0000000000', pin_code='000000',
+                state='Bench', district='Bench', address='Bench')
+            products = Product.objects.bulk_create([
+                Product(name=f'Bench {i}', price=10 + i, image='product_images/bench.jpg')
+                for i in range(lines)
+            ])
+            client = Client()
+            client.force_login(user)
+
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                CartItem.objects.bulk_create([
+                    CartItem(user=user, product=p, quantity=2) for p in products
+                ])
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    response = client.post('/place-order/', {'selected_address': address.id})
+                    timings.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.content
+                queries = len(ctx)
+            transaction.set_rollback(True)
+        return queries, timings
@@ -0,0 +1,80 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from scoopjoy import benchmarks
+
+# Connection OPTIONS compared on SQLite; other backends run as configured.
+SQLITE_PROFILES = {
+    'sqlite-default': {},
+    'sqlite-tuned': settings.SQLITE_TUNED_OPTIONS,
+}
+ROUTES = ['cart_add', 'place_order']
+
+
+class Command(BaseCommand):
+    help = ("Load-test the cart and checkout write path under each database profile "
+            "(SQLite defaults vs. the tuned WAL/IMMEDIATE mode, or the configured server) "
+            "and print a side-by-side comparison.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+',
+                            help="Profiles to run (default: both SQLite profiles, or 'configured').")
+        parser.add_argument('--users', type=int, default=8)
+        parser.add_argument('--concurrency', type=int, default=8, help="Client threads per route.")
+        parser.add_argument('--requests', type=int, default=25, help="Requests per client thread.")
+        parser.add_argument('--output', help="Write the JSON results to this file.")
+
+    def handle(self, *args, **options):
+        available = dict(SQLITE_PROFILES) if connection.vendor == 'sqlite' else {}
+        available['configured'] = None
+        profiles = options['profiles'] or [p for p in available if p != 'configured' or len(available) == 1]
+        unknown = set(profiles) - set(available)
+        if unknown:
+            raise CommandError(f"Unknown profile(s) {', '.join(sorted(unknown))}; choose from {', '.join(available)}.")
+
+        db_settings = connections.settings['default']
+        configured = db_settings.get('OPTIONS', {})
+        results = {}
+        try:
+            for profile in profiles:
+                options_for_profile = available[profile]
+                db_settings['OPTIONS'] = dict(configured if options_for_profile is None else options_for_profile)
+                connection.close()
+                results[profile] = self.run_profile(options)
+        finally:
+            db_settings['OPTIONS'] = configured
+            connection.close()
+
+        self.stdout.write(f"{'profile':<16} {'route':<12} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8} {'errors':>7}")
+        for profile, report in results.items():
+            for route, row in report.items():
+                self.stdout.write(
+                    f"{profile:<16} {route:<12} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                    f"{row['throughput_rps']:>8.1f} {row['errors']:>7}"
+                )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def run_profile(self, options):
+        # Failed requests are counted in the report; don't print each traceback.
+        request_log = logging.getLogger('django.request')
+        level = request_log.level
+        request_log.setLevel(logging.CRITICAL)
+        try:
+            return self._run_profile(options)
+        finally:
+            request_log.setLevel(level)
+
+    def _run_profile(self, options):
+        with benchmarks.throwaway_database(), override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ):
+            ctx = benchmarks.seed(users=options['users'], products=20, cart_lines=2, orders=0)
+            return benchmarks.run(ctx, concurrency=options['concurrency'], requests=options['requests'], only=ROUTES)
@@ -0,0 +1,64 @@
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+
+from scoopjoy import images
+from scoopjoy.models import CustomUser, Product
+
+
+class Command(BaseCommand):
+    help = ("Backfill WebP/AVIF derivatives for product images, profile pictures and static/ images. "
+            "With IMAGE_DERIVATIVES=worker, run it after uploads (e.g. from cron).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-media', action='store_true', help="Leave uploaded images alone.")
+        parser.add_argument('--skip-static', action='store_true', help="Leave static/ images alone.")
+        parser.add_argument('--force', action='store_true', help="Rebuild derivatives that are up to date.")
+
+    def handle(self, *args, **options):
+        if not options['skip_media']:
+            self.build_media(options['force'])
+        if not options['skip_static']:
+            self.build_static(options['force'])
+
+    def build_media(self, force):
+        built = 0
+        for model, field in ((Product, 'image'), (CustomUser, 'profile_pic')):
+            for instance in model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).iterator():
+                if force or images.needs_derivatives(instance):
+                    if images.refresh(instance):
+                        built += 1
+        self.stdout.write(f"Built derivatives for {built} uploaded image(s).")
+
+    def build_static(self, force):
+        root = Path(settings.STATICFILES_DIRS[0])
+        storage = FileSystemStorage(location=root)
+        manifest_path = root / images.STATIC_MANIFEST
+        manifest = {}
+        if manifest_path.exists() and not force:
+            manifest = json.loads(manifest_path.read_text())
+
+        built = 0
+        for path in sorted(root.rglob('*')):
+            name = path.relative_to(root).as_posix()
+            if name.startswith(images.DERIVATIVES_DIR + '/') or path.suffix.lower() not in images.SOURCE_EXTENSIONS:
+                continue
+            mtime = int(path.stat().st_mtime)
+            if manifest.get(name, {}).get('mtime') == mtime:
+                continue
+            try:
+                info = images.generate(storage, name)
+            except Exception as e:
+                self.stderr.write(f"{name}: {e}")
+                continue
+            info['mtime'] = mtime
+            manifest[name] = info
+            built += 1
+
+        os.makedirs(manifest_path.parent, exist_ok=True)
+        manifest_path.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        self.stdout.write(f"Built derivatives for {built} static image(s).")
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from scoopjoy import cart, orders
+from scoopjoy.models import Address, CartItem, CartSummary, OrderItem, Product
+
+# Plan lines that mean a whole table is read.
+FULL_SCAN_MARKERS = ('Seq Scan', 'Full scan')
+
+
+def is_full_scan(line):
+    line = line.strip().lstrip('|-` ')
+    if line.startswith('SCAN ') and 'USING' not in line:
+        return True  # SQLite
+    return any(marker in line for marker in FULL_SCAN_MARKERS)
+
+
+def route_queries(user, product):
+    """(route, label, queryset) for the lookups the hot views make."""
+    category = product.category if product else 'sticks'
+    product_id = product.pk if product else 0
+    return [
+        ('add_to_cart', 'cart line for user+product', CartItem.objects.filter(user=user, product_id=product_id)),
+        ('update_quantity', 'cart line for user+product',
+         CartItem.objects.select_related('product').filter(user=user, product_id=product_id)),
+        ('product_detail', 'cart line for user+product', CartItem.objects.filter(user=user, product_id=product_id)[:1]),
+        ('cart', 'priced cart lines', cart.priced_lines(user.pk)),
+        ('cart', 'summary', CartSummary.objects.filter(user_id=user.pk)),
+        ('cart', 'addresses', Address.objects.filter(user=user).order_by('-is_default', 'id')),
+        ('products_api', 'category', Product.objects.filter(category=category).order_by('id')),
+        ('search', 'product by name', Product.objects.filter(name=product.name if product else '')),
+        ('orders', 'first page', orders.history(user.pk)[:orders.PAGE_SIZE + 1]),
+        ('orders', 'page after cursor', orders.history(user.pk, (user.date_joined, 0))[:orders.PAGE_SIZE + 1]),
+        ('orders', 'order items', OrderItem.objects.filter(order__in=[1, 2, 3])),
+    ]
+
+
+class Command(BaseCommand):
+    help = ("Print the database query plan for the lookups behind each hot route "
+            "and flag full table scans. Run it against production-sized data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Username to build the queries for (default: the first user).")
+        parser.add_argument('--route', action='append', help="Only explain these routes.")
+        parser.add_argument('--strict', action='store_true', help="Exit with an error if any query scans a table.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.order_by('pk')
+        user = users.filter(username=options['user']).first() if options['user'] else users.first()
+        if user is None:
+            raise CommandError("No user to build the queries for; create one or pass --user.")
+        product = Product.objects.order_by('pk').first()
+
+        scans = []
+        for route, label, queryset in route_queries(user, product):
+            if options['route'] and route not in options['route']:
+                continue
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{route}: {label}"))
+            for line in plan.splitlines():
+                if is_full_scan(line):
+                    scans.append(f"{route}: {label}")
+                    self.stdout.write(self.style.WARNING(f"  {line}"))
+                else:
+                    self.stdout.write(f"  {line}")
+
+        self.stdout.write(f"\n{connection.vendor}: {len(scans)} full scan(s).")
+        if scans and options['strict']:
+            raise CommandError("Full table scans in: " + ", ".join(sorted(set(scans))))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scoopjoy import sales
+
+
+class Command(BaseCommand):
+    help = ("Fold placed orders into the daily/product/category sales rollups, a chunk per "
+            "transaction. Backfills history on first run; --rebuild recomputes it from scratch.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Fold in what is pending now and exit instead of polling.")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Empty the rollups and recompute them from every order.")
+        parser.add_argument('--chunk-size', type=int, default=sales.CHUNK_SIZE)
+        parser.add_argument('--pause', type=float, default=sales.PAUSE,
+                            help="Seconds to sleep between chunks, leaving room for checkout.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to sleep when nothing is pending (default: 5).")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            sales.reset()
+            self.stdout.write(f"Rollups emptied; {sales.pending()} order(s) to fold back in.")
+        total = 0
+        try:
+            while True:
+                done = sales.drain(options['chunk_size'], options['pause'])
+                total += done
+                if done:
+                    self.stdout.write(f"Rolled up {done} order(s)")
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Rolled up {total} order(s) in total.")
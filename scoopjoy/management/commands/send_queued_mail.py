@@ -0,0 +1,61 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from scoopjoy import mail
+from scoopjoy.smtp_sink import DEFAULT_PORT
+
+
+class Command(BaseCommand):
+    help = "Deliver queued OutgoingEmail rows in batches over one SMTP connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Drain what is due now and exit instead of polling.")
+        parser.add_argument('--batch-size', type=int, default=mail.BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=mail.MAX_ATTEMPTS)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty (default: 1).")
+        parser.add_argument('--smtp-host', help="Deliver to this host instead of EMAIL_HOST, without TLS or auth.")
+        parser.add_argument('--smtp-port', type=int, default=DEFAULT_PORT,
+                            help=f"Port for --smtp-host (default: {DEFAULT_PORT}, where smtp_sink listens).")
+
+    def handle(self, *args, **options):
+        if options['smtp_host']:
+            connection = get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host=options['smtp_host'], port=options['smtp_port'],
+                username='', password='', use_tls=False, use_ssl=False,
+            )
+        else:
+            connection = get_connection()
+
+        total = 0
+        try:
+            while True:
+                try:
+                    sent, failed = mail.deliver_batch(
+                        connection, options['batch_size'], options['max_attempts'])
+                except Exception as e:
+                    # SMTP unreachable: the batch was handed back, retry on the next tick.
+                    self.stderr.write(f"Delivery failed: {e}")
+                    connection.close()
+                    sent = failed = 0
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                total += sent
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent}, failed {failed}")
+                    continue
+                connection.close()
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+        self.stdout.write(f"Delivered {total} email(s).")
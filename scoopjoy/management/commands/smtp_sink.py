@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scoopjoy.smtp_sink import DEFAULT_PORT, SMTPSink
+
+
+class Command(BaseCommand):
+    help = "Run a local SMTP server that accepts and discards mail, for offline worker load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(options['host'], options['port'], keep=0).start()
+        self.stdout.write(f"SMTP sink listening on {options['host']}:{sink.port}")
+        try:
+            while True:
+                time.sleep(5)
+                self.stdout.write(f"{sink.received} message(s) received")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.stop()
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from scoopjoy import rendering
+
+
+class Command(BaseCommand):
+    help = ("Render every cached marketing page for anonymous and logged-in visitors. "
+            "Run at deploy time; needs a cache shared with the web workers.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', action='store_true',
+                            help="Keep pages already cached instead of starting a new generation.")
+
+    def handle(self, *args, **options):
+        if not options['keep']:
+            rendering.new_generation()
+
+        factory = RequestFactory()
+        # Templates only look at user.is_authenticated, so an unsaved user will do.
+        visitors = [AnonymousUser(), get_user_model()(username='page-warmer')]
+        warmed = 0
+        for name, url_args in rendering.CACHED_PAGES:
+            path = reverse(name, args=url_args)
+            match = resolve(path)
+            for user in visitors:
+                request = factory.get(path)
+                request.user = user
+                response = match.func(request, *match.args, **match.kwargs)
+                if response.status_code != 200:
+                    self.stderr.write(f"{path}: HTTP {response.status_code}")
+                    continue
+                warmed += 1
+        self.stdout.write(f"Warmed {warmed} page(s).")
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scoopjoy', '0009_add_initial_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_quantity', models.PositiveIntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cart_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
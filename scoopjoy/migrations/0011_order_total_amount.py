@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-18 14:53
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    Order = apps.get_model('scoopjoy', 'Order')
+    OrderItem = apps.get_model('scoopjoy', 'OrderItem')
+    totals = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum('total_price'))
+        .values('total')
+    )
+    Order.objects.filter(items__isnull=False).update(total_amount=Subquery(totals))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scoopjoy', '0010_cartsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# External-content FTS5 index over Product, kept in sync by triggers.
+# Only created on SQLite builds with FTS5; see scoopjoy.search.
+CREATE = [
+    """CREATE VIRTUAL TABLE scoopjoy_product_fts USING fts5(
+        name, category, content='scoopjoy_product', content_rowid='id', prefix='2 3'
+    )""",
+    """CREATE TRIGGER scoopjoy_product_fts_ai AFTER INSERT ON scoopjoy_product BEGIN
+        INSERT INTO scoopjoy_product_fts(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END""",
+    """CREATE TRIGGER scoopjoy_product_fts_ad AFTER DELETE ON scoopjoy_product BEGIN
+        INSERT INTO scoopjoy_product_fts(scoopjoy_product_fts, rowid, name, category)
+        VALUES ('delete', old.id, old.name, old.category);
+    END""",
+    """CREATE TRIGGER scoopjoy_product_fts_au AFTER UPDATE ON scoopjoy_product BEGIN
+        INSERT INTO scoopjoy_product_fts(scoopjoy_product_fts, rowid, name, category)
+        VALUES ('delete', old.id, old.name, old.category);
+        INSERT INTO scoopjoy_product_fts(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END""",
+    "INSERT INTO scoopjoy_product_fts(scoopjoy_product_fts) VALUES ('rebuild')",
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS scoopjoy_product_fts_au',
+    'DROP TRIGGER IF EXISTS scoopjoy_product_fts_ad',
+    'DROP TRIGGER IF EXISTS scoopjoy_product_fts_ai',
+    'DROP TABLE IF EXISTS scoopjoy_product_fts',
+]
+
+
+def _fts5_available(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_fts(apps, schema_editor):
+    if _fts5_available(schema_editor):
+        for statement in CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scoopjoy', '0012_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+
+def backfill_item_counts(apps, schema_editor):
+    Order = apps.get_model('scoopjoy', 'Order')
+    OrderItem = apps.get_model('scoopjoy', 'OrderItem')
+    counts = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(count=Sum('quantity'))
+        .values('count')
+    )
+    Order.objects.filter(items__isnull=False).update(item_count=Subquery(counts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scoopjoy', '0014_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-ordered_at', '-id'], name='order_history_idx'),
+        ),
+        migrations.RunPython(backfill_item_counts, migrations.RunPython.noop),
+    ]
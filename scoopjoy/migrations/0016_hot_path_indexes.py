@@ -0,0 +1,44 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """Fold duplicate (user, product) lines into the oldest one, summing quantities."""
+    CartItem = apps.get_model('scoopjoy', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('user', 'product')
+        .annotate(lines=Count('id'), keep=Min('id'), quantity=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for group in duplicates:
+        CartItem.objects.filter(pk=group['keep']).update(quantity=group['quantity'])
+        CartItem.objects.filter(user=group['user'], product=group['product']).exclude(pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scoopjoy', '0015_order_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['user', '-is_default'], name='address_user_default_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='product_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name'], name='product_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='cartitem_user_product_uniq'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# On SQLite, 0014's AddField on Product remade the scoopjoy_product table,
+# which silently dropped the FTS5 sync triggers created in 0013. Recreate
+# them and rebuild the index from the table. Any later migration that
+# remakes scoopjoy_product has to do the same.
+TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS scoopjoy_product_fts_ai AFTER INSERT ON scoopjoy_product BEGIN
+        INSERT INTO scoopjoy_product_fts(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS scoopjoy_product_fts_ad AFTER DELETE ON scoopjoy_product BEGIN
+        INSERT INTO scoopjoy_product_fts(scoopjoy_product_fts, rowid, name, category)
+        VALUES ('delete', old.id, old.name, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS scoopjoy_product_fts_au AFTER UPDATE ON scoopjoy_product BEGIN
+        INSERT INTO scoopjoy_product_fts(scoopjoy_product_fts, rowid, name, category)
+        VALUES ('delete', old.id, old.name, old.category);
+        INSERT INTO scoopjoy_product_fts(rowid, name, category) VALUES (new.id, new.name, new.category);
+    END""",
+    "INSERT INTO scoopjoy_product_fts(scoopjoy_product_fts) VALUES ('rebuild')",
+]
+
+
+def _fts_table_exists(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scoopjoy_product_fts'")
+        return cursor.fetchone() is not None
+
+
+def restore_triggers(apps, schema_editor):
+    if _fts_table_exists(schema_editor):
+        for statement in TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scoopjoy', '0018_outgoingemail_sending'),
+    ]
+
+    operations = [
+        # Reversing leaves the triggers in place; 0013's reverse drops them.
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,14 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.dispatch import Signal
 from django.urls import reverse
+from django.utils import timezone
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=15, blank=True, null=True)
     profile_pic = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    profile_pic_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.username
@@ -19,6 +22,25 @@ class FavoriteFlavor(models.Model):
         return f"{self.user.username} - {self.flavor_name}"
 
 
+# Sent with the affected ``ids`` and the ``fields`` rewritten on existing rows
+# after bulk product writes, which skip post_save.
+products_changed = Signal()
+
+
+class ProductQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        products_changed.send(sender=self.model, ids=ids, fields=tuple(kwargs))
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        # Only an upsert (update_conflicts=True) rewrites existing rows.
+        fields = tuple(kwargs.get('update_fields') or ())
+        products_changed.send(sender=self.model, ids=[obj.pk for obj in objs], fields=fields)
+        return objs
+
 
 class Product(models.Model):
     CATEGORY_CHOICES = [
@@ -31,11 +53,26 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2)
     discounted_price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     image = models.ImageField(upload_to='product_images/')
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='sticks')
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'id'], name='product_category_idx'),
+            models.Index(fields=['name'], name='product_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @property
+    def unit_price(self):
+        # A discounted price of 0 means no discount; scoopjoy.cart prices
+        # cart lines in SQL with the same rule.
+        return self.discounted_price or self.price
+
     def get_absolute_url(self):
         return reverse('scoopjoy:product_detail', args=[self.id])
 
@@ -44,8 +81,23 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='cartitem_user_product_uniq'),
+        ]
+
     def total_price(self):
-        return (self.product.discounted_price or self.product.price) * self.quantity
+        return self.product.unit_price * self.quantity
+
+class CartSummary(models.Model):
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='cart_summary')
+    total_quantity = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cart of {self.user_id}: {self.total_quantity} items"
 
 class Address(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='addresses')
@@ -57,6 +109,9 @@ class Address(models.Model):
     address = models.TextField()
     is_default = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-is_default'], name='address_user_default_idx')]
+
     def __str__(self):
         return f"{self.name}, {self.address}"
 
@@ -65,9 +120,19 @@ class Order(models.Model):
     address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True)
     ordered_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, default='Placed')  # e.g. Placed, Delivered
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    # Set once the order is counted in the sales rollups (scoopjoy.sales).
+    rolled_up = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-ordered_at', '-id'], name='order_history_idx'),
+            models.Index(fields=['id'], condition=models.Q(rolled_up=False), name='order_rollup_pending_idx'),
+        ]
 
     def total(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.total_amount
 
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
@@ -81,3 +146,63 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
 
+class DailySales(models.Model):
+    """Orders, units and revenue per day; maintained by ``scoopjoy.sales``."""
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Order id range of the day, so exports can seek straight to it.
+    first_order_id = models.BigIntegerField()
+    last_order_id = models.BigIntegerField()
+
+
+class ProductSales(models.Model):
+    day = models.DateField()
+    # Not a foreign key: the figures outlive deleted products (id 0).
+    product_id = models.BigIntegerField()
+    product_name = models.CharField(max_length=100)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'product_id'], name='productsales_day_product_uniq')]
+
+
+class CategorySales(models.Model):
+    day = models.DateField()
+    category = models.CharField(max_length=50)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'category'], name='categorysales_day_category_uniq')]
+
+
+class OutgoingEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),  # leased to a worker until next_attempt_at
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,133 @@
+"""
+Set-based order placement and keyset-paginated order history.
+
+The whole cart is priced by one joined query, written with a single bulk
+insert and cleared with a single delete, so checkout does a fixed number of
+queries no matter how many lines the cart has.
+
+Order history pages seek on ``(user, ordered_at, id)`` (``order_history_idx``)
+instead of using OFFSET, so the newest page and the oldest page cost the same.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+
+from . import cart, sales
+from .models import Order, OrderItem
+
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+STREAM_CHUNK = 50
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+def place_order(user, address):
+    """Turn the user's cart into an ``Order``; returns ``(order, items)``.
+
+    Raises ``EmptyCartError`` when there is nothing to order.
+    """
+    with transaction.atomic():
+        lines = list(cart.priced_lines(user.pk).select_for_update(of=('self',)))
+        if not lines:
+            raise EmptyCartError
+        order = Order.objects.create(
+            user=user,
+            address=address,
+            total_amount=sum(line.line_total for line in lines),
+            item_count=sum(line.quantity for line in lines),
+        )
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=line.product,
+                quantity=line.quantity,
+                total_price=line.line_total,
+            ) for line in lines
+        ])
+        cart.clear(user.pk)
+        transaction.on_commit(sales.order_placed)
+    return order, items
+
+
+def encode_cursor(order):
+    raw = f'{order.ordered_at.isoformat()}|{order.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(ordered_at, id)`` for ``cursor``; raises ``ValueError`` if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ordered_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(ordered_at), int(pk)
+    except ValueError as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+
+
+def history(user_id, before=None):
+    """The user's orders, newest first, strictly older than the ``before`` key."""
+    orders = (
+        Order.objects.filter(user_id=user_id)
+        .select_related('address')
+        .prefetch_related('items__product')
+        .order_by('-ordered_at', '-id')
+    )
+    if before is not None:
+        ordered_at, pk = before
+        # The redundant ordered_at <= bound lets the index range-scan.
+        orders = orders.filter(Q(ordered_at__lte=ordered_at), Q(ordered_at__lt=ordered_at) | Q(id__lt=pk))
+    return orders
+
+
+def history_page(user_id, cursor=None, limit=PAGE_SIZE):
+    """One page of order history; returns ``(orders, next_cursor)``."""
+    before = decode_cursor(cursor) if cursor else None
+    orders = list(history(user_id, before)[:limit + 1])
+    if len(orders) > limit:
+        return orders[:limit], encode_cursor(orders[limit - 1])
+    return orders, None
+
+
+def _order_json(order):
+    return {
+        'id': order.pk,
+        'ordered_at': order.ordered_at,
+        'status': order.status,
+        'total': order.total_amount,
+        'item_count': order.item_count,
+        'items': [
+            [item.product_id, item.product.name if item.product else None, item.quantity, item.total_price]
+            for item in order.items.all()
+        ],
+    }
+
+
+def stream_history(user_id, cursor=None, limit=PAGE_SIZE):
+    """Yield a JSON page of order history, fetched ``STREAM_CHUNK`` orders at a time.
+
+    The document is ``{"orders": [...], "next": cursor}``; each item is
+    ``[product_id, name, quantity, total]``.
+    """
+    dumps = DjangoJSONEncoder(separators=(',', ':')).encode
+    before = decode_cursor(cursor) if cursor else None
+    remaining, last, more = limit, None, True
+    yield '{"orders":['
+    while remaining and more:
+        chunk = list(history(user_id, before)[:min(remaining, STREAM_CHUNK) + 1])
+        more = len(chunk) > min(remaining, STREAM_CHUNK)
+        chunk = chunk[:min(remaining, STREAM_CHUNK)]
+        if not chunk:
+            break
+        yield (',' if last else '') + ','.join(dumps(_order_json(order)) for order in chunk)
+        last = chunk[-1]
+        before = (last.ordered_at, last.pk)
+        remaining -= len(chunk)
+    next_cursor = encode_cursor(last) if last and more else None
+    yield '],"next":' + json.dumps(next_cursor) + '}'
@@ -0,0 +1,179 @@
+"""
+Flavor recommendations for the quiz and /api/recommend/.
+
+Every product in the catalog snapshot becomes a feature vector: its
+category, its price band within that category and flavor tags read from
+its name. The vectors are L2-normalised into one NumPy matrix, so scoring a
+visitor is a single matrix-vector product over the whole catalog.
+
+A visitor's vector is built from their quiz answers and, when logged in,
+their ``FavoriteFlavor`` rows. The matrix is rebuilt whenever the catalog
+snapshot is (it is keyed on the snapshot object), so product writes made
+through any worker are picked up with it.
+
+NumPy is an optional dependency (``pip install numpy``) and the only thing
+that needs it: without it ``AVAILABLE`` is False, the endpoint answers 503
+and the quiz falls back to its built-in result. The rest of the storefront
+runs unchanged.
+"""
+import re
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from asgiref.sync import sync_to_async
+from django.urls import reverse
+
+from .catalog import aget_catalog, get_catalog
+from .models import Product
+
+AVAILABLE = np is not None
+
+# flavor tag -> name prefixes that imply it
+FLAVOR_TAGS = {
+    'vanilla': ('vanilla', 'dream', 'churned', 'velvet', 'frosty', 'swirl'),
+    'chocolate': ('choco', 'brownie', 'oreo', 'mocha'),
+    'strawberry': ('strawberry', 'berry'),
+    'fruity': ('berry', 'strawberry', 'blueberry', 'mango', 'orange', 'fruity'),
+    'mango': ('mango',),
+    'mint': ('mint', 'chill', 'frosty'),
+    'nutty': ('almond', 'pistachio', 'hazelnut', 'peanut'),
+    'pistachio': ('pistachio',),
+    'coffee': ('coffee', 'mocha', 'toasty'),
+    'caramel': ('caramel', 'butterscotch', 'toasty'),
+    'cookie': ('cookie', 'oreo', 'brownie', 'waffle'),
+    'crunchy': ('crunch', 'crisp', 'waffle', 'sprinkle', 'peanut', 'almond'),
+}
+CATEGORIES = tuple(key for key, _ in Product.CATEGORY_CHOICES)
+PRICE_BANDS = ('budget', 'standard', 'premium')
+FEATURES = (*FLAVOR_TAGS, *CATEGORIES, *PRICE_BANDS)
+_COLUMN = {name: i for i, name in enumerate(FEATURES)}
+
+# Quiz answer (static/js/flavor_quiz.js) -> feature weights.
+QUIZ_ANSWERS = {
+    'relax': {'vanilla': 1, 'tubs': 0.5},
+    'exercise': {'mango': 1, 'fruity': 1, 'sticks': 0.5, 'budget': 0.3},
+    'social': {'strawberry': 1, 'cones': 0.5},
+    'creative': {'pistachio': 1, 'nutty': 0.5},
+    'chill': {'vanilla': 1, 'tubs': 0.5},
+    'outdoors': {'mint': 1, 'sticks': 0.5},
+    'party': {'chocolate': 1, 'tubs': 0.5, 'premium': 0.5},
+    'learn': {'coffee': 1},
+    'beach': {'strawberry': 1, 'fruity': 0.5, 'sticks': 0.3},
+    'mountain': {'pistachio': 1, 'nutty': 0.5},
+    'city': {'cookie': 1, 'cones': 0.5},
+    'home': {'vanilla': 1, 'tubs': 0.3},
+    'calm': {'vanilla': 1},
+    'bold': {'chocolate': 1, 'crunchy': 0.5},
+    'friendly': {'strawberry': 1},
+    'fun': {'mango': 1, 'fruity': 0.5},
+    'vanilla': {'vanilla': 2},
+    'chocolate': {'chocolate': 2},
+    'strawberry': {'strawberry': 2},
+    'mint': {'mint': 2},
+}
+# How much one FavoriteFlavor counts next to one quiz answer.
+FAVORITE_WEIGHT = 1.5
+MAX_RESULTS = 20
+
+_token_re = re.compile(r'[a-z]+')
+_lock = threading.Lock()
+_model = None
+
+
+def tags_for(text):
+    tokens = _token_re.findall(text.lower())
+    return {tag for tag, prefixes in FLAVOR_TAGS.items()
+            if any(token.startswith(prefixes) for token in tokens)}
+
+
+def _price_bands(products):
+    """Band each product by its price rank within its category."""
+    bands = {}
+    for category in {p['category'] for p in products}:
+        ranked = sorted((p for p in products if p['category'] == category), key=lambda p: p['price'])
+        for rank, product in enumerate(ranked):
+            bands[product['id']] = PRICE_BANDS[rank * len(PRICE_BANDS) // len(ranked)]
+    return bands
+
+
+class Recommender:
+    """Normalised product-feature matrix for one catalog snapshot."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        products = snapshot.products
+        bands = _price_bands(products)
+        matrix = np.zeros((len(products), len(FEATURES)), dtype=np.float32)
+        for row, product in enumerate(products):
+            for tag in tags_for(product['name']):
+                matrix[row, _COLUMN[tag]] = 1.0
+            if product['category'] in _COLUMN:
+                matrix[row, _COLUMN[product['category']]] = 0.5
+            matrix[row, _COLUMN[bands[product['id']]]] = 0.5
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.maximum(norms, 1e-9)
+        self.ids = np.array([p['id'] for p in products])
+
+    def profile(self, answers=(), favorites=()):
+        """The visitor's feature vector, or None if nothing is known about them."""
+        vector = np.zeros(len(FEATURES), dtype=np.float32)
+        for answer in answers:
+            for feature, weight in QUIZ_ANSWERS.get(answer, {}).items():
+                vector[_COLUMN[feature]] += weight
+        for flavor in favorites:
+            for tag in tags_for(flavor):
+                vector[_COLUMN[tag]] += FAVORITE_WEIGHT
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def top(self, vector, limit=5):
+        """(product id, cosine similarity) of the ``limit`` best matches."""
+        if vector is None or not len(self.ids):
+            return []
+        scores = self.matrix @ vector
+        limit = min(limit, len(scores))
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(self.ids[i]), float(scores[i])) for i in best if scores[i] > 0]
+
+
+def get_recommender(snapshot=None):
+    global _model
+    snapshot = snapshot or get_catalog()
+    model = _model
+    if model is None or model.snapshot is not snapshot:
+        with _lock:
+            if _model is None or _model.snapshot is not snapshot:
+                _model = Recommender(snapshot)
+            model = _model
+    return model
+
+
+def recommend(answers=(), favorites=(), limit=5, snapshot=None):
+    """Catalog entries best matching the quiz answers and favorite flavors."""
+    model = get_recommender(snapshot)
+    results = []
+    for product_id, score in model.top(model.profile(answers, favorites), limit):
+        product = model.snapshot.get(product_id)
+        results.append({
+            'id': product_id,
+            'name': product['name'],
+            'price': product['price'],
+            'image': product['image'],
+            'url': reverse('scoopjoy:product_detail', args=[product_id]),
+            'score': round(score, 4),
+        })
+    return results
+
+
+async def arecommend(answers=(), favorites=(), limit=5):
+    """``recommend`` for async views; only a matrix rebuild leaves the event loop."""
+    snapshot = await aget_catalog()
+    model = _model
+    if model is None or model.snapshot is not snapshot:
+        await sync_to_async(get_recommender)(snapshot)
+    return recommend(answers, favorites, limit, snapshot)
@@ -0,0 +1,60 @@
+"""
+Whole-page caching for the mostly static marketing and category pages.
+
+These templates only vary on whether the visitor is logged in (the navbar),
+so the rendered HTML is cached per path and authentication state, together
+with every header the view set (Vary, Cache-Control, Content-Language...).
+The key includes a generation number which ``warm_pages`` bumps on every
+deploy.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import versions
+from .caches import catalog as cache
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60 * 24)
+GENERATION_KEY = 'version:pages'
+
+# (url name, args) for every page served through cached_page.
+CACHED_PAGES = [
+    ('scoopjoy:home', ()),
+    ('scoopjoy:history', ()),
+    ('scoopjoy:recipes', ()),
+    *[('scoopjoy:recipe_detail', (i,)) for i in range(1, 13)],
+    ('scoopjoy:sticks', ()),
+    ('scoopjoy:cones', ()),
+    ('scoopjoy:tubs', ()),
+    ('scoopjoy:all_flavors', ()),
+    ('scoopjoy:quiz_landing', ()),
+]
+
+
+def page_key(path, authenticated):
+    generation = versions.get_version(GENERATION_KEY)
+    state = 'auth' if authenticated else 'anon'
+    return f'page:{generation}:{state}:{path}'
+
+
+def cached_page(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        key = page_key(request.path, request.user.is_authenticated)
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            return HttpResponse(content, headers=headers)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            cache.set(key, (response.content, dict(response.items())), PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapper
+
+
+def new_generation():
+    """Orphan every cached page, e.g. after templates changed."""
+    return versions.bump_version(GENERATION_KEY)
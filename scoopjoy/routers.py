@@ -0,0 +1,125 @@
+"""
+Read-replica routing for catalog, order-history and sales-report reads.
+
+``ReplicaRouter`` sends reads of the models in ``REPLICA_MODELS`` to one of
+the aliases in ``settings.DATABASE_REPLICAS``; everything else, every write,
+and every read inside a transaction stays on ``default``.
+
+Replicas lag, so a visitor who has just written (any successful unsafe
+request, e.g. adding to the cart or placing an order) is pinned to the
+primary for ``REPLICA_PIN_SECONDS`` through a cookie set by
+``ReplicaPinMiddleware``. Code that must see its own writes outside a
+request (signal handlers rebuilding the catalog) wraps itself in
+``use_primary()``.
+
+A streaming response's body is produced after the view has returned and the
+middleware has dropped the pin, so streaming views wrap their generator in
+``keep_pin()``, which replays the pin that was in force when the response
+was created.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_MODELS = {
+    'scoopjoy.product', 'scoopjoy.order', 'scoopjoy.orderitem',
+    'scoopjoy.dailysales', 'scoopjoy.productsales', 'scoopjoy.categorysales',
+}
+PIN_COOKIE = 'replica_pin'
+PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+_pinned = contextvars.ContextVar('replica_pinned', default=False)
+
+
+@contextmanager
+def use_primary():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def keep_pin(iterable):
+    """Iterate ``iterable`` under the pin in force now, whenever it is consumed."""
+    return _pinned_steps(iter(iterable), _pinned.get())
+
+
+def _pinned_steps(iterator, pinned):
+    while True:
+        # Set around each step rather than across yields: under ASGI the
+        # steps can run in different contexts.
+        token = _pinned.set(pinned)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _pinned.reset(token)
+        yield item
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or model._meta.label_lower not in REPLICA_MODELS:
+            return None
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaPinMiddleware:
+    """Keep a visitor on the primary for a few seconds after they write."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DATABASE_REPLICAS', []):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        writing, token = self._pin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._finish(writing, response)
+
+    async def __acall__(self, request):
+        writing, token = self._pin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._finish(writing, response)
+
+    def _pin(self, request):
+        writing = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        return writing, _pinned.set(writing or PIN_COOKIE in request.COOKIES)
+
+    def _finish(self, writing, response):
+        if writing and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, '1', max_age=PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,265 @@
+"""
+Sales rollups and the reports read from them.
+
+``DailySales``, ``ProductSales`` and ``CategorySales`` hold orders, units and
+revenue per day (and per product / category). They are kept up to date
+incrementally: every ``Order`` starts with ``rolled_up=False`` and
+``apply_pending`` claims a chunk of such orders, aggregates their lines in
+SQL, adds the result onto the rollup rows with INSERT ... ON CONFLICT DO
+UPDATE and marks the orders, all in one transaction. Nothing is counted twice
+or skipped, whichever process gets there first.
+
+Checkout never does this work itself. By default (``SALES_ROLLUP =
+'worker'``) the ``rollup_sales`` command does it, in its own process, so the
+rollup writes never compete with checkout for SQLite's write lock. With
+``SALES_ROLLUP = 'thread'`` checkout's ``on_commit`` hook instead wakes one
+background thread per process, which drains in small chunks with a pause
+between them; that suits PostgreSQL, where the two do not block each other.
+The same command backfills or rebuilds history.
+
+Reports read the small rollup tables (from a replica when one is
+configured), so their cost depends on the number of days asked for, not on
+the number of orders. ``export_csv`` streams raw order lines in keyset
+chunks, in constant memory.
+"""
+import csv
+import time
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .background import BackgroundJob
+from .models import CategorySales, DailySales, Order, OrderItem, ProductSales
+
+CHUNK_SIZE = getattr(settings, 'SALES_ROLLUP_CHUNK', 500)
+PAUSE = getattr(settings, 'SALES_ROLLUP_PAUSE', 0.05)
+EXPORT_CHUNK = 1000
+MAX_DAYS = 366
+MAX_TOP_PRODUCTS = 100
+TOP_PRODUCTS_BY = ('revenue', 'units', 'orders')
+DELETED_PRODUCT = '(deleted product)'
+UNKNOWN_CATEGORY = 'unknown'
+EXPORT_COLUMNS = ('order_id', 'ordered_at', 'status', 'product_id', 'product', 'category', 'quantity', 'total_price')
+
+# How a conflicting rollup row absorbs an extra column of the new row.
+_REPLACE = 'excluded.{col}'
+_LEAST = 'CASE WHEN excluded.{col} < {table}.{col} THEN excluded.{col} ELSE {table}.{col} END'
+_GREATEST = 'CASE WHEN excluded.{col} > {table}.{col} THEN excluded.{col} ELSE {table}.{col} END'
+_SUMMED = ('orders', 'units', 'revenue')
+
+
+def _upsert(model, keys, rows, extra=None):
+    """Add the ``orders``/``units``/``revenue`` of ``rows`` onto ``model``'s rows."""
+    if not rows:
+        return
+    extra = extra or {}
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = [*keys, *extra, *_SUMMED]
+    updates = [f'{qn(col)} = {table}.{qn(col)} + excluded.{qn(col)}' for col in _SUMMED]
+    updates += [f'{qn(col)} = ' + how.format(col=qn(col), table=table) for col, how in extra.items()]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(map(qn, columns))}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({', '.join(map(qn, keys))}) DO UPDATE SET {', '.join(updates)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [[row[col] for col in columns] for row in rows])
+
+
+def claim_pending(chunk_size=CHUNK_SIZE):
+    """Lock and return the ids of the oldest orders not yet rolled up.
+
+    Workers running side by side on PostgreSQL skip each other's rows.
+    """
+    return list(
+        Order.objects.select_for_update(skip_locked=True)
+        .filter(rolled_up=False)
+        .order_by('id')
+        .values_list('id', flat=True)[:chunk_size]
+    )
+
+
+def apply_pending(chunk_size=CHUNK_SIZE):
+    """Fold up to ``chunk_size`` pending orders into the rollups; returns how many."""
+    with transaction.atomic():
+        ids = claim_pending(chunk_size)
+        if not ids:
+            return 0
+        lines = OrderItem.objects.filter(order_id__in=ids)
+        totals = {
+            'orders': Count('order_id', distinct=True),
+            'units': Sum('quantity'),
+            'revenue': Sum('total_price'),
+        }
+        categories = list(lines.values(
+            day=TruncDate('order__ordered_at'),
+            category=Coalesce(F('product__category'), Value(UNKNOWN_CATEGORY)),
+        ).annotate(**totals))
+        days = list(
+            Order.objects.filter(id__in=ids)
+            .values(day=TruncDate('ordered_at'))
+            .annotate(orders=Count('id'), revenue=Sum('total_amount'),
+                      first_order_id=Min('id'), last_order_id=Max('id'))
+        )
+        # Units come from the lines (older orders have no item_count).
+        for day in days:
+            day['units'] = sum(row['units'] for row in categories if row['day'] == day['day'])
+        _upsert(DailySales, ('day',), days, {'first_order_id': _LEAST, 'last_order_id': _GREATEST})
+        _upsert(ProductSales, ('day', 'product_id'), [
+            {**row, 'product_id': row['pid']} for row in lines.values(
+                day=TruncDate('order__ordered_at'),
+                pid=Coalesce(F('product_id'), Value(0)),
+                product_name=Coalesce(F('product__name'), Value(DELETED_PRODUCT)),
+            ).annotate(**totals)
+        ], {'product_name': _REPLACE})
+        _upsert(CategorySales, ('day', 'category'), categories)
+        Order.objects.filter(id__in=ids).update(rolled_up=True)
+    return len(ids)
+
+
+def drain(chunk_size=CHUNK_SIZE, pause=PAUSE):
+    """Fold in every pending order, one chunk per transaction; returns the count."""
+    total = 0
+    while True:
+        done = apply_pending(chunk_size)
+        total += done
+        if done < chunk_size:
+            return total
+        time.sleep(pause)
+
+
+def reset(chunk_size=CHUNK_SIZE * 10):
+    """Empty the rollups and mark every order pending again, for a rebuild.
+
+    The rollups are emptied first, so until the orders are folded back in
+    the reports undercount; they never count an order twice.
+    """
+    with transaction.atomic():
+        for model in (DailySales, ProductSales, CategorySales):
+            model.objects.all().delete()
+    last = Order.objects.aggregate(last=Max('id'))['last'] or 0
+    for low in range(0, last, chunk_size):
+        Order.objects.filter(id__gt=low, id__lte=low + chunk_size, rolled_up=True).update(rolled_up=False)
+
+
+def order_placed():
+    """``on_commit`` hook for checkout: fold the new order in off the request thread.
+
+    Only in ``'thread'`` mode; the setting is read on every call.
+    """
+    if getattr(settings, 'SALES_ROLLUP', 'worker') == 'thread':
+        _job.schedule()
+
+
+# A failed pass leaves its orders pending for the next one.
+_job = BackgroundJob(drain, 'sales-rollup')
+
+
+def pending():
+    return Order.objects.filter(rolled_up=False).count()
+
+
+def date_range(params, max_days=None):
+    """Inclusive ``(start, end)`` dates from ``?from=&to=``; the last 30 days by default.
+
+    Raises ``ValueError`` for malformed or reversed dates, or a span over ``max_days``.
+    """
+    end = date.fromisoformat(params['to']) if params.get('to') else timezone.localdate()
+    start = date.fromisoformat(params['from']) if params.get('from') else end - timedelta(days=29)
+    if start > end:
+        raise ValueError("'from' is after 'to'")
+    if max_days and (end - start).days >= max_days:
+        raise ValueError(f"At most {max_days} days at a time")
+    return start, end
+
+
+def summary(start, end):
+    """Totals, the daily series and the category split from ``start`` to ``end``."""
+    days = list(
+        DailySales.objects.filter(day__range=(start, end))
+        .order_by('day').values('day', *_SUMMED)
+    )
+    categories = list(
+        CategorySales.objects.filter(day__range=(start, end))
+        .values('category')
+        .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'category')
+    )
+    return {
+        'from': start,
+        'to': end,
+        'totals': {key: sum((day[key] for day in days), 0) for key in _SUMMED},
+        'days': days,
+        'categories': categories,
+        'pending_orders': pending(),
+    }
+
+
+def top_products(start, end, by='revenue', limit=10):
+    return list(
+        ProductSales.objects.filter(day__range=(start, end))
+        .values('product_id')
+        .annotate(name=Max('product_name'), orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by(f'-{by}', 'product_id')[:limit]
+    )
+
+
+def _bounds(start, end):
+    """An ``(first, last)`` order id range covering every order placed from ``start`` to ``end``.
+
+    Rolled-up days record their id range; pending orders are added on, so the
+    bounds are right even before the rollups have caught up.
+    """
+    rolled = DailySales.objects.filter(day__range=(start, end)).aggregate(
+        first=Min('first_order_id'), last=Max('last_order_id'))
+    waiting = Order.objects.filter(rolled_up=False).aggregate(first=Min('id'), last=Max('id'))
+    firsts = [v for v in (rolled['first'], waiting['first']) if v is not None]
+    lasts = [v for v in (rolled['last'], waiting['last']) if v is not None]
+    return (min(firsts), max(lasts)) if firsts else (None, None)
+
+
+def export_lines(start, end, chunk_size=EXPORT_CHUNK):
+    """Yield the order lines placed from ``start`` to ``end``, oldest first, in lists of ``chunk_size``.
+
+    Each line follows ``EXPORT_COLUMNS``. Chunks seek on the line id, so only
+    one chunk is ever held in memory.
+    """
+    first, last = _bounds(start, end)
+    if first is None:
+        return
+    tz = timezone.get_current_timezone()
+    lines = (
+        OrderItem.objects.filter(
+            order_id__gte=first, order_id__lte=last,
+            order__ordered_at__gte=datetime.combine(start, datetime.min.time(), tz),
+            order__ordered_at__lt=datetime.combine(end + timedelta(days=1), datetime.min.time(), tz),
+        )
+        .order_by('id')
+        .values_list('id', 'order_id', 'order__ordered_at', 'order__status', 'product_id',
+                     'product__name', 'product__category', 'quantity', 'total_price')
+    )
+    after = 0
+    while True:
+        chunk = list(lines.filter(id__gt=after)[:chunk_size])
+        if not chunk:
+            return
+        yield [row[1:] for row in chunk]
+        after = chunk[-1][0]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_csv(start, end):
+    """``export_lines`` as CSV text, one chunk per piece, with a header row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for chunk in export_lines(start, end):
+        yield ''.join(writer.writerow(row) for row in chunk)
@@ -0,0 +1,201 @@
+"""
+Product search for /api/search/.
+
+``SearchIndex`` keeps prefix and trigram postings over product names and
+categories in memory. Exact and prefix matches rank first, and trigram
+similarity catches typos ("chocolat", "vanila"). The index is built from the
+catalog snapshot and rebuilt whenever that is (it is keyed on the snapshot
+object), so writes made through any worker reach every process's index.
+
+Setting ``SEARCH_BACKEND = 'fts5'`` queries the SQLite FTS5 table created by
+migration 0013 instead, which suits much larger catalogs; results are then
+hydrated from the catalog snapshot.
+"""
+import re
+import threading
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.urls import reverse
+
+from .catalog import aget_catalog, get_catalog
+
+MIN_SIMILARITY = 0.3
+_token_re = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _token_re.findall(text.lower())
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot
+        self._lock = threading.Lock()
+        self.docs = {}
+        self.prefixes = defaultdict(set)
+        self.grams = defaultdict(set)
+
+    @classmethod
+    def from_products(cls, products, snapshot=None):
+        index = cls(snapshot)
+        for product in products:
+            index.add(product)
+        return index
+
+    def _terms(self, product):
+        tokens = tokenize(product['name'])
+        tokens.append(product['category'])
+        grams = set().union(*(trigrams(t) for t in tokens))
+        prefixes = {t[:i] for t in tokens for i in range(1, len(t) + 1)}
+        return tokens, prefixes, grams
+
+    def add(self, product):
+        tokens, prefixes, grams = self._terms(product)
+        doc = {
+            'id': product['id'],
+            'name': product['name'],
+            'url': reverse('scoopjoy:product_detail', args=[product['id']]),
+            'lower': product['name'].lower(),
+            'tokens': tokens,
+            'prefixes': prefixes,
+            'grams': grams,
+        }
+        with self._lock:
+            self._discard(product['id'])
+            self.docs[product['id']] = doc
+            for prefix in prefixes:
+                self.prefixes[prefix].add(product['id'])
+            for gram in grams:
+                self.grams[gram].add(product['id'])
+
+    def remove(self, product_id):
+        with self._lock:
+            self._discard(product_id)
+
+    def _discard(self, product_id):
+        doc = self.docs.pop(product_id, None)
+        if doc is None:
+            return
+        for prefix in doc['prefixes']:
+            self.prefixes[prefix].discard(product_id)
+        for gram in doc['grams']:
+            self.grams[gram].discard(product_id)
+
+    def search(self, query, limit=5):
+        words = tokenize(query)
+        if not words:
+            return []
+        phrase = ' '.join(words)
+        scores = Counter()
+
+        # Every query word matching the start of some product word.
+        prefix_hits = set.intersection(*(self.prefixes.get(w, set()) for w in words))
+        for doc_id in prefix_hits:
+            scores[doc_id] += 2.0
+
+        # Trigram overlap for misspellings and infix matches.
+        query_grams = set().union(*(trigrams(w) for w in words))
+        overlap = Counter()
+        for gram in query_grams:
+            for doc_id in self.grams.get(gram, ()):
+                overlap[doc_id] += 1
+        for doc_id, shared in overlap.items():
+            doc_grams = len(self.docs[doc_id]['grams'])
+            similarity = shared / (len(query_grams) + doc_grams - shared)
+            # Coverage of the query's trigrams rewards short queries inside long names.
+            coverage = shared / len(query_grams)
+            if coverage >= 0.5 or similarity >= MIN_SIMILARITY:
+                scores[doc_id] += coverage + similarity
+
+        for doc_id in scores:
+            lower = self.docs[doc_id]['lower']
+            if lower == phrase:
+                scores[doc_id] += 4.0
+            elif lower.startswith(phrase):
+                scores[doc_id] += 1.0
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self.docs[kv[0]]['name']))
+        return [
+            {'name': self.docs[doc_id]['name'], 'url': self.docs[doc_id]['url']}
+            for doc_id, _ in ranked[:limit]
+        ]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(snapshot=None):
+    global _index
+    snapshot = snapshot or get_catalog()
+    index = _index
+    if index is None or index.snapshot is not snapshot:
+        with _index_lock:
+            if _index is None or _index.snapshot is not snapshot:
+                _index = SearchIndex.from_products(snapshot.products, snapshot)
+            index = _index
+    return index
+
+
+def reset():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def _fts_query(query):
+    return ' '.join(f'"{word}"*' for word in tokenize(query))
+
+
+def search_fts(query, limit=5):
+    match = _fts_query(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM scoopjoy_product_fts WHERE scoopjoy_product_fts MATCH %s '
+            'ORDER BY rank LIMIT %s',
+            [match, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    catalog = get_catalog()
+    results = []
+    for product_id in ids:
+        product = catalog.get(product_id)
+        if product is not None:
+            results.append({
+                'name': product['name'],
+                'url': reverse('scoopjoy:product_detail', args=[product_id]),
+            })
+    return results
+
+
+def search(query, limit=5):
+    if getattr(settings, 'SEARCH_BACKEND', 'memory') == 'fts5' and connection.vendor == 'sqlite':
+        try:
+            results = search_fts(query, limit)
+        except DatabaseError:
+            results = []
+        if results:
+            return results
+        # FTS5 has no typo tolerance; fall back to the trigram index.
+    return get_index().search(query, limit)
+
+
+async def asearch(query, limit=5):
+    """``search`` for async views; only a cold index or FTS5 leaves the event loop."""
+    if getattr(settings, 'SEARCH_BACKEND', 'memory') == 'fts5' and connection.vendor == 'sqlite':
+        return await sync_to_async(search)(query, limit)
+    snapshot = await aget_catalog()
+    index = _index
+    if index is None or index.snapshot is not snapshot:
+        index = await sync_to_async(get_index)(snapshot)
+    return index.search(query, limit)
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import backends, cart, catalog, images, versions
+from .models import CartItem, CustomUser, Product, products_changed
+
+# Product fields a cart summary is totalled from.
+PRICE_FIELDS = ('price', 'discounted_price')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=CustomUser)
+def image_uploaded(sender, instance, **kwargs):
+    # Encoding runs after commit, off the request; saving the result
+    # comes back through here with nothing left to do.
+    if images.needs_derivatives(instance):
+        images.queue_refresh(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    # Orphan the cached copy now and again once the write is visible, so a
+    # request that read the old row in between cannot keep it cached.
+    user_id = instance.pk
+    backends.invalidate(user_id)
+    transaction.on_commit(lambda: backends.invalidate(user_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    _catalog_changed()
+
+
+@receiver(products_changed, sender=Product)
+def products_bulk_changed(sender, ids, fields=(), **kwargs):
+    _catalog_changed()
+    if _touches_prices(fields):
+        cart.refresh_summaries(_cart_users(product_id__in=ids))
+
+
+def _catalog_changed():
+    # Drop the stale snapshot now. Once the write is visible, move the shared
+    # version (every other process rebuilds on its next read) and build the
+    # new one here, stamped with it, including the encoded JSON payloads.
+    catalog.invalidate()
+    transaction.on_commit(lambda: versions.bump_version(versions.CATALOG_KEY))
+    transaction.on_commit(catalog.rebuild)
+
+
+def _touches_prices(fields):
+    return any(field in fields for field in PRICE_FIELDS)
+
+
+def _cart_users(**lookup):
+    return list(CartItem.objects.filter(**lookup).order_by().values_list('user_id', flat=True).distinct())
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, update_fields=None, **kwargs):
+    # Cart summaries store prices, so only a save that moves one makes the
+    # carts holding the product re-total after it.
+    if instance._state.adding or (update_fields is not None and not _touches_prices(update_fields)):
+        instance._repriced = False
+        return
+    stored = Product.objects.filter(pk=instance.pk).values_list(*PRICE_FIELDS).first()
+    instance._repriced = stored != tuple(getattr(instance, field) for field in PRICE_FIELDS)
+
+
+@receiver(post_save, sender=Product)
+def product_repriced(sender, instance, **kwargs):
+    if instance.__dict__.pop('_repriced', False):
+        cart.refresh_summaries(_cart_users(product=instance))
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    # The cascade removes the cart lines before post_delete, so remember
+    # whose carts have to be re-totalled.
+    instance._cart_user_ids = _cart_users(product=instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    cart.refresh_summaries(instance.__dict__.pop('_cart_user_ids', ()))
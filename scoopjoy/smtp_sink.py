@@ -0,0 +1,99 @@
+"""
+A tiny in-process SMTP server that accepts and counts every message.
+
+It speaks just enough SMTP for ``smtplib`` (and therefore Django's SMTP
+backend) to deliver to it, which lets the mail worker be exercised and
+load-tested without network access. ``.received`` counts every delivery;
+only the last ``keep`` are kept in ``.messages`` as
+``(mail_from, rcpt_tos, data)`` tuples, so a long load test runs in
+constant memory.
+"""
+import socketserver
+import threading
+from collections import deque
+
+# Port the ``smtp_sink`` command listens on and ``send_queued_mail --smtp-host`` delivers to.
+DEFAULT_PORT = 2525
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+
+    def handle(self):
+        mail_from, rcpt_tos = None, []
+        self.reply('220 localhost ScoopJoy SMTP sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                mail_from, rcpt_tos = command[10:].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                rcpt_tos.append(command[8:].strip())
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                self.server.record(mail_from, rcpt_tos, self.read_data())
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+    def read_data(self):
+        lines = []
+        for line in iter(self.rfile.readline, b''):
+            if line in (b'.\r\n', b'.\n'):
+                break
+            if line.startswith(b'..'):
+                line = line[1:]
+            lines.append(line)
+        return b''.join(lines)
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, keep=100):
+        super().__init__((host, port), _SMTPHandler)
+        self.messages = deque(maxlen=keep)
+        self.received = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, mail_from, rcpt_tos, data):
+        with self._lock:
+            self.received += 1
+            self.messages.append((mail_from, list(rcpt_tos), data))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
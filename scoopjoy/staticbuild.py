@@ -0,0 +1,218 @@
+"""
+Static asset build: per-page bundles, minification and precompression.
+
+``BundledManifestStaticFilesStorage`` runs as part of ``collectstatic``: it
+concatenates the ``STATIC_BUNDLES`` sources into ``bundles/``, minifies
+those bundles, lets ``ManifestStaticFilesStorage`` fingerprint everything,
+and then writes ``.gz`` (and ``.br`` when the ``brotli`` package is
+installed) siblings for every compressible file. ``scoopjoy.staticserve`` serves the
+result.
+"""
+import gzip
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.txt', '.html', '.xml', '.ttf', '.otf')
+MIN_COMPRESS_SIZE = 256
+
+# Strings, unquoted url() values and comments, matched in one pass so that a
+# quote inside a comment or a comment marker inside a string is not misread.
+_css_verbatim_re = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\([^)"']*\)|/\*.*?\*/)''', re.S)
+_css_space_re = re.compile(r'\s+')
+_css_punct_re = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(source):
+    """Drop comments and collapse whitespace, leaving strings and url() values as written."""
+    # split() puts the verbatim pieces at the odd indexes.
+    parts = _css_verbatim_re.split(source)
+    css = ''.join(part for i, part in enumerate(parts) if not (i % 2 and part.startswith('/*')))
+    parts = _css_verbatim_re.split(css)
+    for i in range(0, len(parts), 2):
+        parts[i] = _css_punct_re.sub(r'\1', _css_space_re.sub(' ', parts[i])).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+# Keywords after which a slash starts a regular expression, not a division.
+_js_regex_keywords = frozenset((
+    'await', 'case', 'delete', 'do', 'else', 'in', 'instanceof', 'new', 'of',
+    'return', 'throw', 'typeof', 'void', 'yield',
+))
+_js_placeholder_re = re.compile(r'\x00(\d+)\x00')
+
+
+def minify_js(source):
+    """Drop comments, indentation and blank lines, leaving literals as written.
+
+    Strings, template literals (including their ``${}`` expressions) and
+    regular expressions are cut out before the line-based pass and put
+    back after it, so their contents are never touched. Line breaks stay:
+    without a parser, automatic semicolon insertion depends on them.
+    """
+    code, literals = [], []
+    i = start = 0
+    while i < len(source):
+        if source.startswith('//', i):
+            end = _find(source, '\n', i)
+            code.append(source[start:i])
+        elif source.startswith('/*', i):
+            end = _find(source, '*/', i) + 2
+            code.append(source[start:i] + ('\n' if '\n' in source[i:end] else ' '))
+        elif source[i] in '\'"`' or (source[i] == '/' and _js_regex_allowed(source, i)):
+            end = _js_literal_end(source, i)
+            code.append(f'{source[start:i]}\x00{len(literals)}\x00')
+            literals.append(source[i:end])
+        else:
+            i += 1
+            continue
+        i = start = end
+    code.append(source[start:])
+    lines = (line.strip() for line in ''.join(code).splitlines())
+    minified = '\n'.join(line for line in lines if line)
+    return _js_placeholder_re.sub(lambda m: literals[int(m[1])], minified)
+
+
+def _find(source, marker, i):
+    end = source.find(marker, i)
+    return len(source) if end == -1 else end
+
+
+def _js_regex_allowed(source, i):
+    j = i - 1
+    while j >= 0 and source[j].isspace():
+        j -= 1
+    if j < 0:
+        return True
+    if source[j] in ')]\'"`':
+        return False
+    k = j
+    while k >= 0 and (source[k].isalnum() or source[k] in '_$'):
+        k -= 1
+    return k == j or source[k + 1:j + 1] in _js_regex_keywords
+
+
+def _js_literal_end(source, i):
+    """Return the index just past the string, template or regex starting at ``i``."""
+    quote = source[i]
+    if quote == '`':
+        return _js_template_end(source, i)
+    in_class = False
+    i += 1
+    while i < len(source) and source[i] != '\n':
+        char = source[i]
+        if char == '\\':
+            i += 1
+        elif quote == '/' and char in '[]':
+            in_class = char == '['
+        elif char == quote and not in_class:
+            i += 1
+            break
+        i += 1
+    if quote == '/':
+        while i < len(source) and source[i].isalpha():  # flags
+            i += 1
+    return i
+
+
+def _js_template_end(source, i):
+    i += 1
+    while i < len(source):
+        if source[i] == '\\':
+            i += 2
+        elif source[i] == '`':
+            return i + 1
+        elif source.startswith('${', i):
+            i = _js_expression_end(source, i + 2)
+        else:
+            i += 1
+    return i
+
+
+def _js_expression_end(source, i):
+    depth = 0
+    while i < len(source):
+        char = source[i]
+        if char in '\'"`':
+            i = _js_literal_end(source, i)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            if not depth:
+                return i + 1
+            depth -= 1
+        i += 1
+    return i
+
+
+def minify(name, content):
+    if name.endswith('.css'):
+        return minify_css(content)
+    if name.endswith('.js'):
+        return minify_js(content)
+    return content
+
+
+def bundles():
+    return getattr(settings, 'STATIC_BUNDLES', {})
+
+
+def bundle_path(name):
+    return f'bundles/{name}'
+
+
+def build_bundle(name):
+    parts = []
+    for source in bundles()[name]:
+        with open(finders.find(source), encoding='utf-8') as fh:
+            parts.append(fh.read())
+    separator = '\n;\n' if name.endswith('.js') else '\n'
+    return separator.join(parts)
+
+
+def compressed_variants(data):
+    if len(data) < MIN_COMPRESS_SIZE:
+        return {}
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {ext: blob for ext, blob in variants.items() if len(blob) < len(data) * 0.95}
+
+
+class BundledManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # A missing file should degrade to an unhashed URL, not a 500.
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        paths = dict(paths)
+        # Only our own bundles are minified; everything else, admin and
+        # third-party assets included, is collected as shipped.
+        for name in bundles():
+            path = bundle_path(name)
+            self._replace(path, minify(path, build_bundle(name)).encode('utf-8'))
+            paths[path] = (self, path)
+
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                with self.open(name) as fh:
+                    data = fh.read()
+                for ext, blob in compressed_variants(data).items():
+                    self._replace(name + ext, blob)
+
+    def _replace(self, name, data):
+        if self.exists(name):
+            self.delete(name)
+        self.save(name, ContentFile(data))
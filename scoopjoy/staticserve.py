@@ -0,0 +1,66 @@
+"""
+Serve collected static files with far-future caching.
+
+Fingerprinted names (listed in the staticfiles manifest) are immutable, so
+they get a one-year ``Cache-Control``. The precompressed ``.br``/``.gz``
+sibling written by ``collectstatic`` is chosen from ``Accept-Encoding``.
+"""
+import mimetypes
+import os
+import posixpath
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+@lru_cache(maxsize=1)
+def _hashed_names():
+    hashed = getattr(staticfiles_storage, 'hashed_files', None) or {}
+    return frozenset(hashed.values())
+
+
+def _accepted(request):
+    header = request.headers.get('Accept-Encoding', '')
+    return {part.split(';')[0].strip().lower() for part in header.split(',')}
+
+
+@require_safe
+def serve_static(request, path):
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    mtime = os.stat(fullpath).st_mtime
+    if not was_modified_since(request.headers.get('If-Modified-Since'), mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+    encoding = None
+    accepted = _accepted(request)
+    for name, ext in ENCODINGS:
+        if name in accepted and os.path.isfile(fullpath + ext):
+            fullpath, encoding = fullpath + ext, name
+            break
+
+    response = FileResponse(open(fullpath, 'rb'), content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Last-Modified'] = http_date(mtime)
+    response.headers['Cache-Control'] = IMMUTABLE if path in _hashed_names() else REVALIDATE
+    return response
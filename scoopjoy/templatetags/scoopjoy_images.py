@@ -0,0 +1,19 @@
+from django import template
+
+from scoopjoy import images
+
+register = template.Library()
+
+
+@register.filter
+def srcset(instance, fmt='webp'):
+    """{{ product|srcset }} -> "…w160.webp 160w, …w320.webp 320w"."""
+    if not instance:
+        return ''
+    return images.srcset(instance, fmt)
+
+
+@register.simple_tag
+def static_srcset(path, fmt='webp'):
+    """{% static_srcset 'images/background.png' %} for images under static/."""
+    return images.static_srcset(path, fmt)
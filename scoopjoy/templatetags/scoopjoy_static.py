@@ -0,0 +1,26 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from scoopjoy import staticbuild
+
+register = template.Library()
+
+
+@register.simple_tag
+def bundle(name, defer=False):
+    """{% bundle 'products.js' defer=True %}
+
+    Links the built bundle when STATIC_BUNDLING is on, otherwise each of its
+    source files.
+    """
+    if settings.STATIC_BUNDLING:
+        sources = [staticbuild.bundle_path(name)]
+    else:
+        sources = settings.STATIC_BUNDLES[name]
+    if name.endswith('.css'):
+        html = '<link rel="stylesheet" href="{}">'
+    else:
+        html = '<script src="{}" defer></script>' if defer else '<script src="{}"></script>'
+    return format_html_join('\n', html, ((static(source),) for source in sources))
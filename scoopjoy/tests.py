@@ -1,3 +1,942 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles import finders
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from PIL import Image
+
+from . import (
+    benchmarks, caches, cart, catalog, images, logs, mail, orders, recommend, rendering, routers, sales, search,
+    staticbuild, versions, views,
+)
+from .models import Address, CartItem, CartSummary, CustomUser, DailySales, FavoriteFlavor, Order, Product
+from .models import OutgoingEmail
+from .smtp_sink import SMTPSink
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cone = Product.objects.create(
+                name='Cone', price=3, image='product_images/scoop.jpg', category='cones')
+
+    def products(self):
+        response = self.client.get('/api/products/')
+        return {p['id']: p for p in response.json()['products']}, response['ETag']
+
+    def test_products_follow_admin_save_delete_and_bulk_update(self):
+        products, etag = self.products()
+        self.assertEqual(products[self.cone.pk]['price'], 3.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/admin/scoopjoy/product/{self.cone.pk}/change/', {
+                'name': 'Waffle Cone', 'price': '4.00', 'discounted_price': '', 'category': 'cones',
+            })
+        self.assertEqual(response.status_code, 302)
+        products, saved = self.products()
+        self.assertEqual(products[self.cone.pk]['name'], 'Waffle Cone')
+        self.assertNotEqual(saved, etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.cone.pk).update(price=5)
+        products, updated = self.products()
+        self.assertEqual(products[self.cone.pk]['price'], 5.0)
+        self.assertNotEqual(updated, saved)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/admin/scoopjoy/product/{self.cone.pk}/delete/', {'post': 'yes'})
+        products, deleted = self.products()
+        self.assertNotIn(self.cone.pk, products)
+        self.assertNotEqual(deleted, updated)
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=deleted).status_code, 304)
+
+    def test_write_from_another_process_is_picked_up_by_version(self):
+        snapshot = catalog.get_catalog()
+        self.assertEqual(search.search('cone')[0], {'name': 'Cone', 'url': f'/product/{self.cone.pk}/'})
+        # Another worker renames the product: no signal runs here, only the
+        # shared version moves.
+        QuerySet.update(Product.objects.filter(pk=self.cone.pk), name='Mint Cone')
+        versions.bump_version(versions.CATALOG_KEY)
+
+        self.assertIsNot(catalog.get_catalog(), snapshot)
+        self.assertEqual(catalog.get_catalog().get(self.cone.pk)['name'], 'Mint Cone')
+        self.assertEqual(search.search('mint cone')[0]['name'], 'Mint Cone')
+
+
+class MailQueueTests(TestCase):
+    def test_worker_delivers_queue_over_one_connection(self):
+        for i in range(3):
+            mail.enqueue_mail(f'Hello {i}', 'Body', [f'user{i}@example.com'], html_message='<p>Body</p>')
+
+        with SMTPSink() as sink:
+            connection = get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host='127.0.0.1', port=sink.port, username='', password='', use_tls=False,
+            )
+            sent, failed = mail.deliver_batch(connection)
+            connection.close()
+
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual((sink.received, len(sink.messages)), (3, 3))
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+    def test_sink_counts_every_message_but_keeps_only_the_last(self):
+        for i in range(3):
+            mail.enqueue_mail(f'Hello {i}', 'Body', [f'user{i}@example.com'])
+        with SMTPSink(keep=1) as sink:
+            connection = get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host='127.0.0.1', port=sink.port, username='', password='', use_tls=False,
+            )
+            mail.deliver_batch(connection)
+            connection.close()
+        self.assertEqual((sink.received, len(sink.messages)), (3, 1))
+
+    def test_unreachable_smtp_leaves_queue_pending(self):
+        email = mail.enqueue_mail('Hello', 'Body', ['user@example.com'])
+        connection = get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host='127.0.0.1', port=1, username='', password='', use_tls=False, timeout=1,
+        )
+        with self.assertRaises(OSError):
+            mail.deliver_batch(connection)
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 0))
+
+    def test_no_transaction_is_open_while_sending(self):
+        mail.enqueue_mail('Hello', 'Body', ['user@example.com'])
+        backend = get_connection('django.core.mail.backends.locmem.EmailBackend')
+        depth = len(connection.atomic_blocks)  # the test case's own transaction
+        sends = []
+        with mock.patch.object(backend, 'send_messages',
+                               side_effect=lambda messages: sends.append(len(connection.atomic_blocks)) or 1):
+            self.assertEqual(mail.deliver_batch(backend), (1, 0))
+        self.assertEqual(sends, [depth])
+
+    def test_expired_lease_is_claimed_again(self):
+        email = mail.enqueue_mail('Hello', 'Body', ['user@example.com'])
+        self.assertEqual([e.pk for e in mail.claim_batch()], [email.pk])
+        # The worker dies here; until the lease runs out nobody else sends it.
+        self.assertEqual(mail.claim_batch(), [])
+        later = timezone.now() + timedelta(seconds=mail.LEASE_SECONDS + 1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            batch = mail.claim_batch()
+        self.assertEqual([(e.pk, e.status, e.attempts) for e in batch], [(email.pk, 'sending', 2)])
+
+
+class StaticBuildTests(TestCase):
+    SOURCE = """/* banner */
+.tag > .label ,
+.tag::before {
+    content: "a , b ; } /* kept */";
+    font-family: "Open  Sans", serif;
+    background: url("data:image/svg+xml,<svg  x='1'/>") ;
+}
+"""
+    SCRIPT = """// banner
+const rows = items.map(item => `
+    <li>  ${item.name /* kept */}  </li>`);
+const url = 'http://example.com/'; // comment
+const slashes = /\\/+/g, half = total / 2;
+"""
+
+    def setUp(self):
+        root, sources = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.addCleanup(shutil.rmtree, sources)
+        os.makedirs(os.path.join(sources, 'css'))
+        os.makedirs(os.path.join(sources, 'js'))
+        with open(os.path.join(sources, 'css', 'tag.css'), 'w') as fh:
+            fh.write(self.SOURCE)
+        with open(os.path.join(sources, 'js', 'tag.js'), 'w') as fh:
+            fh.write(self.SCRIPT)
+        override = override_settings(
+            STATIC_ROOT=root, STATICFILES_DIRS=[sources], STATIC_BUNDLING=True,
+            STATIC_BUNDLES={'tag.css': ['css/tag.css'], 'tag.js': ['js/tag.js']},
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'scoopjoy.staticbuild.BundledManifestStaticFilesStorage'}},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.root = root
+
+    def test_collectstatic_builds_a_hashed_bundle_with_strings_intact(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        url = static(staticbuild.bundle_path('tag.css'))
+        self.assertRegex(url, r'^/static/bundles/tag\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, url.removeprefix(settings.STATIC_URL).lstrip('/'))) as fh:
+            self.assertEqual(fh.read(), (
+                '.tag>.label,.tag::before{content: "a , b ; } /* kept */";font-family: "Open  Sans",serif;'
+                'background: url("data:image/svg+xml,<svg  x=\'1\'/>")}'
+            ))
+
+    def test_js_literals_survive_and_only_bundles_are_minified(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.root, staticbuild.bundle_path('tag.js'))) as fh:
+            self.assertEqual(fh.read(), (
+                'const rows = items.map(item => `\n    <li>  ${item.name /* kept */}  </li>`);\n'
+                "const url = 'http://example.com/';\n"
+                'const slashes = /\\/+/g, half = total / 2;'
+            ))
+        # Sources outside STATIC_BUNDLES, admin's included, are copied as shipped.
+        for name in ('js/tag.js', 'admin/js/core.js'):
+            with open(os.path.join(self.root, name)) as fh, open(finders.find(name)) as source:
+                self.assertEqual(fh.read(), source.read())
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        caches.catalog.clear()  # a shared cache keeps pages from earlier runs
+
+    def test_hit_replays_every_header_of_the_miss(self):
+        calls = []
+
+        @rendering.cached_page
+        def page(request):
+            calls.append(request.path)
+            response = HttpResponse('<p>Scoops</p>', content_type='text/html; charset=utf-8')
+            response['Content-Language'] = 'en'
+            patch_vary_headers(response, ['Accept-Language'])
+            patch_cache_control(response, public=True, max_age=60)
+            return response
+
+        request = RequestFactory().get('/page-cache-test/')
+        request.user = AnonymousUser()
+        miss, hit = page(request), page(request)
+        self.assertEqual(calls, ['/page-cache-test/'])
+        self.assertEqual(hit.content, miss.content)
+        self.assertEqual(dict(hit.items()), dict(miss.items()))
+        self.assertEqual((hit['Vary'], hit['Content-Language']), ('Accept-Language', 'en'))
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media, IMAGE_DERIVATIVES='thread')
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(media, 'product_images'))
+        Image.new('RGB', (400, 200), 'pink').save(os.path.join(media, 'product_images', 'scoop.png'))
+
+    def create(self, image):
+        with mock.patch.object(images._job, 'schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                product = Product.objects.create(name='Scoop', price=3, image=image, category='cones')
+        schedule.assert_called_once()
+        self.assertEqual(product.image_derivatives, {})  # nothing was encoded during the save
+        return product
+
+    def test_upload_is_built_after_commit_and_rendered_as_srcset(self):
+        product = self.create('product_images/scoop.png')
+        images.build_pending()  # what the job thread runs
+        product.refresh_from_db()
+        info = product.image_derivatives
+        self.assertEqual(info['widths'], [160, 320, 400])
+        for fmt in info['formats']:
+            for width in info['widths']:
+                self.assertTrue(product.image.storage.exists(images.derivative_name(product.image.name, width, fmt)))
+
+        response = self.client.get(product.get_absolute_url())
+        self.assertContains(response, 'srcset="/media/derivatives/product_images/scoop.w160.webp 160w, '
+                                      '/media/derivatives/product_images/scoop.w320.webp 320w, '
+                                      '/media/derivatives/product_images/scoop.w400.webp 400w"')
+        with mock.patch.object(images._job, 'schedule') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+        schedule.assert_not_called()  # unchanged image: nothing to rebuild
+
+    def test_missing_source_is_skipped_quietly(self):
+        self.create('product_images/missing.png')
+        with self.assertNumQueries(0), self.assertNoLogs('scoopjoy.images', logging.WARNING):
+            images.build_pending()
+
+
+@override_settings(SEARCH_BACKEND='fts5')
+class ProductFtsTests(TestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'scoopjoy_product_fts%%'")
+            self.objects = {row[0] for row in cursor.fetchall()}
+        if 'scoopjoy_product_fts' not in self.objects:
+            self.skipTest("SQLite without FTS5")
+
+    def names(self, query):
+        return [result['name'] for result in search.search_fts(query)]
+
+    def test_migrated_triggers_index_new_and_renamed_products(self):
+        self.assertLessEqual(
+            {'scoopjoy_product_fts_ai', 'scoopjoy_product_fts_ad', 'scoopjoy_product_fts_au'}, self.objects)
+        product = Product.objects.create(name='Yuzu Sorbet', price=3, image='product_images/scoop.jpg', category='tubs')
+        self.assertEqual(self.names('yuzu'), ['Yuzu Sorbet'])
+        product.name = 'Lemon Drift'
+        product.save()
+        self.assertEqual(self.names('yuzu'), [])
+        self.assertEqual(self.names('lemon dri'), ['Lemon Drift'])
+
+
+class StorefrontBenchmarkTests(TestCase):
+    # Upper bounds on SQL queries per request; raise them only on purpose.
+    QUERY_BUDGET = {
+        'products': 0,
+        'products_category': 0,
+        'search': 0,
+        'cart_add': 7,
+        'cart_update': 6,
+        'place_order': 14,
+        'orders': 10,
+    }
+
+    def test_routes_stay_within_query_budget(self):
+        ctx = benchmarks.seed(users=2, products=12, cart_lines=2, orders=2)
+        self.assertEqual(set(Order.objects.values_list('item_count', flat=True)), {2})
+        report = benchmarks.run(ctx, concurrency=1, requests=3)
+
+        self.assertEqual(set(report), set(self.QUERY_BUDGET))
+        for name, budget in self.QUERY_BUDGET.items():
+            with self.subTest(route=name):
+                self.assertEqual(report[name]['errors'], 0)
+                self.assertLessEqual(report[name]['max_queries'], budget, report[name])
+
+    def test_compare_flags_regressions(self):
+        baseline = {'search': {'p95_ms': 1.0, 'max_queries': 0, 'errors': 0}}
+        slower = {'search': {'p95_ms': 2.0, 'max_queries': 1, 'errors': 0}}
+        self.assertEqual(benchmarks.compare(baseline, baseline), [])
+        self.assertEqual(len(benchmarks.compare(slower, baseline)), 2)
+
+
+class QueryInstrumentationTests(TestCase):
+    def test_duplicate_queries_are_reported_to_staff(self):
+        user = CustomUser.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        for i in range(3):
+            CartItem.objects.create(user=user, product=Product.objects.create(
+                name=f'Scoop {i}', price=2, image='product_images/scoop.jpg', category='cones'))
+        self.client.force_login(user)
+
+        response = self.client.get('/cart/')
+        self.assertIn('X-Query-Count', response)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        stats = self.client.get('/staff/query-stats/').json()
+        cart = next(view for view in stats['views'] if view['view'] == 'scoopjoy:cart')
+        self.assertEqual(cart['max_queries'], int(response['X-Query-Count']))
+
+
+class ExplainRoutesTests(TestCase):
+    def test_hot_routes_use_indexes(self):
+        CustomUser.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        Product.objects.create(name='Cone', price=3, image='product_images/scoop.jpg', category='cones')
+        out = StringIO()
+        call_command('explain_routes', '--strict', stdout=out)  # raises CommandError on a full scan
+        self.assertIn('orders: page after cursor', out.getvalue())
+        self.assertTrue(out.getvalue().endswith(f'{connection.vendor}: 0 full scan(s).\n'))
+
+
+class CartQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.address = Address.objects.create(
+            user=self.user, name='Home', phone='1', pin_code='1', state='S', district='D', address='A')
+
+    def fill_cart(self, lines):
+        CartItem.objects.filter(user=self.user).delete()
+        for i in range(lines):
+            CartItem.objects.create(user=self.user, quantity=2, product=Product.objects.create(
+                name=f'Scoop {i}', price=3, image='product_images/scoop.jpg', category='cones'))
+        cart.refresh_summary(self.user.pk)
+
+    def queries(self, path):
+        self.client.get(path)  # warm the cart summary cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return len(ctx)
+
+    def test_cart_pages_cost_the_same_for_any_number_of_lines(self):
+        for path in ('/cart/', '/checkout/', '/cart/items/'):
+            with self.subTest(path=path):
+                self.fill_cart(1)
+                one = self.queries(path)
+                self.fill_cart(10)
+                self.assertEqual(self.queries(path), one)
+
+    def test_profile_orders_are_prefetched(self):
+        self.fill_cart(1)
+        orders.place_order(self.user, self.address)
+        one = self.queries('/profile/')
+        for _ in range(3):
+            self.fill_cart(5)
+            orders.place_order(self.user, self.address)
+        self.assertEqual(self.queries('/profile/'), one)
+
+    def test_loaded_cart_totals(self):
+        self.fill_cart(3)
+        with self.assertNumQueries(1):
+            loaded = cart.load(self.user.pk)
+        self.assertEqual((len(loaded), loaded.total_quantity, loaded.total_price), (3, 6, Decimal('18.00')))
+
+
+class CartSummaryCacheTests(TestCase):
+    def setUp(self):
+        self.shopper = CustomUser.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.other = CustomUser.objects.create_user('other', 'other@example.com', 'pw')
+        self.product = Product.objects.create(name='Scoop', price=3, image='product_images/scoop.jpg', category='cones')
+        caches.cart.clear()  # user ids are reused between tests
+
+    def test_late_commit_callback_cannot_restore_an_older_summary(self):
+        with self.captureOnCommitCallbacks() as older:
+            cart.add_item(self.shopper, self.product)
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add_item(self.shopper, self.product)
+        self.assertEqual(cart.get_summary(self.shopper.pk).total_quantity, 2)
+        for callback in older:
+            callback()
+        self.assertEqual(cart.get_summary(self.shopper.pk).total_quantity, 2)
+
+    def test_reader_racing_a_write_cannot_cache_the_old_summary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add_item(self.shopper, self.product)
+        with self.captureOnCommitCallbacks() as late_fill:
+            self.assertEqual(cart.get_summary(self.shopper.pk).total_quantity, 1)  # read, not yet cached
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add_item(self.shopper, self.product)
+        for callback in late_fill:
+            callback()
+        self.assertEqual(cart.get_summary(self.shopper.pk).total_quantity, 2)
+
+    def test_writes_read_the_row_back_without_returning(self):
+        # SQLite before 3.35 has no RETURNING.
+        with mock.patch.object(connection.features, 'can_return_columns_from_insert', False), \
+                CaptureQueriesContext(connection) as queries:
+            cart.add_item(self.shopper, self.product)
+            item, summary = cart.add_item(self.shopper, self.product)
+            self.assertEqual((item.quantity, summary.total_quantity, summary.total_price), (2, 2, Decimal('6.00')))
+            item, summary = cart.change_quantity(self.shopper.pk, self.product.pk, -1)
+            self.assertEqual((item.quantity, item.line_total, summary.total_quantity), (1, Decimal('3.00'), 1))
+        self.assertFalse([q['sql'] for q in queries if 'RETURNING' in q['sql']])
+
+    def test_admin_moving_a_line_refreshes_both_carts(self):
+        self.client.force_login(CustomUser.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        item = CartItem.objects.create(user=self.shopper, product=self.product, quantity=2)
+        cart.refresh_summary(self.shopper.pk)
+        self.assertEqual(cart.get_summary(self.shopper.pk).total_quantity, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/admin/scoopjoy/cartitem/{item.pk}/change/', {
+                'user': self.other.pk, 'product': self.product.pk, 'quantity': 2,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(cart.get_summary(self.shopper.pk).total_quantity, 0)
+        self.assertEqual(cart.get_summary(self.other.pk).total_quantity, 2)
+
+    def test_zero_discount_prices_alike_in_sql_and_python(self):
+        self.product.discounted_price = Decimal('0.00')
+        self.product.save()
+        item, summary = cart.add_item(self.shopper, self.product)
+        self.assertEqual((item.line_total, summary.total_price), (Decimal('3.00'), Decimal('3.00')))
+        item, summary = cart.change_quantity(self.shopper.pk, self.product.pk, 1)
+        self.assertEqual((item.line_total, summary.total_price), (Decimal('6.00'), Decimal('6.00')))
+        line, = cart.load(self.shopper.pk).lines
+        self.assertEqual((line.unit_price, line.line_total, line.total_price()), (3, Decimal('6.00'), 6))
+        self.assertEqual(cart.refresh_summary(self.shopper.pk).total_price, Decimal('6.00'))
+
+    def test_repeated_increments_do_not_drift(self):
+        dime = Product.objects.create(name='Sprinkle', price=Decimal('0.10'), image='product_images/s.jpg')
+        for _ in range(30):
+            _, summary = cart.add_item(self.shopper, dime)
+        self.assertEqual(summary.total_price, Decimal('3.00'))
+        self.assertEqual(CartSummary.objects.filter(total_price=Decimal('3.00')).count(), 1)
+
+    def test_only_price_changes_retotal_carts_holding_the_product(self):
+        cart.add_item(self.shopper, self.product)
+        cart.add_item(self.other, self.product)
+        with mock.patch.object(cart, 'refresh_summaries', wraps=cart.refresh_summaries) as refresh:
+            self.product.name = 'Double scoop'
+            self.product.save()
+            self.product.save(update_fields=['image_derivatives'])
+            refresh.assert_not_called()
+            self.product.discounted_price = Decimal('2.50')
+            self.product.save(update_fields=['price', 'discounted_price'])
+            refresh.assert_called_once()
+        self.assertEqual(cart.get_summary(self.other.pk).total_price, Decimal('2.50'))
+
+    def test_bulk_repricing_retotals_carts_in_one_statement(self):
+        cart.add_item(self.shopper, self.product)
+        cart.add_item(self.shopper, self.product)
+        cart.add_item(self.other, self.product)
+        with CaptureQueriesContext(connection) as queries:
+            Product.objects.filter(pk=self.product.pk).update(name='Renamed')
+        self.assertFalse([q['sql'] for q in queries if 'scoopjoy_cartsummary' in q['sql']])
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            Product.objects.filter(pk=self.product.pk).update(price=4)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "scoopjoy_cartsummary"')]), 1)
+        self.assertEqual(cart.get_summary(self.shopper.pk).total_price, Decimal('8.00'))
+        self.assertEqual(cart.get_summary(self.other.pk).total_price, Decimal('4.00'))
+
+
+class CartBatchTests(TestCase):
+    def test_operations_apply_in_order_in_one_request(self):
+        user = CustomUser.objects.create_user('batcher', 'batcher@example.com', 'pw')
+        self.client.force_login(user)
+        a, b = [
+            Product.objects.create(name=f'Scoop {i}', price=2, image='product_images/scoop.jpg', category='cones').pk
+            for i in range(2)
+        ]
+        operations = [
+            {'op': 'add', 'product': a}, {'op': 'increment', 'product': a},
+            {'op': 'increment', 'product': b}, {'op': 'decrement', 'product': b}, {'op': 'decrement', 'product': b},
+            {'op': 'set', 'product': b, 'quantity': 3}, {'op': 'remove', 'product': a},
+        ]
+        response = self.client.post('/cart/batch/', {'operations': operations}, content_type='application/json')
+
+        self.assertEqual(response.json(), {
+            'items': {str(b): {'quantity': 3, 'item_total': '6.00'}},
+            'cart_count': 3,
+            'cart_total': '6.00',
+        })
+        self.assertEqual(list(CartItem.objects.filter(user=user).values_list('product_id', 'quantity')), [(b, 3)])
+        bad = self.client.post('/cart/batch/', {'operations': [{'op': 'add', 'product': 0}]},
+                               content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
+
+    def test_add_item_landing_mid_batch_is_kept(self):
+        user = CustomUser.objects.create_user('batcher', 'batcher@example.com', 'pw')
+        a, b = [
+            Product.objects.create(name=f'Scoop {i}', price=2, image='product_images/scoop.jpg', category='cones')
+            for i in range(2)
+        ]
+        cart.add_item(user, a)
+        cart.add_item(user, b)
+        write_lines = cart._write_lines
+
+        def interleaved(*args):
+            # Another request adds a unit of each after the batch read the cart.
+            cart.add_item(user, a)
+            cart.add_item(user, b)
+            write_lines(*args)
+
+        with mock.patch.object(cart, '_write_lines', interleaved):
+            loaded, summary = cart.apply_batch(user.pk, [
+                {'op': 'increment', 'product': a.pk}, {'op': 'set', 'product': b.pk, 'quantity': 5},
+            ])
+        # The increment is applied on top of the concurrent add; set still wins.
+        self.assertEqual(loaded.quantities(), {str(a.pk): 3, str(b.pk): 5})
+        self.assertEqual(summary.total_quantity, 8)
+
+
+class AsyncApiTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.product = Product.objects.create(
+            name='Choco Cone', price=3, image='product_images/scoop.jpg', category='cones')
+        self.address = Address.objects.create(
+            user=self.user, name='Home', phone='1', pin_code='1', state='S', district='D', address='A')
+
+    def add_to_cart(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add_item(self.user, self.product)
+
+    def test_json_views_are_coroutines(self):
+        for view in (views.check_auth, views.cart_count, views.cart_items_view,
+                     views.products_api, views.search_api, views.get_address):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+
+    async def test_cart_endpoints_revalidate_against_the_summary(self):
+        await self.async_client.aforce_login(self.user)
+        await sync_to_async(self.add_to_cart)()
+        response = await self.async_client.get('/cart/count/')
+        self.assertEqual(json.loads(response.content), {'count': 1})
+        etag = response['ETag']
+        response = await self.async_client.get('/cart/items/', headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        await sync_to_async(self.add_to_cart)()
+        response = await self.async_client.get('/cart/count/', headers={'if-none-match': etag})
+        self.assertEqual(json.loads(response.content), {'count': 2})
+
+    async def test_catalog_and_address_endpoints(self):
+        response = await self.async_client.get('/api/products/?category=cones')
+        self.assertIn('Choco Cone', [p['name'] for p in json.loads(response.content)['products']])
+        response = await self.async_client.get('/api/products/', headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get('/api/search/?q=choc')
+        self.assertEqual(json.loads(response.content)['results'][0]['name'], 'Choco Cone')
+
+        response = await self.async_client.get(f'/get-address/{self.address.pk}/')
+        self.assertEqual(response.status_code, 302)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'/get-address/{self.address.pk}/')
+        self.assertEqual(json.loads(response.content)['full_name'], 'Home')
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('regular', 'regular@example.com', 'pw')
+        self.client.force_login(self.user)
+        product = Product.objects.create(name='Scoop', price=3, image='product_images/scoop.jpg', category='cones')
+        for _ in range(7):
+            CartItem.objects.create(user=self.user, product=product, quantity=2)
+            orders.place_order(self.user, None)
+
+    def test_keyset_pages_cover_history_once(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = orders.history_page(self.user.pk, cursor, limit=3)
+            seen += [order.pk for order in page]
+            if not cursor:
+                break
+        expected = list(Order.objects.filter(user=self.user).order_by('-ordered_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(Order.objects.get(pk=seen[0]).item_count, 2)
+
+    def test_api_streams_pages(self):
+        response = self.client.get('/api/orders/', {'limit': 5})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data['orders']), 5)
+        rest = json.loads(b''.join(self.client.get('/api/orders/', {'before': data['next']}).streaming_content))
+        self.assertEqual((len(rest['orders']), rest['next']), (2, None))
+        self.assertEqual(self.client.get('/api/orders/', {'before': 'nonsense'}).status_code, 400)
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    CLICKS = 25
+
+    def test_parallel_clicks_lose_no_updates(self):
+        user = CustomUser.objects.create_user('clicker', 'clicker@example.com', 'pw')
+        products = [
+            Product.objects.create(name=f'Scoop {i}', price=2, image='product_images/scoop.jpg', category='cones')
+            for i in range(2)
+        ]
+        cart.add_item(user, products[1])  # so decrements always have a line to hit
+        errors = []
+
+        def retry(operation):
+            # In-memory SQLite locks whole tables; keep trying until it is our turn.
+            while True:
+                try:
+                    return operation()
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    time.sleep(0.001)
+
+        def click(worker):
+            try:
+                for i in range(self.CLICKS):
+                    retry(lambda: cart.add_item(user, products[0]))
+                    retry(lambda: cart.add_item(user, products[1]))
+                    if worker % 2:
+                        retry(lambda: cart.change_quantity(user.pk, products[1].pk, -1))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        quantities = dict(CartItem.objects.filter(user=user).values_list('product_id', 'quantity'))
+        expected_second = 1 + self.THREADS * self.CLICKS - self.THREADS // 2 * self.CLICKS
+        self.assertEqual(quantities, {products[0].pk: self.THREADS * self.CLICKS, products[1].pk: expected_second})
+
+        summary = CartSummary.objects.get(user=user)
+        self.assertEqual(summary.total_quantity, sum(quantities.values()))
+        self.assertEqual(summary.total_price, Decimal(2 * summary.total_quantity))
+
+
+@unittest.skipUnless(
+    connection.vendor == 'sqlite' and 'init_command' in connection.settings_dict['OPTIONS'], 'tuned SQLite only')
+class SqliteTuningTests(TestCase):
+    def pragmas(self, conn, *names):
+        with conn.cursor() as cursor:
+            values = []
+            for name in names:
+                cursor.execute(f'PRAGMA {name}')
+                values.append(cursor.fetchone()[0])
+        return values
+
+    def test_test_connection_runs_the_tuning_pragmas(self):
+        # busy_timeout in ms; synchronous NORMAL = 1; temp_store MEMORY = 2.
+        self.assertEqual(self.pragmas(connection, 'busy_timeout', 'synchronous', 'temp_store'), [5000, 1, 2])
+        # The test database lives in memory, which has no WAL.
+        self.assertEqual(self.pragmas(connection, 'journal_mode'), ['memory'])
+
+    def test_file_database_switches_to_wal(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        database = type(connections['default'])(
+            {**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')}, 'tuning')
+        self.addCleanup(database.close)
+        self.assertEqual(self.pragmas(database, 'journal_mode', 'busy_timeout'), ['wal', 5000])
+
+
+class CacheNamespaceTests(TestCase):
+    def test_otp_is_kept_in_its_own_namespace(self):
+        def post(path, data):
+            return self.client.post(path, json.dumps(data), content_type='application/json')
+
+        self.assertEqual(post('/auth/send-otp/', {'email': 'otp@example.com'}).status_code, 200)
+        code = caches.otp.get('otp@example.com')
+        self.assertIsNone(caches.cart.get('otp@example.com'))
+        self.assertEqual(post('/auth/verify-otp/', {'email': 'otp@example.com', 'otp': code}).status_code, 200)
+        self.assertIsNone(caches.otp.get('otp@example.com'))
+        # The session has to survive into the next request.
+        self.assertEqual(self.client.get('/api/check-auth/').json(), {'is_authenticated': True})
+
+    def test_sessions_from_the_model_backend_stay_logged_in(self):
+        user = CustomUser.objects.create_user('old', 'old@example.com', 'pw')
+        self.client.force_login(user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get('/api/check-auth/').json(), {'is_authenticated': True})
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'scoopjoy.backends.CachedModelBackend')
+
+    async def test_sessions_from_the_model_backend_stay_logged_in_under_asgi(self):
+        user = await sync_to_async(CustomUser.objects.create_user)('old', 'old@example.com', 'pw')
+        await self.async_client.aforce_login(user, backend='django.contrib.auth.backends.ModelBackend')
+        response = await self.async_client.get('/api/check-auth/')
+        self.assertEqual(json.loads(response.content), {'is_authenticated': True})
+
+    def test_namespaces_have_their_own_prefix_version_and_ttl(self):
+        self.assertEqual(caches.otp.default_timeout, 300)
+        self.assertNotEqual(caches.otp.make_key('k'), caches.cart.make_key('k'))
+        self.assertIsNone(caches.catalog.get(cart.summary_key(1, 1)))
+
+
+class SessionQueryTests(TestCase):
+    def queries(self, path):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return len(ctx)
+
+    def test_steady_state_requests_skip_session_and_user_queries(self):
+        for path in ('/api/check-auth/', '/cart/count/', '/'):
+            self.queries(path)
+            self.assertEqual(self.queries(path), 0, f'anonymous {path}')
+
+        user = CustomUser.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        self.assertTrue(self.client.login(username='shopper', password='pw'))
+        for path in ('/api/check-auth/', '/cart/count/', '/'):
+            self.queries(path)
+            self.assertEqual(self.queries(path), 0, f'authenticated {path}')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.first_name = 'Renamed'
+            user.save()
+        self.assertEqual(self.queries('/api/check-auth/'), 1)  # the user, reloaded once
+        self.assertEqual(self.queries('/api/check-auth/'), 0)
+
+
+class BootstrapTests(TestCase):
+    def test_one_response_replaces_the_page_waterfall(self):
+        user = CustomUser.objects.create_user('shopper', 'shopper@example.com', 'pw')
+        product = Product.objects.create(name='Choco Cone', price=3, image='product_images/scoop.jpg', category='cones')
+        self.assertContains(self.client.get('/cones/'), 'data-bootstrap="/api/bootstrap/?category=cones"')
+
+        data = self.client.get('/api/bootstrap/?category=cones').json()
+        self.assertEqual((data['is_authenticated'], data['cart'], data['cart_count']), (False, {}, 0))
+        self.assertEqual({p['category'] for p in data['products']}, {'cones'})
+
+        self.client.login(username='shopper', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add_item(user, product)
+        self.client.get('/api/bootstrap/?category=cones')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/bootstrap/?category=cones')
+        self.assertEqual(len(ctx), 0)
+        data = response.json()
+        self.assertEqual((data['cart'], data['cart_count']), ({str(product.pk): 1}, 1))
+        response = self.client.get('/api/bootstrap/?category=cones', headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class RecommendTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('shopper', 'shopper@example.com', 'pw')
+
+    def results(self, answers, **params):
+        response = self.client.get('/api/recommend/', {'answers': ','.join(answers), **params})
+        self.assertEqual(response.status_code, 200)
+        return [r['name'] for r in response.json()['results']]
+
+    @unittest.skipUnless(recommend.AVAILABLE, 'needs NumPy')
+    def test_answers_and_favorites_drive_the_ranking(self):
+        self.assertIn('Chocolate', self.results(['party', 'bold', 'chocolate'])[0])
+        self.assertEqual(self.results([]), [])
+
+        FavoriteFlavor.objects.create(user=self.user, flavor_name='Pistachio')
+        self.client.force_login(self.user)
+        self.assertIn('Pistachio', self.results([])[0])
+        self.assertLessEqual(len(self.results(['calm'], limit=3)), 3)
+
+    @unittest.skipUnless(recommend.AVAILABLE, 'needs NumPy')
+    def test_matrix_follows_product_changes(self):
+        product = Product.objects.create(
+            name='Mango Tango', price=3, image='product_images/scoop.jpg', category='sticks')
+        self.assertIn('Mango Tango', self.results(['exercise', 'fun'], limit=3))
+        product.name = 'Plain Scoop'
+        product.save()
+        self.assertNotIn('Plain Scoop', self.results(['exercise', 'fun'], limit=3))
+
+    @unittest.skipUnless(recommend.AVAILABLE, 'needs NumPy')
+    def test_matrix_follows_a_write_from_another_process(self):
+        model = recommend.get_recommender()
+        versions.bump_version(versions.CATALOG_KEY)
+        self.assertIsNot(recommend.get_recommender(), model)
+
+    def test_endpoint_answers_503_without_numpy(self):
+        with mock.patch.object(recommend, 'AVAILABLE', False):
+            response = self.client.get('/api/recommend/', {'answers': 'calm'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'error': 'Recommendations are unavailable'})
+
+
+class StructuredLoggingTests(TestCase):
+    def test_lazy_payloads_and_sampling(self):
+        built = []
+        log = logging.getLogger('scoopjoy.tests.quiet')
+        log.setLevel(logging.INFO)
+        log.debug("payload %s", logs.Lazy(lambda: built.append(1)))
+        self.assertEqual(built, [])
+
+        sampler = logs.DebugSampler(0)
+        self.assertFalse(sampler.filter(logging.makeLogRecord({'levelno': logging.DEBUG})))
+        self.assertTrue(sampler.filter(logging.makeLogRecord({'levelno': logging.WARNING})))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = logs.LogQueueHandler(maxsize=1)
+        handler.stop()  # nothing drains the queue
+        record = logging.makeLogRecord({'msg': 'order %s', 'args': (1,), 'order_id': 1})
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual(handler.dropped, 1)
+        entry = json.loads(logs.JsonFormatter().format(handler.queue.get_nowait()))
+        self.assertEqual((entry['message'], entry['order_id']), ('order 1', 1))
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        self.cone = Product.objects.create(name='Cone', price=3, image='product_images/scoop.jpg', category='cones')
+        self.tub = Product.objects.create(name='Tub', price=10, image='product_images/scoop.jpg', category='tubs')
+        for quantities in ((2, 1), (1, 0), (0, 3)):
+            for product, quantity in zip((self.cone, self.tub), quantities):
+                if quantity:
+                    CartItem.objects.create(user=self.staff, product=product, quantity=quantity)
+            orders.place_order(self.staff, None)
+        self.client.force_login(self.staff)
+
+    def test_orders_are_rolled_up_once_in_chunks(self):
+        self.assertEqual(sales.drain(chunk_size=2, pause=0), 3)
+        self.assertEqual(sales.drain(), 0)
+        day = DailySales.objects.get()
+        self.assertEqual((day.orders, day.units, day.revenue), (3, 7, Decimal('49.00')))
+        self.assertEqual((day.first_order_id, day.last_order_id), tuple(
+            Order.objects.order_by('id').values_list('id', flat=True)[::2]))
+
+        report = self.client.get('/staff/sales/').json()
+        self.assertEqual(report['totals'], {'orders': 3, 'units': 7, 'revenue': '49.00'})
+        self.assertEqual([(c['category'], c['orders']) for c in report['categories']], [('tubs', 2), ('cones', 2)])
+        top = self.client.get('/staff/sales/top-products/', {'by': 'units'}).json()['products']
+        self.assertEqual([(p['name'], p['units']) for p in top], [('Tub', 4), ('Cone', 3)])
+        self.assertEqual(self.client.get('/staff/sales/', {'from': '2020-02-01', 'to': '2020-01-01'}).status_code, 400)
+
+        sales.reset()
+        self.assertEqual((DailySales.objects.count(), sales.pending()), (0, 3))
+        sales.drain()
+        self.assertEqual(DailySales.objects.get().revenue, Decimal('49.00'))
+
+    def test_checkout_wakes_the_rollup_thread_only_in_thread_mode(self):
+        CartItem.objects.create(user=self.staff, product=self.cone, quantity=1)
+        with mock.patch.object(sales._job, 'schedule') as schedule:
+            with override_settings(SALES_ROLLUP='worker'), self.captureOnCommitCallbacks(execute=True):
+                orders.place_order(self.staff, None)
+            schedule.assert_not_called()
+            CartItem.objects.create(user=self.staff, product=self.tub, quantity=1)
+            with override_settings(SALES_ROLLUP='thread'), self.captureOnCommitCallbacks(execute=True):
+                orders.place_order(self.staff, None)
+            schedule.assert_called_once_with()
+
+    def test_export_streams_lines_including_pending_orders(self):
+        self.tub.delete()
+        response = self.client.get('/staff/sales/export.csv')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], ','.join(sales.EXPORT_COLUMNS))
+        self.assertEqual(len(rows), 5)
+        with self.assertNumQueries(5):  # two for the bounds, two chunks, one ending the seek
+            chunks = list(sales.export_lines(timezone.localdate(), timezone.localdate(), chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2])
+        self.assertEqual(self.client.get('/staff/sales/', {'from': 'soon'}).status_code, 400)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(TestCase):
+    def test_catalog_reads_go_to_replica_unless_pinned(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertIsNone(router.db_for_read(CartItem))
+        # TestCase wraps every test in a transaction, which pins reads.
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(Product), 'replica1')
+            self.assertEqual(router.db_for_read(Order), 'replica1')
+            with routers.use_primary():
+                self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_writes_pin_the_visitor_to_the_primary(self):
+        seen = []
+        middleware = routers.ReplicaPinMiddleware(lambda request: seen.append(routers._pinned.get()) or HttpResponse())
+        factory = RequestFactory()
+
+        self.assertNotIn(routers.PIN_COOKIE, middleware(factory.get('/orders/')).cookies)
+        response = middleware(factory.post('/place-order/'))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        request = factory.get('/orders/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(seen, [False, True, True])
+
+    def test_history_streamed_after_placing_an_order_stays_on_the_primary(self):
+        user = CustomUser.objects.create_user('ann', 'ann@example.com', 'pw')
+        product = Product.objects.create(name='Cone', price=3, image='product_images/scoop.jpg', category='cones')
+        CartItem.objects.create(user=user, product=product, quantity=1)
+        orders.place_order(user, None)
+
+        request = RequestFactory().get('/api/orders/')
+        request.user = user
+        request.COOKIES[routers.PIN_COOKIE] = '1'  # set on the place-order response
+        pinned, history = [], orders.history
+        with mock.patch.object(orders, 'history', lambda *args: pinned.append(routers._pinned.get()) or history(*args)):
+            response = routers.ReplicaPinMiddleware(views.order_history_api)(request)
+            # The body is only produced now, after the middleware has returned.
+            body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(body['orders']), 1)
+        self.assertEqual(pinned, [True])
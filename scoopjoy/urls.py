@@ -24,11 +24,13 @@ urlpatterns = [
     path('cart/items/', views.cart_items_view, name='cart_items'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/update/<int:product_id>/', views.update_quantity, name='update_quantity'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
     path('checkout/', views.checkout_view, name='checkout'),
     path('get-address/<int:address_id>/', views.get_address, name='get_address'),
     path('delete-address/<int:address_id>/', views.delete_address, name='delete_address'),
     path("place-order/", views.place_order, name="place_order"),
     path("orders/", views.orders_view, name="orders"),
+    path("api/orders/", views.order_history_api, name="order_history_api"),
     path("api/search/", views.search_api, name="search_api"),
     path("product/<int:id>/", views.product_detail, name="product_detail"),
     path('auth/password/reset/', views.password_reset, name='password_reset'),
@@ -37,5 +39,11 @@ urlpatterns = [
     path('auth/password/reset/confirm/<uidb64>/<token>/', views.password_reset_confirm, name='password_reset_confirm'),
     path("api/check-auth/", views.check_auth, name="check_auth"),
     path('api/products/', views.products_api, name='products_api'),
+    path('api/recommend/', views.recommend_api, name='recommend_api'),
+    path('api/bootstrap/', views.bootstrap_api, name='bootstrap'),
     path('menu/', views.menu_page, name='menu'),
+    path('staff/query-stats/', views.query_stats, name='query_stats'),
+    path('staff/sales/', views.sales_report, name='sales_report'),
+    path('staff/sales/top-products/', views.sales_top_products, name='sales_top_products'),
+    path('staff/sales/export.csv', views.sales_export, name='sales_export'),
 ]
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Version counters used to build ETag/Last-Modified headers.
+
+The catalog has one counter, bumped whenever a ``Product`` is written; it
+lives in the catalog cache namespace so conditional GETs can be answered
+without touching the database. Cart ETags use the version kept on each user's ``CartSummary``.
+
+The JSON endpoints are async views, so the state functions below are
+coroutines and ``async_condition`` stands in for Django's ``condition``
+decorator, which only calls its callbacks synchronously.
+"""
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import cart
+from .caches import catalog as cache
+
+CATALOG_KEY = 'version:catalog'
+
+
+def _seed():
+    # Seed from the clock so a cold cache never hands out a version number
+    # that a client may already hold an ETag for.
+    return int(time.time() * 1000)
+
+
+def get_version(key, store=cache):
+    version = store.get(key)
+    if version is None:
+        store.add(key, _seed(), None)
+        store.add(f'{key}:ts', time.time(), None)
+        version = store.get(key)
+    return version
+
+
+def bump_version(key, store=cache):
+    try:
+        version = store.incr(key)
+    except ValueError:
+        store.add(key, _seed(), None)
+        version = store.incr(key)
+    store.set(f'{key}:ts', time.time(), None)
+    return version
+
+
+def last_modified(key):
+    get_version(key)
+    ts = cache.get(f'{key}:ts') or time.time()
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc)
+
+
+def catalog_version():
+    return get_version(CATALOG_KEY)
+
+
+async def aget_version(key, store=cache):
+    version = await store.aget(key)
+    if version is None:
+        version = await sync_to_async(get_version)(key, store)
+    return version
+
+
+async def alast_modified(key):
+    await aget_version(key)
+    ts = await cache.aget(f'{key}:ts') or time.time()
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc)
+
+
+# State functions for async_condition: (etag, last_modified) for a request.
+
+async def catalog_state(request, *args, **kwargs):
+    version = await aget_version(CATALOG_KEY)
+    return f'catalog-{version}', await alast_modified(CATALOG_KEY)
+
+
+async def cart_state(request, *args, **kwargs):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return 'cart-anonymous', None
+    summary = await cart.aget_summary(user.pk)
+    return f'cart-{user.pk}-{summary.version}', summary.updated_at
+
+
+async def bootstrap_state(request, *args, **kwargs):
+    catalog_etag, catalog_modified = await catalog_state(request)
+    cart_etag, cart_modified = await cart_state(request)
+    return f'{catalog_etag}-{cart_etag}', max(filter(None, (catalog_modified, cart_modified)))
+
+
+def async_condition(state_func):
+    """``condition`` for async views, with one coroutine for both validators."""
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            etag, modified = await state_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag else None
+            timestamp = int(modified.timestamp()) if modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if timestamp and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(timestamp)
+            if etag:
+                response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
@@ -1,33 +1,38 @@
-from django.core.mail import send_mail, EmailMessage
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate, get_user_model
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from .forms import *
 from .models import *
-from django.http import JsonResponse, HttpResponseRedirect
+from . import caches, cart, instrumentation, orders, recommend, routers, sales, search
+from .catalog import aget_catalog, get_catalog
+from .logs import Lazy
+from .mail import enqueue_mail
+from .rendering import cached_page
+from .versions import async_condition, bootstrap_state, cart_state, catalog_state
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_protect, csrf_exempt
+from django.views.decorators.cache import cache_control
 import json
 import logging
 from django.db import transaction
-from django.db.models import Sum
 from django.contrib.auth.tokens import default_token_generator
 from django.urls import reverse
-from django.core.cache import cache
 import random
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.forms import SetPasswordForm
-from django.core.mail import EmailMultiAlternatives
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# Newest orders shown on the profile page; the rest live on /orders/.
+PROFILE_ORDERS = 5
+
 @csrf_exempt
 def password_reset(request):
     if request.method == "POST":
@@ -44,23 +49,22 @@ def password_reset(request):
             reset_url = request.build_absolute_uri(
                 reverse('scoopjoy:password_reset_confirm', kwargs={'uidb64': uidb64, 'token': token})
             )
-            send_mail(
+            enqueue_mail(
                 subject='ScoopJoy Password Reset',
                 message=f'Click this link to reset your password: {reset_url}',
                 from_email='noreply@scoopjoy.com',
                 recipient_list=[email],
-                fail_silently=False,
             )
-            logger.info(f"Password reset email sent to {email}")
+            logger.info("Password reset email queued", extra={'email': email})
             return JsonResponse({'status': 'ok'})
         except json.JSONDecodeError:
             logger.error("Invalid JSON in password reset request")
             return JsonResponse({'error': 'Invalid request data'}, status=400)
         except User.DoesNotExist:
-            logger.warning(f"Password reset attempted for non-existent email: {email}")
+            logger.warning("Password reset attempted for non-existent email", extra={'email': email})
             return JsonResponse({'error': 'Email not found'}, status=400)
         except Exception as e:
-            logger.error(f"Password reset error: {str(e)}", exc_info=True)
+            logger.error("Password reset error: %s", e, exc_info=True)
             return JsonResponse({'error': 'An error occurred. Please try again.'}, status=500)
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
@@ -77,26 +81,25 @@ def send_otp(request):
             # Create user if not exists
             user, created = User.objects.get_or_create(email=email, defaults={'username': email})
             if created:
-                logger.info(f"New user created via OTP login: {email}")
+                logger.info("New user created via OTP login", extra={'email': email})
 
             # Generate and send OTP
             otp = str(random.randint(100000, 999999))
-            cache.set(f'otp_{email}', otp, timeout=300)  # Store OTP for 5 minutes
-            send_mail(
+            caches.otp.set(email, otp)  # expires after CACHE_NAMESPACES['otp']
+            enqueue_mail(
                 subject='ScoopJoy OTP Login',
                 message=f'Your OTP is: {otp}',
                 from_email='noreply@scoopjoy.com',
                 recipient_list=[email],
-                fail_silently=False,
             )
-            logger.info(f"OTP sent to {email}")
+            logger.info("OTP queued", extra={'email': email})
             return JsonResponse({'status': 'ok'})
 
         except json.JSONDecodeError:
             logger.error("Invalid JSON in OTP request")
             return JsonResponse({'error': 'Invalid request data'}, status=400)
         except Exception as e:
-            logger.error(f"OTP send error: {str(e)}", exc_info=True)
+            logger.error("OTP send error: %s", e, exc_info=True)
             return JsonResponse({'error': 'An error occurred. Please try again.'}, status=500)
 
     return JsonResponse({'error': 'Invalid request method'}, status=405)
@@ -112,23 +115,23 @@ def verify_otp(request):
                 logger.warning("OTP verification attempted with missing email or OTP")
                 return JsonResponse({'error': 'Email and OTP are required'}, status=400)
             
-            stored_otp = cache.get(f'otp_{email}')
+            stored_otp = caches.otp.get(email)
             if stored_otp and stored_otp == otp:
                 user = User.objects.get(email=email)
-                login(request, user, backend='django.contrib.auth.backends.ModelBackend')
-                cache.delete(f'otp_{email}')
-                logger.info(f"User {email} logged in via OTP")
+                login(request, user)
+                caches.otp.delete(email)
+                logger.info("User logged in via OTP", extra={'email': email})
                 return JsonResponse({'status': 'ok'})
-            logger.warning(f"Invalid OTP for {email}")
+            logger.warning("Invalid OTP", extra={'email': email})
             return JsonResponse({'error': 'Invalid OTP'}, status=400)
         except json.JSONDecodeError:
             logger.error("Invalid JSON in OTP verification request")
             return JsonResponse({'error': 'Invalid request data'}, status=400)
         except User.DoesNotExist:
-            logger.warning(f"OTP verification for non-existent email: {email}")
+            logger.warning("OTP verification for non-existent email", extra={'email': email})
             return JsonResponse({'error': 'User not found'}, status=400)
         except Exception as e:
-            logger.error(f"OTP verification error: {str(e)}", exc_info=True)
+            logger.error("OTP verification error: %s", e, exc_info=True)
             return JsonResponse({'error': 'An error occurred. Please try again.'}, status=500)
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
@@ -145,10 +148,10 @@ def password_reset_confirm(request, uidb64, token):
             form = SetPasswordForm(user, request.POST)
             if form.is_valid():
                 form.save()
-                logger.info(f"Password reset successful for user {user.email}")
+                logger.info("Password reset successful", extra={'user_id': user.pk})
                 return redirect('scoopjoy:login')
             else:
-                logger.warning(f"Password reset form invalid for user {user.email}")
+                logger.warning("Password reset form invalid", extra={'user_id': user.pk})
                 return render(request, 'password_reset_confirm.html', {
                     'form': form,
                     'uidb64': uidb64,
@@ -162,23 +165,27 @@ def password_reset_confirm(request, uidb64, token):
                 'uidb64': uidb64,
                 'token': token
             })
-    logger.warning(f"Invalid password reset token or user: {uidb64}/{token}")
+    logger.warning("Invalid password reset token or user", extra={'uidb64': uidb64})
     return render(request, 'password_reset_confirm.html', {
         'error': 'Invalid or expired reset link'
     })
 
+@cached_page
 def home_view(request):
     return render(request, 'home.html')
 
+@cached_page
 def history_view(request):
     return render(request, 'history.html')
 
 def recipes_view(request):
     return render(request, 'main_page.html')
 
+@cached_page
 def recipes(request):
     return render(request, 'recipes.html')
 
+@cached_page
 def recipe_detail(request, recipe_id):
     template_name = f'recipes{recipe_id}.html'
     return render(request, template_name)
@@ -189,16 +196,14 @@ def signup_view(request):
         if form.is_valid():
             user = form.save()
             login(request, user)
-            send_mail(
+            enqueue_mail(
                 subject='Welcome to ScoopJoy!',
                 message=f'Hi {user.username},\n\nThanks for signing up at ScoopJoy! 🍦\nWe’re excited to have you.',
-                from_email=None,
                 recipient_list=[user.email],
-                fail_silently=False,
             )
             return redirect('scoopjoy:home')
         else:
-            logger.error(f"Signup form errors: {form.errors}")
+            logger.error("Signup form errors: %s", Lazy(form.errors.as_json))
     else:
         form = CustomSignupForm()
     return render(request, 'signup.html', {'form': form})
@@ -223,8 +228,8 @@ def logout_view(request):
 @login_required
 def profile_view(request):
     user = request.user
-    orders = user.orders.all()
-    addresses = Address.objects.filter(user=user)
+    recent_orders, more_orders = orders.history_page(user.pk, limit=PROFILE_ORDERS)
+    addresses = Address.objects.filter(user=user).order_by('-is_default', 'id')
     if request.method == 'POST':
         update_form = UpdateProfileForm(request.POST, request.FILES, instance=user)
         address_form = AddressForm(request.POST)
@@ -252,33 +257,38 @@ def profile_view(request):
     return render(request, 'profile.html', {
         'update_form': update_form,
         'address_form': address_form,
-        'orders': orders,
+        'orders': recent_orders,
+        'more_orders': more_orders,
         'addresses': addresses
     })
 
+@cached_page
 def quiz_landing(request):
     return render(request, 'quiz_landing.html')
 
 def flavor_quiz(request):
     return render(request, 'flavor_quiz.html')
 
+@cached_page
 def sticks(request):
-    return render(request, 'iceCreamBars.html')
+    return render(request, 'iceCreamBars.html', {'category': 'sticks'})
 
+@cached_page
 def cones(request):
-    return render(request, 'cones.html')
+    return render(request, 'cones.html', {'category': 'cones'})
 
+@cached_page
 def tubs(request):
-    return render(request, 'tubs.html')
+    return render(request, 'tubs.html', {'category': 'tubs'})
 
+@cached_page
 def all_flavors(request):
     return render(request, 'allFlavors.html')
 
 @login_required
 def cart_view(request):
-    cart_items = CartItem.objects.filter(user=request.user)
-    addresses = Address.objects.filter(user=request.user)
-    total = sum(item.total_price() for item in cart_items)
+    cart_items = cart.load(request.user.pk)
+    addresses = Address.objects.filter(user=request.user).order_by('-is_default', 'id')
     address_form = AddressForm()
     if request.method == 'POST':
         if 'add_address' in request.POST:
@@ -294,21 +304,21 @@ def cart_view(request):
                 quantity = int(request.POST.get('quantity'))
             except (TypeError, ValueError):
                 quantity = 1
-            item = get_object_or_404(CartItem, id=item_id, user=request.user)
-            if quantity > 0:
-                item.quantity = quantity
-                item.save()
-            else:
-                item.delete()
+            try:
+                cart.set_quantity(request.user.pk, item_id, quantity)
+            except (CartItem.DoesNotExist, ValueError):
+                raise Http404("No such cart item")
             return redirect('scoopjoy:cart')
         elif 'remove_item' in request.POST:
             item_id = request.POST.get('item_id')
-            item = get_object_or_404(CartItem, id=item_id, user=request.user)
-            item.delete()
+            try:
+                cart.remove_item(request.user.pk, item_id)
+            except (CartItem.DoesNotExist, ValueError):
+                raise Http404("No such cart item")
             return redirect('scoopjoy:cart')
     return render(request, 'cart.html', {
         'cart_items': cart_items,
-        'total': total,
+        'total': cart_items.total_price,
         'addresses': addresses,
         'address_form': address_form,
     })
@@ -320,27 +330,19 @@ def update_quantity(request, product_id):
         try:
             data = json.loads(request.body)
             action = data.get("action")
-            item = CartItem.objects.get(user=request.user, product_id=product_id)
-            with transaction.atomic():
-                if action == "increment":
-                    item.quantity += 1
-                    item.save()
-                elif action == "decrement":
-                    if item.quantity > 1:
-                        item.quantity -= 1
-                        item.save()
-                    else:
-                        item.delete()
-                        item = None  # Set item to None after deletion
-                else:
-                    return JsonResponse({"error": "Invalid action"}, status=400)
-            total_quantity = CartItem.objects.filter(user=request.user).aggregate(total=Sum('quantity'))['total'] or 0
+            if action == "increment":
+                item, summary = cart.change_quantity(request.user.pk, product_id, 1)
+            elif action == "decrement":
+                item, summary = cart.change_quantity(request.user.pk, product_id, -1)
+            else:
+                return JsonResponse({"error": "Invalid action"}, status=400)
             # Use 0 for quantity and item_total if item was deleted
             quantity = item.quantity if item else 0
-            item_total = item.total_price() if item else 0
+            item_total = item.line_total if item else 0
             return JsonResponse({
                 "message": "Updated",
-                "cart_count": total_quantity,
+                "cart_count": summary.total_quantity,
+                "cart_total": summary.total_price,
                 "quantity": quantity,
                 "item_total": item_total
             })
@@ -356,46 +358,66 @@ def add_to_cart(request, product_id):
     if request.method == "POST":
         try:
             product = get_object_or_404(Product, id=product_id)
-            with transaction.atomic():
-                cart_item, created = CartItem.objects.get_or_create(user=request.user, product=product)
-                if not created:
-                    cart_item.quantity += 1
-                cart_item.save()
-                total_quantity = CartItem.objects.filter(user=request.user).aggregate(total=Sum('quantity'))['total'] or 0
-                return JsonResponse({
-                    "message": "Added",
-                    "cart_count": total_quantity,
-                    "item_total": cart_item.total_price(),
-                    "price": float(product.price)
-                })
+            cart_item, summary = cart.add_item(request.user, product)
+            return JsonResponse({
+                "message": "Added",
+                "cart_count": summary.total_quantity,
+                "cart_total": summary.total_price,
+                "item_total": cart_item.line_total,
+                "price": float(product.price)
+            })
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "Invalid method"}, status=405)
 
-def cart_count(request):
+@login_required
+@csrf_protect
+def cart_batch(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=405)
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        loaded, summary = cart.apply_batch(request.user.pk, data.get("operations"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({
+        "items": {
+            str(line.product_id): {"quantity": line.quantity, "item_total": line.line_total}
+            for line in loaded
+        },
+        "cart_count": summary.total_quantity,
+        "cart_total": summary.total_price,
+    })
+
+@cache_control(private=True, no_cache=True)
+@async_condition(cart_state)
+async def cart_count(request):
     count = 0
-    if request.user.is_authenticated:
-        logger.debug("Fetching cart count for user: %s", request.user.username)
-        count = CartItem.objects.filter(user=request.user).aggregate(total=Sum('quantity'))['total'] or 0
-        logger.debug("Cart count for user %s: %s", request.user.username, count)
+    user = await request.auser()
+    if user.is_authenticated:
+        count = (await cart.aget_summary(user.pk)).total_quantity
+        logger.debug("Cart count", extra={'user_id': user.pk, 'count': count})
     return JsonResponse({"count": count})
 
 @login_required
-def cart_items_view(request):
-    cart_items = CartItem.objects.filter(user=request.user)
-    cart = {str(item.product.id): item.quantity for item in cart_items}
-    return JsonResponse({"cart": cart})
+@cache_control(private=True, no_cache=True)
+@async_condition(cart_state)
+async def cart_items_view(request):
+    user = await request.auser()
+    summary, quantities = await cart.aquantities(user.pk)
+    return JsonResponse({"cart": quantities})
 
 @login_required
 def checkout_view(request):
-    cart_items = CartItem.objects.filter(user=request.user)
-    if not cart_items.exists():
+    cart_items = cart.load(request.user.pk)
+    if not cart_items:
         messages.info(request, "Your cart is empty. Add items to proceed to checkout.")
         return redirect('scoopjoy:cart')
 
     address_form = AddressForm()
-    addresses = Address.objects.filter(user=request.user)
-    total = sum(item.total_price() for item in cart_items)
+    addresses = Address.objects.filter(user=request.user).order_by('-is_default', 'id')
     if request.method == 'POST' and 'add_address' in request.POST:
         address_form = AddressForm(request.POST)
         if address_form.is_valid():
@@ -405,15 +427,16 @@ def checkout_view(request):
             return redirect('scoopjoy:checkout')
     return render(request, 'checkout.html', {
         'cart_items': cart_items,
-        'total': total,
+        'total': cart_items.total_price,
         'address_form': address_form,
         'addresses': addresses,
     })
 
 @login_required
-def get_address(request, address_id):
+async def get_address(request, address_id):
+    user = await request.auser()
     try:
-        address = Address.objects.get(id=address_id, user=request.user)
+        address = await Address.objects.aget(id=address_id, user_id=user.pk)
         return JsonResponse({
             "full_name": address.name,
             "phone": address.phone,
@@ -436,7 +459,7 @@ def delete_address(request, address_id):
 @login_required
 def place_order(request):
     if request.method == 'POST':
-        logger.debug("POST request received to place order for user %s", request.user.id)
+        logger.debug("Placing order", extra={'user_id': request.user.pk})
         address_id = request.POST.get('selected_address')
         if not address_id:
             return JsonResponse({'error': 'No address selected'}, status=400)
@@ -446,29 +469,15 @@ def place_order(request):
         except Address.DoesNotExist:
             return JsonResponse({'error': 'Address not found'}, status=404)
 
-        with transaction.atomic():
-            cart_items = CartItem.objects.filter(user=request.user).select_for_update()
-            logger.debug("Cart items for user %s: %s", request.user.id, list(cart_items.values()))
-            if not cart_items.exists():
-                return JsonResponse({'error': 'Cart is empty'}, status=400)
-
-            # Create order
-            order = Order.objects.create(user=request.user, address=address)
-            order_items = []
-            total_price = 0
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    total_price=item.total_price()
-                )
-                order_items.append(item)
-                total_price += item.total_price()
-
-            # Clear cart
-            cart_items.delete()
-            logger.info(f"Order #{order.id} created for {request.user.username}")
+        try:
+            order, order_items = orders.place_order(request.user, address)
+        except orders.EmptyCartError:
+            return JsonResponse({'error': 'Cart is empty'}, status=400)
+        logger.info("Order #%s created with %s lines", order.id, len(order_items),
+                    extra={'user_id': request.user.pk, 'order_id': order.id})
+        logger.debug("Order #%s lines: %s", order.id,
+                     Lazy(lambda: [(item.product_id, item.quantity, str(item.total_price)) for item in order_items]))
+        total_price = order.total_amount
 
         # Prepare email context
         context = {
@@ -477,7 +486,7 @@ def place_order(request):
                 {
                     'product': item.product,
                     'quantity': item.quantity,
-                    'total_price': item.total_price()
+                    'total_price': item.total_price
                 } for item in order_items
             ],
             'total': total_price,
@@ -491,9 +500,7 @@ def place_order(request):
         text_content = f"Hi {request.user.username}, your order has been placed. Total: ₹{total_price}"
         html_content = render_to_string("order_confirmation.html", context)
 
-        msg = EmailMultiAlternatives(subject, text_content, from_email, to_email)
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        enqueue_mail(subject, text_content, to_email, from_email, html_message=html_content)
 
         return JsonResponse({'success': True, 'order_id': order.id})
 
@@ -501,8 +508,25 @@ def place_order(request):
 
 @login_required
 def orders_view(request):
-    orders = request.user.orders.prefetch_related('items__product').order_by('-ordered_at')
-    return render(request, 'orders.html', {'orders': orders})
+    try:
+        page, next_cursor = orders.history_page(request.user.pk, request.GET.get('before'))
+    except ValueError:
+        return redirect('scoopjoy:orders')
+    return render(request, 'orders.html', {'orders': page, 'next_cursor': next_cursor})
+
+@login_required
+def order_history_api(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', orders.PAGE_SIZE)), 1), orders.MAX_PAGE_SIZE)
+        cursor = request.GET.get('before')
+        if cursor:
+            orders.decode_cursor(cursor)
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit or cursor"}, status=400)
+    return StreamingHttpResponse(
+        routers.keep_pin(orders.stream_history(request.user.pk, cursor, limit)),
+        content_type='application/json',
+    )
 
 def product_detail(request, id):
     product = get_object_or_404(Product, id=id)
@@ -514,39 +538,100 @@ def product_detail(request, id):
         'cart_item': cart_item,
     })
 
-def search_api(request):
+@cache_control(no_cache=True)
+@async_condition(catalog_state)
+async def search_api(request):
     query = request.GET.get("q", "").strip()
-    results = []
-    if query:
-        matches = Product.objects.filter(name__icontains=query)[:5]
-        results = [
-            {"name": p.name, "url": p.get_absolute_url()} for p in matches
-        ]
+    results = await search.asearch(query) if query else []
     return JsonResponse({"results": results})
 
-def check_auth(request):
-    return JsonResponse({"is_authenticated": request.user.is_authenticated})
+async def check_auth(request):
+    user = await request.auser()
+    return JsonResponse({"is_authenticated": user.is_authenticated})
 
-def products_api(request):
+@cache_control(no_cache=True)
+@async_condition(catalog_state)
+async def products_api(request):
     category = request.GET.get('category', None)
-    print(f"Category received: {category}")  # Debug line
-    if category:
-        products = Product.objects.filter(category=category)
-    else:
-        products = Product.objects.all()
-    print(f"Number of products returned: {products.count()}")  # Debug line
-    products_data = [
-        {
-            'id': p.id,
-            'name': p.name,
-            'price': float(p.price),
-            'image': p.image.url if p.image else '',
-            'category': p.category,  # Added for debugging
-        } for p in products
-    ]
-    return JsonResponse({'products': products_data})
+    payload = (await aget_catalog()).payload(category)
+    return HttpResponse(payload, content_type='application/json')
+
+@cache_control(private=True, no_cache=True)
+@async_condition(bootstrap_state)
+async def bootstrap_api(request):
+    """Everything a category page needs: products, auth state and cart, in one response."""
+    category = request.GET.get('category', None)
+    user = await request.auser()
+    quantities, count = {}, 0
+    if user.is_authenticated:
+        summary, quantities = await cart.aquantities(user.pk)
+        count = summary.total_quantity
+    visitor = json.dumps({"is_authenticated": user.is_authenticated, "cart": quantities, "cart_count": count})
+    # The catalog part is the pre-encoded {"products": [...]} object; splice
+    # the visitor's keys into it rather than encoding the products again.
+    payload = (await aget_catalog()).payload(category)
+    body = payload[:-1] + b', ' + visitor[1:].encode('utf-8')
+    return HttpResponse(body, content_type='application/json')
+
+async def recommend_api(request):
+    if not recommend.AVAILABLE:
+        return JsonResponse({"error": "Recommendations are unavailable"}, status=503)
+    answers = [a for a in request.GET.get("answers", "").split(",") if a]
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 5)), recommend.MAX_RESULTS))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+    favorites = []
+    user = await request.auser()
+    if user.is_authenticated:
+        favorites = [name async for name in FavoriteFlavor.objects.filter(user_id=user.pk)
+                     .values_list('flavor_name', flat=True)]
+    results = await recommend.arecommend(answers, favorites, limit)
+    return JsonResponse({"results": results})
 
 def menu_page(request):
-    flat_products = Product.objects.all()[:36]  # Ensure 36 products
+    flat_products = get_catalog().products[:36]  # Ensure 36 products
     products = [flat_products[i:i+2] for i in range(0, len(flat_products), 2)]
-    return render(request, 'menu.html', {'products': products})
\ No newline at end of file
+    return render(request, 'menu.html', {'products': products})
+
+@staff_member_required
+def query_stats(request):
+    if request.method == "POST":
+        instrumentation.recent.clear()
+    return JsonResponse({
+        "enabled": instrumentation.ENABLED,
+        "views": instrumentation.summary(),
+        "recent": list(instrumentation.recent)[-50:],
+        "profiles": instrumentation.slowest_profiles(),
+    })
+
+@staff_member_required
+def sales_report(request):
+    try:
+        start, end = sales.date_range(request.GET, sales.MAX_DAYS)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(sales.summary(start, end))
+
+@staff_member_required
+def sales_top_products(request):
+    by = request.GET.get("by", "revenue")
+    try:
+        start, end = sales.date_range(request.GET)
+        limit = max(1, min(int(request.GET.get("limit", 10)), sales.MAX_TOP_PRODUCTS))
+        if by not in sales.TOP_PRODUCTS_BY:
+            raise ValueError(f"'by' must be one of {', '.join(sales.TOP_PRODUCTS_BY)}")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"from": start, "to": end, "by": by,
+                         "products": sales.top_products(start, end, by, limit)})
+
+@staff_member_required
+def sales_export(request):
+    try:
+        start, end = sales.date_range(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    response = StreamingHttpResponse(routers.keep_pin(sales.export_csv(start, end)), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="orders-{start}-{end}.csv"'
+    return response
@@ -54,8 +54,8 @@ document.addEventListener("DOMContentLoaded", function () {
     }
     const csrftoken = getCookie('csrftoken');
 
-    // Cart count
-    fetch("/cart/count/")
+    // Cart count (category pages get it in their bootstrap response instead)
+    if (!document.querySelector("[data-bootstrap]")) fetch("/cart/count/")
         .then(res => res.json())
         .then(data => {
             document.querySelector(".cart-count").textContent = data.count || 0;
@@ -14,18 +14,10 @@ function getCookie(name) {
     return cookieValue;
 }
 
-function debounce(func, wait) {
-    let timeout;
-    return function (...args) {
-        clearTimeout(timeout);
-        timeout = setTimeout(() => func.apply(this, args), wait);
-    };
-}
-
 document.addEventListener("DOMContentLoaded", () => {
     const csrftoken = getCookie("csrftoken");
     console.log("CSRF Token:", csrftoken);
-    console.log("Using cart.js version 2025-05-26-3");
+    console.log("Using cart.js version 2025-05-26-4");
 
     if (!csrftoken) {
         console.error("CSRF token not found");
@@ -35,101 +27,56 @@ document.addEventListener("DOMContentLoaded", () => {
 
     function attachButtonListeners() {
         document.querySelectorAll('.increment').forEach(button => {
-            const newButton = button.cloneNode(true);
-            button.replaceWith(newButton);
-            newButton.addEventListener('click', debounce(() => updateQuantity(newButton.dataset.id, 'increment'), 300));
+            button.addEventListener('click', () => changeQuantity(button.dataset.id, 'increment'));
         });
 
         document.querySelectorAll('.decrement').forEach(button => {
-            const newButton = button.cloneNode(true);
-            button.replaceWith(newButton);
-            newButton.addEventListener('click', debounce(() => updateQuantity(newButton.dataset.id, 'decrement'), 300));
+            button.addEventListener('click', () => changeQuantity(button.dataset.id, 'decrement'));
         });
     }
 
     attachButtonListeners();
 
-    function updateQuantity(productId, action) {
-        console.log(`Updating quantity for product ${productId}, action: ${action}`);
-        fetch(`/cart/update/${productId}/`, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-                "X-CSRFToken": csrftoken
-            },
-            body: JSON.stringify({ action })
-        })
-        .then(res => {
-            if (res.redirected || res.status === 302) {
-                console.log("Redirected to:", res.url);
-                window.location.href = res.url;
-                return null;
-            }
-            if (!res.ok) {
-                throw new Error(`HTTP error! Status: ${res.status}`);
-            }
-            return res.json();
-        })
-        .then(data => {
-            if (!data) return;
-            console.log("Update response:", data);
-            if (data.error) {
-                console.error("Error updating cart:", data.error);
-                showToast("Failed to update cart: " + data.error);
-                const cartItem = document.querySelector(`.cart-item[data-id="${productId}"]`);
-                if (cartItem) {
-                    const buttons = cartItem.querySelectorAll('.increment, .decrement');
-                    buttons.forEach(button => button.disabled = true);
-                }
-                return;
-            }
-            if (data.message === "Updated") {
-                const cartItem = document.querySelector(`.cart-item[data-id="${productId}"]`);
-                if (!cartItem) {
-                    console.error(`Cart item not found for product ${productId}`);
-                    return;
-                }
-                const details = cartItem.querySelector('.details');
-                const quantityControls = details.querySelector('.quantity-controls');
-                const itemTotal = details.querySelector('.item-total');
-                if (!details || !itemTotal) {
-                    console.error(`Details or item-total not found for product ${productId}`);
-                    return;
-                }
-                if (data.quantity > 0) {
-                    if (quantityControls) {
-                        const quantitySpan = quantityControls.querySelector('span');
-                        if (!quantitySpan) {
-                            console.error(`Quantity span not found for product ${productId}`);
-                            return;
-                        }
-                        quantitySpan.textContent = data.quantity;
-                        const itemTotalValue = parseFloat(data.item_total);
-                        if (isNaN(itemTotalValue)) {
-                            console.error(`Invalid item_total value for product ${productId}: ${data.item_total}`);
-                            return;
-                        }
-                        itemTotal.textContent = `₹${itemTotalValue.toFixed(2)}`;
-                        console.log(`Updated quantity to ${data.quantity} for product ${productId}`);
-                    } else {
-                        console.error(`Quantity controls not found for product ${productId}`);
-                        return;
-                    }
+    // Show the click at once; CartBatch sends rapid clicks as one request.
+    function changeQuantity(productId, action) {
+        const cartItem = document.querySelector(`.cart-item[data-id="${productId}"]`);
+        const quantitySpan = cartItem && cartItem.querySelector('.quantity-controls span');
+        if (!quantitySpan) {
+            console.error(`Cart item not found for product ${productId}`);
+            return;
+        }
+        const quantity = parseInt(quantitySpan.textContent) + (action === 'increment' ? 1 : -1);
+        if (quantity > 0) {
+            quantitySpan.textContent = quantity;
+        } else {
+            cartItem.remove();
+        }
+
+        CartBatch.queue(action, productId)
+            .then(data => {
+                if (data && CartBatch.pending() === 0) renderCart(data);
+            })
+            .catch(err => {
+                console.error("Error updating cart:", err);
+                if (err.message.includes("HTTP error")) {
+                    showToast("Failed to communicate with the server. Please try again.");
                 } else {
-                    cartItem.remove();
-                    console.log(`Removed cart item for product ${productId}`);
+                    showToast("Failed to update cart: " + err.message);
                 }
-                updateCartTotalAndCount(data.cart_count);
-            }
-        })
-        .catch(err => {
-            console.error("Error updating cart:", err);
-            if (err.message.includes("HTTP error")) {
-                showToast("Failed to communicate with the server. Please try again.");
-            } else {
-                showToast("An unexpected error occurred. Please try again.");
+            });
+    }
+
+    function renderCart(data) {
+        document.querySelectorAll('.cart-item').forEach(cartItem => {
+            const line = data.items[cartItem.dataset.id];
+            if (!line) {
+                cartItem.remove();
+                return;
             }
+            cartItem.querySelector('.quantity-controls span').textContent = line.quantity;
+            cartItem.querySelector('.item-total').textContent = `₹${parseFloat(line.item_total).toFixed(2)}`;
         });
+        updateCartTotalAndCount(data.cart_count);
     }
 
     function updateCartTotalAndCount(cartCount) {
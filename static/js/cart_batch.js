@@ -0,0 +1,72 @@
+// cart_batch.js
+// Collects cart clicks for a short while and sends them to /cart/batch/ as
+// one request. Every queued click resolves with the resulting cart:
+// { items: { productId: { quantity, item_total } }, cart_count, cart_total }
+// Callers update the page optimistically and should only redraw from a
+// response once CartBatch.pending() is back to 0, or they would undo newer
+// clicks.
+const CartBatch = (function () {
+    const WAIT_MS = 250;
+    let operations = [];
+    let waiters = [];
+    let timer = null;
+    let inFlight = 0;
+
+    function csrfToken() {
+        const match = document.cookie.split(";").map(c => c.trim()).find(c => c.startsWith("csrftoken="));
+        return match ? decodeURIComponent(match.substring("csrftoken=".length)) : null;
+    }
+
+    function flush(keepalive = false) {
+        clearTimeout(timer);
+        timer = null;
+        if (operations.length === 0) return;
+        const batch = { operations };
+        const answer = waiters;
+        operations = [];
+        waiters = [];
+        inFlight += 1;
+
+        fetch("/cart/batch/", {
+            method: "POST",
+            keepalive,
+            headers: {
+                "Content-Type": "application/json",
+                "X-CSRFToken": csrfToken()
+            },
+            body: JSON.stringify(batch)
+        })
+        .then(res => {
+            if (res.redirected || res.status === 302) {
+                window.location.href = res.url;
+                return null;
+            }
+            return res.json().then(data => {
+                if (!res.ok) throw new Error(data.error || `HTTP error! Status: ${res.status}`);
+                return data;
+            });
+        })
+        .finally(() => { inFlight -= 1; })
+        .then(data => answer.forEach(w => w.resolve(data)))
+        .catch(err => answer.forEach(w => w.reject(err)));
+    }
+
+    function queue(op, productId, quantity) {
+        const operation = { op, product: Number(productId) };
+        if (quantity !== undefined) operation.quantity = quantity;
+        operations.push(operation);
+        clearTimeout(timer);
+        timer = setTimeout(flush, WAIT_MS);
+        return new Promise((resolve, reject) => waiters.push({ resolve, reject }));
+    }
+
+    // Don't drop clicks made just before leaving the page.
+    window.addEventListener("pagehide", () => flush(true));
+
+    // Clicks not yet answered by the server.
+    function pending() {
+        return operations.length + inFlight;
+    }
+
+    return { queue, flush, pending };
+})();
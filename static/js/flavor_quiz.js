@@ -128,9 +128,11 @@ document.addEventListener("DOMContentLoaded", () => {
                 <h2>You got ${resultFlavor}!</h2>
                 <p>This flavor matches your vibe perfectly!</p>
                 <img src="${staticPath}${resultImg}" alt="${resultFlavor} Image">
+                <div id="recommendations" class="recommendations"></div>
                 <button class="retry-btn">Take Quiz Again</button>
             </div>
         `;
+        showRecommendations(selectedAnswers);
 
         document.querySelector(".retry-btn").addEventListener("click", () => {
             currentQuestion = 0;
@@ -139,6 +141,27 @@ document.addEventListener("DOMContentLoaded", () => {
         });
     }
 
+    // Products picked on the server from the answers (and, when logged in,
+    // the visitor's favorite flavors). The result above stands on its own if
+    // this fails.
+    function showRecommendations(answers) {
+        const params = new URLSearchParams({ answers: answers.join(","), limit: 4 });
+        fetch(`/api/recommend/?${params}`)
+            .then(res => (res.ok ? res.json() : { results: [] }))
+            .then(data => {
+                const container = document.getElementById("recommendations");
+                if (!container || data.results.length === 0) return;
+                container.innerHTML = `
+                    <h3>Scoops picked for you</h3>
+                    <ul>
+                        ${data.results.map(p => `
+                            <li><a href="${p.url}">${p.name}</a> <span>₹${p.price}</span></li>
+                        `).join('')}
+                    </ul>
+                `;
+            })
+            .catch(() => {});
+    }
+
     showQuestion();
 });
-
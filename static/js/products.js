@@ -20,17 +20,6 @@ let cartItems = {};
 let products = [];
 let isAuthenticated = false;
 
-async function checkAuthStatus() {
-    try {
-        const response = await fetch("/api/check-auth/");
-        const data = await response.json();
-        isAuthenticated = data.is_authenticated;
-    } catch (error) {
-        console.error("Error checking auth status:", error);
-        isAuthenticated = false;
-    }
-}
-
 function setCartCount(count) {
     localStorage.setItem("cartCount", count);
     const cartCount = document.querySelector(".cart-count");
@@ -67,54 +56,21 @@ function updateViewCartBar() {
     }
 }
 
-function fetchCartItems() {
-    return fetch("/cart/items/", {
-        method: "GET",
-        headers: {
-            "X-CSRFToken": csrftoken
-        }
-    })
-    .then(res => {
-        if (res.redirected || res.status === 302) {
-            return { cart: {} };
-        }
-        return res.json();
-    })
-    .then(data => {
-        cartItems = data.cart || {};
-        console.log("Fetched cart items:", cartItems);
-        updateViewCartBar();
-    })
-    .catch(err => {
-        console.error("Error fetching cart items:", err);
-        cartItems = {};
-        updateViewCartBar();
-    });
-}
-
-async function fetchProducts() {
+// Products, auth state and cart for this page in one request; the page
+// preloads the same URL so it is usually already on its way.
+async function fetchBootstrap() {
     try {
-        const currentPath = window.location.pathname;
-        let category = null;
-        if (currentPath.includes('/sticks/')) {
-            category = 'sticks';
-        } else if (currentPath.includes('/cones/')) {
-            category = 'cones';
-        } else if (currentPath.includes('/tubs/')) {
-            category = 'tubs';
-        }
-
-        let url = "/api/products/";
-        if (category) {
-            url += `?category=${category}`;
-        }
-
-        const response = await fetch(url);
+        const response = await fetch(container.dataset.bootstrap);
         const data = await response.json();
         products = data.products || [];
+        isAuthenticated = data.is_authenticated;
+        cartItems = isAuthenticated ? (data.cart || {}) : {};
+        setCartCount(data.cart_count || 0);
     } catch (error) {
-        console.error("Error fetching products:", error);
+        console.error("Error loading products:", error);
         products = [];
+        cartItems = {};
+        updateViewCartBar();
     }
 }
 
@@ -141,15 +97,27 @@ function showToast(message, type = 'error') {
 function createProductCard(product) {
     const card = document.createElement("div");
     card.classList.add("product-card");
+    card.dataset.productId = product.id;
 
+    const sizes = "(max-width: 768px) 50vw, 300px";
     card.innerHTML = `
-        <img src="${product.image}" alt="${product.name}">
+        <picture>
+            ${product.srcset_avif ? `<source type="image/avif" srcset="${product.srcset_avif}" sizes="${sizes}">` : ""}
+            ${product.srcset ? `<source type="image/webp" srcset="${product.srcset}" sizes="${sizes}">` : ""}
+            <img src="${product.image}" alt="${product.name}" loading="lazy">
+        </picture>
         <h3>${product.name}</h3>
         <p>₹${product.price}</p>
-        <button class="add-to-cart-btn" data-product-id="${product.id}">Add to Cart</button>
     `;
+    card.appendChild(createAddButton(card, product.id));
+    return card;
+}
 
-    const addButton = card.querySelector(".add-to-cart-btn");
+function createAddButton(card, productId) {
+    const addButton = document.createElement("button");
+    addButton.className = "add-to-cart-btn";
+    addButton.textContent = "Add to Cart";
+    addButton.setAttribute("data-product-id", productId);
     addButton.addEventListener("click", (e) => {
         e.preventDefault();
         e.stopPropagation();
@@ -159,39 +127,10 @@ function createProductCard(product) {
             window.location.href = `/login/?next=${encodeURIComponent(returnUrl)}`;
             return;
         }
-        const productId = addButton.getAttribute("data-product-id");
-        fetch(`/cart/add/${productId}/`, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-                "X-CSRFToken": csrftoken
-            },
-            body: JSON.stringify({})
-        })
-        .then((res) => {
-            if (res.redirected || res.status === 302) {
-                window.location.href = res.url;
-                return;
-            }
-            return res.json();
-        })
-        .then((data) => {
-            if (data && data.message === "Added") {
-                cartItems[productId] = (cartItems[productId] || 0) + 1;
-                setCartCount(data.cart_count);
-                showToast("Item added to cart!", "success");
-                showQuantityControls(card, productId, cartItems[productId]);
-            } else {
-                showToast(data.error || "Failed to add item to cart.", "error");
-            }
-        })
-        .catch((error) => {
-            console.error("Error adding to cart:", error);
-            showToast("Something went wrong. Please try again.", "error");
-        });
+        changeCart(card, productId, "add");
+        showToast("Item added to cart!", "success");
     });
-
-    return card;
+    return addButton;
 }
 
 function showQuantityControls(card, productId, quantity = 1) {
@@ -218,129 +157,56 @@ function showQuantityControls(card, productId, quantity = 1) {
     wrapper.appendChild(incrementBtn);
     card.appendChild(wrapper);
 
-    incrementBtn.addEventListener("click", () => {
-        fetch(`/cart/add/${productId}/`, {
-            method: "POST",
-            headers: {
-                "X-CSRFToken": csrftoken
-            },
-            body: JSON.stringify({})
-        })
-        .then(res => {
-            if (res.redirected || res.status === 302) {
-                window.location.href = res.url;
-                return;
-            }
-            return res.json();
-        })
-        .then(data => {
-            if (data) {
-                let val = parseInt(quantitySpan.textContent);
-                quantitySpan.textContent = val + 1;
-                cartItems[productId] = val + 1;
-                setCartCount(data.cart_count);
-                showToast("Item quantity increased!", "success");
-            } else {
-                showToast(data.error || "Failed to update quantity.", "error");
-            }
-        })
-        .catch(err => {
-            console.error("Error incrementing quantity:", err);
-            showToast("Something went wrong. Please try again.", "error");
-        });
-    });
+    incrementBtn.addEventListener("click", () => changeCart(card, productId, "increment"));
+    decrementBtn.addEventListener("click", () => changeCart(card, productId, "decrement"));
+}
 
-    decrementBtn.addEventListener("click", () => {
-        fetch(`/cart/update/${productId}/`, {
-            method: "POST",
-            headers: {
-                "X-CSRFToken": csrftoken,
-                "Content-Type": "application/json"
-            },
-            body: JSON.stringify({ action: "decrement" })
-        })
-        .then(res => {
-            if (res.redirected || res.status === 302) {
-                window.location.href = res.url;
-                return;
-            }
-            return res.json();
-        })
+// Draw the card's cart controls from cartItems.
+function renderCard(card, productId) {
+    const quantity = cartItems[productId] || 0;
+    const controls = card.querySelector(".cart-buttons");
+    if (quantity > 0) {
+        if (controls) {
+            controls.querySelector(".quantity-value").textContent = quantity;
+        } else {
+            showQuantityControls(card, productId, quantity);
+        }
+    } else if (!card.querySelector(".add-to-cart-btn")) {
+        if (controls) controls.remove();
+        card.appendChild(createAddButton(card, productId));
+    }
+}
+
+// Update the page at once and let CartBatch coalesce rapid clicks into one
+// request; the server's answer is applied once no newer clicks are pending.
+function changeCart(card, productId, op) {
+    const quantity = (cartItems[productId] || 0) + (op === "decrement" ? -1 : 1);
+    if (quantity > 0) {
+        cartItems[productId] = quantity;
+    } else {
+        delete cartItems[productId];
+    }
+    renderCard(card, productId);
+    setCartCount(Object.values(cartItems).reduce((sum, q) => sum + q, 0));
+
+    CartBatch.queue(op, productId)
         .then(data => {
-            if (data) {
-                let val = parseInt(quantitySpan.textContent);
-                if (val > 1) {
-                    quantitySpan.textContent = val - 1;
-                    cartItems[productId] = val - 1;
-                    showToast("Item quantity decreased!", "success");
-                } else {
-                    delete cartItems[productId];
-                    wrapper.remove();
-                    const btn = document.createElement("button");
-                    btn.className = "add-to-cart-btn";
-                    btn.textContent = "Add to Cart";
-                    btn.setAttribute("data-product-id", productId);
-                    card.appendChild(btn);
-                    btn.addEventListener("click", () => {
-                        fetch(`/cart/add/${productId}/`, {
-                            method: "POST",
-                            headers: {
-                                "Content-Type": "application/json",
-                                "X-CSRFToken": csrftoken
-                            },
-                            body: JSON.stringify({})
-                        })
-                        .then((res) => {
-                            if (res.redirected || res.status === 302) {
-                                window.location.href = res.url;
-                                return;
-                            }
-                            return res.json();
-                        })
-                        .then(data => {
-                            if (data) {
-                                cartItems[productId] = 1;
-                                setCartCount(data.cart_count);
-                                showToast("Item added to cart!", "success");
-                                showQuantityControls(card, productId, 1);
-                            } else {
-                                showToast(data.error || "Failed to add item to cart.", "error");
-                            }
-                        })
-                        .catch(err => {
-                            console.error("Error re-adding to cart:", err);
-                            showToast("Something went wrong. Please try again.", "error");
-                        });
-                    });
-                }
-                setCartCount(data.cart_count);
-            } else {
-                showToast(data.error || "Failed to update quantity.", "error");
+            if (!data || CartBatch.pending() > 0) return;
+            cartItems = {};
+            for (const [id, line] of Object.entries(data.items)) {
+                cartItems[id] = line.quantity;
             }
+            document.querySelectorAll(".product-card").forEach(c => renderCard(c, c.dataset.productId));
+            setCartCount(data.cart_count);
         })
         .catch(err => {
-            console.error("Error decrementing quantity:", err);
+            console.error("Error updating cart:", err);
             showToast("Something went wrong. Please try again.", "error");
         });
-    });
 }
 
 async function loadProducts() {
-    await checkAuthStatus();
-    await fetchProducts();
-
-    try {
-        if (isAuthenticated) {
-            await fetchCartItems();
-        } else {
-            cartItems = {};
-            updateViewCartBar();
-        }
-    } catch (error) {
-        console.error("Failed to fetch cart items, proceeding without cart data:", error);
-        cartItems = {};
-        updateViewCartBar();
-    }
+    await fetchBootstrap();
 
     if (products.length === 0) {
         container.innerHTML = "<p>No products available at the moment. Please try again later.</p>";
@@ -358,10 +224,4 @@ async function loadProducts() {
     });
 }
 
-document.addEventListener("DOMContentLoaded", () => {
-    loadProducts();
-    fetch("/cart/count/")
-        .then(res => res.json())
-        .then(data => setCartCount(data.count))
-        .catch(err => console.error("Error fetching cart count:", err));
-});
\ No newline at end of file
+document.addEventListener("DOMContentLoaded", loadProducts);